@@ -0,0 +1,71 @@
+"""Move a closed season's sales and balance transactions to their own file.
+
+    python archive_season.py 2025 --until 2025-12-20            # archives/2025.db
+    python archive_season.py 2026-1 --until 2026-06-30 --vacuum
+    python archive_season.py --list
+
+Everything up to --until (inclusive, UTC) that is not archived yet moves to
+ARCHIVE_DIR/<name>.db. History endpoints keep showing it, reading the
+archive only when the requested dates need it. Safe to run with the API up;
+--vacuum then shrinks the main file, and needs a moment with no requests.
+"""
+import argparse
+import sys
+from datetime import date
+
+import models
+from database import SessionLocal
+from utils import archive
+
+
+def list_archives():
+    db = SessionLocal()
+    try:
+        archives = db.query(models.SeasonArchive).order_by(models.SeasonArchive.date_to).all()
+    finally:
+        db.close()
+    for season in archives:
+        print(
+            f"  {season.name}: {season.date_from} → {season.date_to}, {season.sales} sales, "
+            f"{season.balance_transactions} balance transactions ({archive.ARCHIVE_DIR}/{season.filename})"
+        )
+    print(f"{len(archives)} archived seasons")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("name", nargs="?", help="Season name, also the archive file name")
+    parser.add_argument("--until", type=date.fromisoformat, help="Last day of the season (YYYY-MM-DD)")
+    parser.add_argument("--vacuum", action="store_true", help="Shrink the main database file afterwards")
+    parser.add_argument("--list", action="store_true", help="List archived seasons")
+    parser.add_argument("--chunk-size", type=int, default=archive.ARCHIVE_CHUNK_SIZE, help="Rows copied at a time")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        list_archives()
+        return 0
+    if not args.name or not args.until:
+        parser.error("a season name and --until are required")
+
+    try:
+        result = archive.archive_season(args.name, args.until, chunk_size=args.chunk_size)
+    except ValueError as exc:
+        print(f"❌ {exc}")
+        return 1
+
+    print(
+        f"✅ {result['name']}: {result['date_from']} → {result['date_to']} moved to "
+        f"{archive.ARCHIVE_DIR}/{result['filename']} ({result['bytes'] / 1024 / 1024:.1f} MB)"
+    )
+    print(
+        f"  {result['sales']} sales, {result['sale_items']} sale items, "
+        f"{result['balance_transactions']} balance transactions"
+    )
+    if args.vacuum:
+        archive.vacuum()
+        print("✅ main database vacuumed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
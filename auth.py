@@ -1,5 +1,10 @@
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status
@@ -11,6 +16,13 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+
+# Users allowed to reach operational endpoints (profiling), comma separated
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "admin").split(",") if name.strip()}
+
+# Verified tokens kept in memory (0 disables the cache)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -30,25 +42,156 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
+    # A random jti keeps two tokens issued in the same second distinct, so
+    # revoking one (keyed by its hash) leaves the other session alone
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(16)})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-def verify_token(token: str):
+def create_refresh_token() -> Tuple[str, str]:
+    """A new random refresh token and the hash to store for it"""
+    token = secrets.token_urlsafe(32)
+    return token, hash_refresh_token(token)
+
+
+def hash_refresh_token(token: str) -> str:
+    # Refresh tokens are 256 random bits, not passwords: nothing to brute
+    # force, so a plain SHA-256 is enough and bcrypt stays out of the path
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of tokens whose signature was already checked.
+
+    Keyed by the token's SHA-256 so raw tokens are never kept around. An
+    entry is only served until the token's own `exp`, so the cache can't
+    extend a token's life. Revoked tokens (logout) are remembered until
+    they would have expired anyway.
+    """
+
+    def __init__(self, size: int = TOKEN_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._tokens: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+        self._revoked: Dict[bytes, float] = {}
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, key: bytes) -> Optional[str]:
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is None:
+                return None
+            username, expires_at = entry
+            if expires_at <= time.time():
+                del self._tokens[key]
+                return None
+            self._tokens.move_to_end(key)
+            return username
+
+    def put(self, key: bytes, username: str, expires_at: float):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._tokens[key] = (username, expires_at)
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self.size:
+                self._tokens.popitem(last=False)
+
+    def is_revoked(self, key: bytes) -> bool:
+        return key in self._revoked
+
+    def revoke(self, key: bytes, expires_at: float):
+        now = time.time()
+        with self._lock:
+            self._tokens.pop(key, None)
+            self._revoked[key] = expires_at
+            # Expired tokens fail on `exp` anyway, no need to remember them
+            for stale in [stale for stale, until in self._revoked.items() if until <= now]:
+                del self._revoked[stale]
+
+    def load_revoked(self, revoked: Dict[bytes, float]):
+        """Add revocations made elsewhere (stored by another process)"""
+        now = time.time()
+        with self._lock:
+            for key, expires_at in revoked.items():
+                if expires_at > now:
+                    self._tokens.pop(key, None)
+                    self._revoked[key] = expires_at
+
+    def clear(self):
+        with self._lock:
+            self._tokens.clear()
+            self._revoked.clear()
+
+
+token_cache = VerifiedTokenCache()
+
+
+def _credentials_exception():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _decode_token(token: str) -> Tuple[str, float]:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return username
     except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception()
+    username: str = payload.get("sub")
+    if username is None:
+        raise _credentials_exception()
+    # Tokens without exp are still cached, but never past the default lifetime
+    expires_at = payload.get("exp") or time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    return username, float(expires_at)
+
+
+def verify_token(token: str):
+    key = token_cache.key(token)
+    if token_cache.is_revoked(key):
+        raise _credentials_exception()
+
+    # A token seen before skips the HMAC check and JSON parsing
+    username = token_cache.get(key)
+    if username is not None:
+        return username
+
+    username, expires_at = _decode_token(token)
+    token_cache.put(key, username, expires_at)
+    return username
+
+
+def bearer_username(authorization: Optional[str]) -> Optional[str]:
+    """Username from an `Authorization: Bearer` header value, None if invalid.
+
+    Uses the verified-token cache, so it never touches the database.
+    """
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return verify_token(token)
+    except HTTPException:
+        return None
+
+
+def revoke_token(token: str) -> Optional[Tuple[bytes, float]]:
+    """Reject `token` from now on (logout); returns its cache key and
+    expiry for storing the revocation, None for invalid tokens"""
+    try:
+        _, expires_at = _decode_token(token)
+    except HTTPException:
+        return None
+    key = token_cache.key(token)
+    token_cache.revoke(key, expires_at)
+    return key, expires_at
+
+
+def is_admin(username: str) -> bool:
+    return username in ADMIN_USERNAMES
@@ -0,0 +1,122 @@
+"""A month's sales report: GET /analytics/sales vs client-side aggregation.
+
+Before /analytics/sales, reports paged through GET /sales/ and summed in
+the client. Drives the app in-process on a synthetic dataset and times
+the same daily report both ways: paging and aggregating every sale of the
+range, the endpoint uncached (a write between runs), and the endpoint
+served from its cache. Also checks the two agree on the totals.
+
+    python -m benchmarks.analytics --days 30 --runs 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+
+from benchmarks import dataset
+from benchmarks.load_test import summarize
+
+PAGE_SIZE = 1_000
+
+
+async def client_side(client, date_from, date_to):
+    """The old way: every sale of the range, summed per day in Python"""
+    revenue, sales = defaultdict(float), defaultdict(int)
+    skip = 0
+    while True:
+        page = (await client.get("/sales/", params={
+            "date_from": str(date_from), "date_to": str(date_to), "skip": skip, "limit": PAGE_SIZE,
+        })).json()
+        for sale in page:
+            if sale.get("voided_at"):
+                continue
+            day = sale["created_at"][:10]
+            revenue[day] += sale["total_amount"]
+            sales[day] += 1
+        if len(page) < PAGE_SIZE:
+            return sum(sales.values()), round(sum(revenue.values()), 2)
+        skip += PAGE_SIZE
+
+
+async def server_side(client, date_from, date_to, distribution):
+    report = (await client.get("/analytics/sales", params={
+        "date_from": str(date_from), "date_to": str(date_to), "distribution": distribution,
+    })).json()
+    return report["total_vendas"], report["receita_total"]
+
+
+async def run(args):
+    from main import app
+
+    date_to = date.today()
+    date_from = date_to - timedelta(days=args.days - 1)
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            token = (await client.post(
+                "/auth/token", data={"username": "admin", "password": "admin123"}
+            )).json()["access_token"]
+            client.headers["Authorization"] = f"Bearer {token}"
+            usuario_id = (await client.get("/usuarios/", params={"limit": 1})).json()[0]["id"]
+
+            async def invalidate():
+                # Any write to the tables the report reads drops the cached copy
+                await client.post(f"/usuarios/{usuario_id}/add-balance", params={"amount": 1})
+
+            timings, totals = {}, {}
+            for mode in ("client_side", "server_uncached", "server_cached"):
+                latencies = []
+                for _ in range(args.runs):
+                    if mode == "server_uncached":
+                        await invalidate()
+                    start = time.perf_counter()
+                    if mode == "client_side":
+                        totals[mode] = await client_side(client, date_from, date_to)
+                    else:
+                        totals[mode] = await server_side(client, date_from, date_to, args.distribution)
+                    latencies.append(time.perf_counter() - start)
+                timings[mode] = latencies
+    finally:
+        await app.router.shutdown()
+
+    report = {}
+    for mode, latencies in timings.items():
+        summary = summarize({mode: latencies}, {}, sum(latencies))[mode]
+        vendas, receita = totals[mode]
+        report[mode] = {"p50_ms": summary["p50_ms"], "p99_ms": summary["p99_ms"], "vendas": vendas, "receita": receita}
+    report["totals_match"] = len(set(totals.values())) == 1
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, default=1_000)
+    parser.add_argument("--produtos", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=50_000)
+    parser.add_argument("--days", type=int, default=30, help="Report range, ending today")
+    parser.add_argument("--runs", type=int, default=20, help="Reports per mode")
+    parser.add_argument("--distribution", action="store_true", help="Ask the endpoint for percentiles too")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "cantina_bench.db"
+        # The app binds its engines to DATABASE_URL at import time
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+        os.environ["EVENT_LOG_DIR"] = str(Path(tmp) / "event_log")
+        dataset.prepare(db_path, args.usuarios, args.produtos, args.sales)
+        report = asyncio.run(run(args))
+
+    report["uncached_speedup"] = round(report["client_side"]["p50_ms"] / report["server_uncached"]["p50_ms"], 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Per-request cost of access-token verification.
+
+Times auth.verify_token() on a realistic pool of tokens, with the
+verified-token cache disabled (full jose decode + HMAC on every call, the
+old behaviour) and enabled (repeat tokens served from the cache):
+
+    python -m benchmarks.auth_overhead --calls 50000 --tokens 200
+"""
+import argparse
+import json
+import random
+import time
+
+import auth
+
+
+def run(tokens, calls, cache_size):
+    auth.token_cache.clear()
+    auth.token_cache.size = cache_size
+    order = [random.choice(tokens) for _ in range(calls)]
+    start = time.perf_counter()
+    for token in order:
+        auth.verify_token(token)
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50_000)
+    parser.add_argument("--tokens", type=int, default=200, help="Distinct tokens in use (terminals, sessions)")
+    args = parser.parse_args()
+
+    tokens = [auth.create_access_token({"sub": f"user{index}"}) for index in range(args.tokens)]
+    original_size = auth.token_cache.size
+    try:
+        uncached = run(tokens, args.calls, 0)
+        cached = run(tokens, args.calls, original_size)
+    finally:
+        auth.token_cache.size = original_size
+        auth.token_cache.clear()
+
+    print(json.dumps({
+        "calls": args.calls,
+        "distinct_tokens": args.tokens,
+        "uncached_us_per_call": round(uncached * 1e6, 2),
+        "cached_us_per_call": round(cached * 1e6, 2),
+        "speedup": round(uncached / cached, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
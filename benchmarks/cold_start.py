@@ -0,0 +1,83 @@
+"""Measure per-worker cold start for each SCHEMA_MODE.
+
+Each sample spawns a fresh interpreter that imports the app and runs its
+startup handlers against an already-migrated database, which is what every
+extra uvicorn/gunicorn worker pays on boot.
+
+    python -m benchmarks.cold_start --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+WORKER_SNIPPET = """
+import time
+start = time.perf_counter()
+import asyncio
+import main
+imported = time.perf_counter()
+{prepare}
+asyncio.run(main.app.router.startup())
+done = time.perf_counter()
+print(done - start, done - imported)
+"""
+
+# create_all reproduces the pre-migrations behaviour of main.py
+MODES = {
+    "create_all": "import models, database; models.Base.metadata.create_all(bind=database.engine)",
+    "upgrade": "",
+    "check": "",
+    "skip": "",
+}
+
+
+def run_worker(mode: str, database_url: str):
+    """Return (total seconds, seconds spent in schema handling + startup)"""
+    env = dict(os.environ, DATABASE_URL=database_url)
+    env["SCHEMA_MODE"] = "skip" if mode == "create_all" else mode
+    output = subprocess.run(
+        [sys.executable, "-c", WORKER_SNIPPET.format(prepare=MODES[mode])],
+        cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    total, startup = output.strip().splitlines()[-1].split()
+    return float(total), float(startup)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f"sqlite:///{tmp}/cold_start.db"
+        os.environ["EVENT_LOG_DIR"] = f"{tmp}/event_log"
+        subprocess.run(
+            [sys.executable, "migrate.py"], cwd=BASE_DIR, check=True, capture_output=True,
+            env=dict(os.environ, DATABASE_URL=database_url),
+        )
+        # Warm the OS page cache and create the admin user outside the samples
+        run_worker("skip", database_url)
+
+        results = {}
+        for mode in MODES:
+            samples = [run_worker(mode, database_url) for _ in range(args.runs)]
+            totals = [total for total, _ in samples]
+            startups = [startup for _, startup in samples]
+            results[mode] = {
+                "runs": args.runs,
+                "total_median_ms": round(statistics.median(totals) * 1000, 2),
+                "startup_median_ms": round(statistics.median(startups) * 1000, 2),
+            }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""End-of-season data pull: the JSON API vs a columnar export.
+
+Pulls every sale (with its items) through paged GET /sales/, then exports
+the same data with utils.columnar and loads it back memory-mapped. Reports
+time and bytes for each, and times one typical question (revenue per
+produto) on the JSON and on the columns. Also checks they agree.
+
+    python -m benchmarks.columnar_export --sales 50000
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+from benchmarks import dataset
+
+PAGE_SIZE = 1_000
+
+
+async def pull_json(args):
+    from main import app
+
+    pages, transferred = [], 0
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            token = (await client.post(
+                "/auth/token", data={"username": "admin", "password": "admin123"}
+            )).json()["access_token"]
+            client.headers["Authorization"] = f"Bearer {token}"
+            started = time.perf_counter()
+            skip = 0
+            while True:
+                response = await client.get("/sales/", params={"skip": skip, "limit": PAGE_SIZE})
+                transferred += len(response.content)
+                page = response.json()
+                pages.extend(page)
+                if len(page) < PAGE_SIZE:
+                    break
+                skip += PAGE_SIZE
+            elapsed = time.perf_counter() - started
+    finally:
+        await app.router.shutdown()
+    return pages, transferred, elapsed
+
+
+def revenue_from_json(sales):
+    revenue = defaultdict(int)
+    for sale in sales:
+        if sale.get("voided_at"):
+            continue
+        for item in sale["items"]:
+            revenue[item["produto_id"]] += round(item["total_price"] * 100)
+    return dict(revenue)
+
+
+def revenue_from_columns(snapshot):
+    import numpy
+
+    sales, items = snapshot["sales"], snapshot["sale_items"]
+    voided = sales["id"][~numpy.isnat(sales["voided_at"])]
+    live = ~numpy.isin(items["sale_id"], voided)
+    totals = numpy.bincount(items["produto_id"][live], weights=items["total_price_cents"][live])
+    return {int(produto_id): int(totals[produto_id]) for produto_id in numpy.flatnonzero(totals)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, default=1_000)
+    parser.add_argument("--produtos", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=50_000)
+    parser.add_argument("--chunk-size", type=int, default=None, help="Rows per export read (default COLUMNAR_CHUNK_SIZE)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "cantina_bench.db"
+        # The app binds its engines to DATABASE_URL at import time
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+        os.environ["EVENT_LOG_DIR"] = str(Path(tmp) / "event_log")
+        dataset.prepare(db_path, args.usuarios, args.produtos, args.sales)
+
+        sales, transferred, json_seconds = asyncio.run(pull_json(args))
+        started = time.perf_counter()
+        json_revenue = revenue_from_json(sales)
+        json_query_seconds = time.perf_counter() - started
+
+        from utils import columnar
+
+        export_dir = Path(tmp) / "export"
+        started = time.perf_counter()
+        columnar.export(str(export_dir), chunk_size=args.chunk_size or columnar.CHUNK_SIZE)
+        export_seconds = time.perf_counter() - started
+        size = sum(path.stat().st_size for path in export_dir.rglob("*") if path.is_file())
+
+        started = time.perf_counter()
+        snapshot = columnar.load(str(export_dir))
+        columns_revenue = revenue_from_columns(snapshot)
+        columns_query_seconds = time.perf_counter() - started
+
+    report = {
+        "json_api": {
+            "seconds": round(json_seconds, 2),
+            "megabytes": round(transferred / 1024 / 1024, 1),
+            "revenue_per_produto_ms": round(json_query_seconds * 1000, 1),
+        },
+        "columnar_export": {
+            "seconds": round(export_seconds, 2),
+            "megabytes": round(size / 1024 / 1024, 1),
+            # Includes opening the export and mapping the columns
+            "revenue_per_produto_ms": round(columns_query_seconds * 1000, 1),
+        },
+        "results_match": json_revenue == columns_revenue,
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""What conditional GETs save on the POS's product list refreshes.
+
+A till refreshes GET /produtos/?limit=500 every few seconds, while the
+catalog rarely changes between refreshes. Drives the app in-process on a
+synthetic dataset and compares plain refreshes with refreshes that send
+the last ETag in If-None-Match, with a sale every `--write-every`
+refreshes to invalidate it now and then:
+
+    python -m benchmarks.conditional_get --refreshes 2000 --write-every 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks import dataset
+from benchmarks.load_test import summarize
+
+
+async def refresh_loop(client, refreshes, write_every, produto_id, usuario_id, conditional):
+    from utils.metrics import registry
+
+    registry.reset()
+    latencies, statuses, transferred = [], {}, 0
+    etag = None
+    for index in range(refreshes):
+        if write_every and index and index % write_every == 0:
+            await client.post("/sales/", json={
+                "usuario_id": usuario_id,
+                "items": [{"produto_id": produto_id, "quantity": 1, "unit_price": 0}],
+            })
+        headers = {"If-None-Match": etag} if conditional and etag else {}
+        start = time.perf_counter()
+        response = await client.get("/produtos/", params={"limit": 500}, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        transferred += len(response.content)
+        etag = response.headers.get("etag", etag)
+
+    elapsed = sum(latencies)
+    report = summarize({"GET /produtos/": latencies}, {}, elapsed)["GET /produtos/"]
+    totals = registry.snapshot().get("GET /produtos/", {})
+    report["statuses"] = {str(code): count for code, count in sorted(statuses.items())}
+    report["bytes_per_refresh"] = round(transferred / refreshes)
+    report["queries_per_refresh"] = round(totals.get("queries", 0) / refreshes, 2)
+    return report
+
+
+async def run(args):
+    from main import app
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            token = (await client.post(
+                "/auth/token", data={"username": "admin", "password": "admin123"}
+            )).json()["access_token"]
+            client.headers["Authorization"] = f"Bearer {token}"
+            produto_id = (await client.get("/produtos/", params={"limit": 1})).json()[0]["id"]
+            usuario_id = (await client.get("/usuarios/", params={"limit": 1})).json()[0]["id"]
+            await client.post(f"/produtos/{produto_id}/restock", params={"quantidade": args.refreshes})
+            await client.post(f"/usuarios/{usuario_id}/add-balance", params={"amount": args.refreshes * 100})
+
+            return {
+                mode: await refresh_loop(
+                    client, args.refreshes, args.write_every, produto_id, usuario_id, mode == "conditional"
+                )
+                for mode in ("unconditional", "conditional")
+            }
+    finally:
+        await app.router.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, default=1_000)
+    parser.add_argument("--produtos", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=50_000)
+    parser.add_argument("--refreshes", type=int, default=2_000)
+    parser.add_argument("--write-every", type=int, default=50, help="Refreshes between sales; 0 for none")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "cantina_bench.db"
+        # The app binds its engines to DATABASE_URL at import time
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+        os.environ["EVENT_LOG_DIR"] = str(Path(tmp) / "event_log")
+        dataset.prepare(db_path, args.usuarios, args.produtos, args.sales)
+        report = asyncio.run(run(args))
+
+    unconditional, conditional = report["unconditional"], report["conditional"]
+    report["p50_speedup"] = round(unconditional["p50_ms"] / conditional["p50_ms"], 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Synthetic cantina datasets for the benchmark suite.
+
+Datasets come from generate_data.generate() and are cached as SQLite files
+under benchmarks/.data, keyed by size, seed and day: every run on the same
+day (on any commit) starts from identical data whose history ends today,
+so "today" and the rolling windows have sales in them.
+"""
+import os
+import shutil
+from datetime import date, datetime
+from pathlib import Path
+
+from sqlalchemy import create_engine, event
+
+CACHE_DIR = Path(__file__).resolve().parent / ".data"
+
+
+def dataset_path(usuarios: int, produtos: int, sales: int, seed: int, day: date) -> Path:
+    return CACHE_DIR / f"cantina_u{usuarios}_p{produtos}_s{sales}_seed{seed}_{day:%Y%m%d}.db"
+
+
+def build(path: Path, usuarios: int, produtos: int, sales: int, seed: int = 42, day: date = None):
+    """Create the schema at `path` and bulk-load a synthetic history"""
+    import generate_data
+    from utils.migrations import upgrade
+
+    day = day or date.today()
+    engine = create_engine(f"sqlite:///{path}")
+    event.listen(engine, "connect", generate_data._bulk_pragmas)
+    upgrade(bind=engine)
+    generate_data.generate(
+        engine, usuarios, produtos, sales, seed=seed,
+        until=datetime(day.year, day.month, day.day), log=lambda message: None,
+    )
+    engine.dispose()
+
+
+def prepare(target: Path, usuarios: int, produtos: int, sales: int, seed: int = 42, rebuild: bool = False) -> Path:
+    """Copy a cached dataset to `target`, building it first if needed"""
+    cached = dataset_path(usuarios, produtos, sales, seed, date.today())
+    if rebuild or not cached.exists():
+        CACHE_DIR.mkdir(exist_ok=True)
+        for stale in CACHE_DIR.glob(f"cantina_u{usuarios}_p{produtos}_s{sales}_seed{seed}*.db"):
+            os.remove(stale)
+        partial = cached.with_suffix(".partial")
+        if partial.exists():
+            os.remove(partial)
+        build(partial, usuarios, produtos, sales, seed)
+        os.replace(partial, cached)
+    shutil.copyfile(cached, target)
+    return target
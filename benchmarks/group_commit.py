@@ -0,0 +1,149 @@
+"""Checkout throughput under a lunch-rush burst, with and without group commit.
+
+Many tills ring up sales at once, in-process, first with one commit per
+sale and then with the group commit writer (utils.group_commit) batching
+them. Every `--invalid-every`th cart names a produto that does not exist;
+those must fail alone (404) without taking the rest of their batch down.
+After each mode the event log is replayed against the database: rows that
+differ are lost updates from concurrent checkouts.
+
+    python -m benchmarks.group_commit --tills 32 --checkouts 2000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks import dataset
+from benchmarks.load_test import summarize
+from benchmarks.suite import _prepare_for_checkout
+
+MODES = ["commit_per_sale", "group_commit"]
+
+
+async def burst(client, carts, tills):
+    latencies, statuses = [], {}
+    pending = iter(carts)
+
+    async def till():
+        for cart in pending:
+            start = time.perf_counter()
+            response = await client.post("/sales/", json=cart)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(till() for _ in range(tills)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+def log_differences():
+    import models
+    import replay_events
+    from database import SessionLocal
+    from utils import event_log
+
+    saldos, estoques, _ = event_log.replay()
+    db = SessionLocal()
+    try:
+        return (
+            len(replay_events.diff(db, models.Usuario, models.Usuario.saldo_cents, saldos))
+            + len(replay_events.diff(db, models.Produto, models.Produto.estoque, estoques))
+        )
+    finally:
+        db.close()
+
+
+async def run(args):
+    from main import app
+    from utils import event_log, group_commit
+
+    rng = random.Random(args.seed)
+    await app.router.startup()
+    try:
+        # Count a 500 ("database is locked") instead of aborting the run
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            token = (await client.post(
+                "/auth/token", data={"username": "admin", "password": "admin123"}
+            )).json()["access_token"]
+            client.headers["Authorization"] = f"Bearer {token}"
+
+            def carts():
+                result = []
+                for index in range(args.checkouts):
+                    produto_ids = rng.sample(range(1, args.produtos + 1), rng.randint(1, 4))
+                    if args.invalid_every and index % args.invalid_every == 0:
+                        produto_ids[0] = args.produtos + 1_000
+                    result.append({
+                        "usuario_id": rng.randint(1, args.usuarios),
+                        "items": [
+                            {"produto_id": produto_id, "quantity": rng.randint(1, 3), "unit_price": 0}
+                            for produto_id in produto_ids
+                        ],
+                    })
+                return result
+
+            report = {}
+            for mode in args.modes:
+                if mode == "group_commit":
+                    group_commit.writer.start()
+                # Fresh baseline, so each mode's differences are its own
+                event_log.snapshot()
+                latencies, statuses, elapsed = await burst(client, carts(), args.tills)
+                event_log.log.flush()
+                summary = summarize({"POST /sales/": latencies}, {}, elapsed)["POST /sales/"]
+                report[mode] = {
+                    "sales_per_second": round(statuses.get(200, 0) / elapsed, 1),
+                    "p50_ms": summary["p50_ms"],
+                    "p99_ms": summary["p99_ms"],
+                    "statuses": statuses,
+                    # Lost updates: rows whose saldo/estoque no longer match the log
+                    "event_log_differences": log_differences(),
+                }
+            if "group_commit" in report:
+                report["group_commit"]["batches"] = group_commit.writer.batches
+                report["group_commit"]["mean_batch"] = round(group_commit.writer.jobs / max(group_commit.writer.batches, 1), 1)
+    finally:
+        await app.router.shutdown()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, default=1_000)
+    parser.add_argument("--produtos", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=50_000)
+    parser.add_argument("--checkouts", type=int, default=2_000, help="Sales per mode")
+    parser.add_argument("--tills", type=int, default=32, help="Concurrent clients")
+    parser.add_argument("--invalid-every", type=int, default=50, help="Every Nth cart fails validation; 0 for none")
+    parser.add_argument("--mode", dest="modes", action="append", choices=MODES)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    args.modes = args.modes or MODES
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "cantina_bench.db"
+        # The app binds its engines to DATABASE_URL at import time
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+        os.environ["EVENT_LOG_DIR"] = str(Path(tmp) / "event_log")
+        os.environ.setdefault("SLOW_QUERY_MS", "0")
+        dataset.prepare(db_path, args.usuarios, args.produtos, args.sales)
+        _prepare_for_checkout(db_path)
+        report = asyncio.run(run(args))
+
+    if len(report) == 2:
+        report["speedup"] = round(
+            report["group_commit"]["sales_per_second"] / report["commit_per_sale"]["sales_per_second"], 1
+        )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""What an Idempotency-Key costs on the checkout hot path.
+
+Rings up the same number of POST /sales/ in-process, without a key, with a
+fresh key each (the normal till case) and as retries of already-stored
+keys (replays), on a synthetic dataset:
+
+    python -m benchmarks.idempotency_overhead --checkouts 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+from benchmarks import dataset
+from benchmarks.load_test import summarize
+from benchmarks.suite import _prepare_for_checkout
+
+
+async def ring_up(client, carts, keys):
+    latencies, errors = [], 0
+    for cart, key in zip(carts, keys):
+        headers = {"Idempotency-Key": key} if key else {}
+        start = time.perf_counter()
+        response = await client.post("/sales/", json=cart, headers=headers)
+        latencies.append(time.perf_counter() - start)
+        errors += response.status_code != 200
+    return latencies, errors
+
+
+async def run(args):
+    from main import app
+
+    rng = random.Random(args.seed)
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            token = (await client.post(
+                "/auth/token", data={"username": "admin", "password": "admin123"}
+            )).json()["access_token"]
+            client.headers["Authorization"] = f"Bearer {token}"
+
+            def carts():
+                return [
+                    {
+                        "usuario_id": rng.randint(1, args.usuarios),
+                        "items": [
+                            {"produto_id": produto_id, "quantity": rng.randint(1, 3), "unit_price": 0}
+                            for produto_id in rng.sample(range(1, args.produtos + 1), rng.randint(1, 4))
+                        ],
+                    }
+                    for _ in range(args.checkouts)
+                ]
+
+            fresh_carts = carts()
+            fresh_keys = [str(uuid.uuid4()) for _ in fresh_carts]
+            modes = {
+                "no_key": (carts(), [None] * args.checkouts),
+                "fresh_key": (fresh_carts, fresh_keys),
+                # Same carts and keys again: every request is a replay
+                "replay": (fresh_carts, fresh_keys),
+            }
+            report = {}
+            for mode, (mode_carts, keys) in modes.items():
+                latencies, errors = await ring_up(client, mode_carts, keys)
+                report[mode] = summarize({"POST /sales/": latencies}, {"POST /sales/": errors}, sum(latencies))["POST /sales/"]
+            return report
+    finally:
+        await app.router.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, default=1_000)
+    parser.add_argument("--produtos", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=50_000)
+    parser.add_argument("--checkouts", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "cantina_bench.db"
+        # The app binds its engines to DATABASE_URL at import time
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+        os.environ["EVENT_LOG_DIR"] = str(Path(tmp) / "event_log")
+        dataset.prepare(db_path, args.usuarios, args.produtos, args.sales)
+        _prepare_for_checkout(db_path)
+        report = asyncio.run(run(args))
+
+    report["fresh_key_overhead_ms"] = round(report["fresh_key"]["p50_ms"] - report["no_key"]["p50_ms"], 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
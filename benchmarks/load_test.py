@@ -0,0 +1,184 @@
+"""HTTP load test against a real uvicorn process.
+
+Starts the API on a fresh SQLite database, seeds a small catalog and drives
+it with N concurrent clients for a fixed duration, then prints throughput
+and latency percentiles per endpoint as JSON.
+
+    python -m benchmarks.load_test --concurrency 200 --duration 20
+    python -m benchmarks.load_test --app-dir /tmp/other-checkout   # compare commits
+
+Use `git worktree add /tmp/other-checkout <rev>` to get a tree to compare
+against.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# (method, path template, weight); {produto_id} and {usuario_id} are filled per request
+DEFAULT_MIX = [
+    ("GET", "/produtos/", 4),
+    ("GET", "/produtos/{produto_id}", 4),
+    ("GET", "/dashboard/stats", 2),
+    ("GET", "/dashboard/recent-sales", 2),
+    ("GET", "/dashboard/low-stock", 1),
+    ("POST", "/sales/", 2),
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summarize(latencies, errors, elapsed):
+    report = {}
+    for endpoint, samples in sorted(latencies.items()):
+        report[endpoint] = {
+            "requests": len(samples),
+            "errors": errors.get(endpoint, 0),
+            "throughput_rps": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+            "mean_ms": round(statistics.mean(samples) * 1000, 2),
+        }
+    all_samples = [sample for samples in latencies.values() for sample in samples]
+    report["__total__"] = {
+        "requests": len(all_samples),
+        "errors": sum(errors.values()),
+        "throughput_rps": round(len(all_samples) / elapsed, 1),
+        "p50_ms": round(percentile(all_samples, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(all_samples, 0.99) * 1000, 2),
+    }
+    return report
+
+
+async def seed(client: httpx.AsyncClient, produtos: int, usuarios: int):
+    token = (await client.post(
+        "/auth/token", data={"username": "admin", "password": "admin123"}
+    )).json()["access_token"]
+    client.headers["Authorization"] = f"Bearer {token}"
+
+    produto_ids = []
+    for index in range(produtos):
+        response = await client.post("/produtos/", json={
+            "nome": f"Produto {index}", "valor": round(random.uniform(1, 20), 2), "estoque": 10_000_000
+        })
+        produto_ids.append(response.json()["id"])
+
+    usuario_ids = []
+    for index in range(usuarios):
+        response = await client.post("/usuarios/", json={
+            "nome": f"Usuario {index}", "nickname": f"user{index}", "saldo": 1_000_000
+        })
+        usuario_ids.append(response.json()["id"])
+
+    return produto_ids, usuario_ids
+
+
+async def run_load(base_url, concurrency, duration, mix, produtos, usuarios):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        produto_ids, usuario_ids = await seed(client, produtos, usuarios)
+
+        endpoints = [(method, path) for method, path, _ in mix]
+        weights = [weight for _, _, weight in mix]
+        latencies = {f"{method} {path}": [] for method, path in endpoints}
+        errors = {}
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                method, path = random.choices(endpoints, weights)[0]
+                url = path.format(produto_id=random.choice(produto_ids), usuario_id=random.choice(usuario_ids))
+                body = None
+                if method == "POST" and path == "/sales/":
+                    body = {
+                        "usuario_id": random.choice(usuario_ids),
+                        "items": [
+                            {"produto_id": random.choice(produto_ids), "quantity": random.randint(1, 3), "unit_price": 0}
+                        ],
+                    }
+                endpoint = f"{method} {path}"
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, url, json=body)
+                    failed = response.status_code >= 400
+                except httpx.TransportError:
+                    failed = True
+                latencies[endpoint].append(time.perf_counter() - start)
+                if failed:
+                    errors[endpoint] = errors.get(endpoint, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--produtos", type=int, default=200)
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--app-dir", default=str(BASE_DIR), help="Checkout whose main:app is served")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp}/load_test.db", EVENT_LOG_DIR=f"{tmp}/event_log")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=args.app_dir, env=env,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            for _ in range(100):
+                try:
+                    httpx.get(f"{base_url}/health")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+
+            report = asyncio.run(run_load(
+                base_url, args.concurrency, args.duration, DEFAULT_MIX, args.produtos, args.usuarios
+            ))
+        finally:
+            server.terminate()
+            server.wait()
+
+    report["__config__"] = {
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "app_dir": args.app_dir,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output)
+
+
+if __name__ == "__main__":
+    main()
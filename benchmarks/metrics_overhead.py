@@ -0,0 +1,55 @@
+"""Per-query cost of the metrics hooks.
+
+Runs the same trivial query on an in-memory SQLite engine with and without
+utils.metrics.instrument_engine() attached (inside a request context, so
+the hooks take their full path) and prints the difference per query.
+
+    python -m benchmarks.metrics_overhead --queries 200000
+"""
+import argparse
+import json
+import time
+
+from sqlalchemy import create_engine, text
+
+from utils import metrics
+
+
+def run(engine, queries: int) -> float:
+    statement = text("SELECT 1")
+    with engine.connect() as connection:
+        for _ in range(1000):
+            connection.execute(statement)
+        start = time.perf_counter()
+        for _ in range(queries):
+            connection.execute(statement)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    plain = create_engine("sqlite://")
+    instrumented = create_engine("sqlite://")
+    metrics.instrument_engine(instrumented)
+
+    token = metrics._current_request.set(metrics.RequestStats("/benchmark"))
+    try:
+        baseline = min(run(plain, args.queries) for _ in range(args.rounds))
+        hooked = min(run(instrumented, args.queries) for _ in range(args.rounds))
+    finally:
+        metrics._current_request.reset(token)
+
+    print(json.dumps({
+        "queries": args.queries,
+        "baseline_us_per_query": round(baseline / args.queries * 1e6, 3),
+        "instrumented_us_per_query": round(hooked / args.queries * 1e6, 3),
+        "overhead_us_per_query": round((hooked - baseline) / args.queries * 1e6, 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Read throughput with 1, 2, 4... worker processes.
+
+For each worker count, starts `python main.py` with WORKERS=<n> on a copy
+of a synthetic dataset and drives read endpoints from several client
+processes for a fixed duration, then reports requests per second and the
+speedup over one worker. Afterwards it writes through one connection and
+revalidates through fresh ones (spread over the workers by the kernel),
+counting 304s that were served for data another worker had changed.
+
+    python -m benchmarks.multi_worker --workers 1,2,4,8 --clients 4 --duration 20
+
+The clients need CPU too: on an N-core machine, compare up to about N/2
+workers, or run the load from another machine.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks import dataset
+from benchmarks.load_test import BASE_DIR, free_port, summarize
+
+READ_MIX = [
+    "/produtos/{produto_id}",
+    "/usuarios/{usuario_id}",
+    "/produtos/",
+    "/dashboard/stats",
+]
+
+
+async def drive(base_url, token, concurrency, duration, produtos, usuarios):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies, errors = [], 0
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                path = random.choice(READ_MIX).format(
+                    produto_id=random.randint(1, produtos), usuario_id=random.randint(1, usuarios)
+                )
+                start = time.perf_counter()
+                try:
+                    failed = (await client.get(path)).status_code >= 400
+                except httpx.TransportError:
+                    failed = True
+                latencies.append(time.perf_counter() - start)
+                errors += failed
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def client_process(args):
+    return asyncio.run(drive(*args))
+
+
+def stale_revalidations(base_url, token, produto_id, writes):
+    """304s answered with an ETag the data had already moved past"""
+    headers = {"Authorization": f"Bearer {token}"}
+    path = f"/produtos/{produto_id}"
+    etag = httpx.get(base_url + path, headers=headers).headers["etag"]
+    stale = 0
+    for index in range(writes):
+        httpx.put(base_url + path, json={"estoque": 1_000 + index}, headers=headers).raise_for_status()
+        # A new connection each time, so any worker may answer
+        response = httpx.get(base_url + path, headers={**headers, "If-None-Match": etag, "Connection": "close"})
+        stale += response.status_code == 304
+        etag = response.headers["etag"]
+    return stale
+
+
+def start_server(tmp, workers, db_path):
+    port = free_port()
+    event_log_dir = Path(tmp) / f"event_log_{workers}"
+    env = dict(
+        os.environ, WORKERS=str(workers), HOST="127.0.0.1", PORT=str(port),
+        DATABASE_URL=f"sqlite:///{db_path}", EVENT_LOG_DIR=str(event_log_dir), SLOW_QUERY_MS="0",
+    )
+    env.pop("CANTINA_WORKER", None)
+    server = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=BASE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    # Every worker creates its event log stream during startup
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        ready = len(list(event_log_dir.glob("worker-*"))) if workers > 1 else 1
+        try:
+            if ready >= workers and httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                return server, f"http://127.0.0.1:{port}"
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"{workers} workers did not start")
+
+
+def run(args, tmp, workers):
+    db_path = Path(tmp) / f"cantina_{workers}.db"
+    dataset.prepare(db_path, args.usuarios, args.produtos, args.sales)
+    server, base_url = start_server(tmp, workers, db_path)
+    try:
+        token = httpx.post(
+            base_url + "/auth/token", data={"username": "admin", "password": "admin123"}
+        ).json()["access_token"]
+        # Warm every worker's caches before measuring
+        asyncio.run(drive(base_url, token, args.concurrency, 2, args.produtos, args.usuarios))
+
+        client_args = [(base_url, token, args.concurrency, args.duration, args.produtos, args.usuarios)] * args.clients
+        started = time.perf_counter()
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.map(client_process, client_args)
+        elapsed = time.perf_counter() - started
+
+        latencies = [sample for samples, _ in results for sample in samples]
+        errors = sum(failed for _, failed in results)
+        report = summarize({"reads": latencies}, {"reads": errors}, elapsed)["reads"]
+        report["stale_304s"] = stale_revalidations(base_url, token, 1, args.writes)
+        return report
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="Worker counts to compare")
+    parser.add_argument("--clients", type=int, default=4, help="Load generating processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="Connections per client process")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--writes", type=int, default=50, help="Writes checked for stale 304s")
+    parser.add_argument("--usuarios", type=int, default=1_000)
+    parser.add_argument("--produtos", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=50_000)
+    args = parser.parse_args()
+
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in [int(value) for value in args.workers.split(",")]:
+            report[workers] = run(args, tmp, workers)
+    baseline = report[min(report)]["throughput_rps"]
+    for result in report.values():
+        result["speedup"] = round(result["throughput_rps"] / baseline, 2)
+    report["__config__"] = {"cpu_count": os.cpu_count(), "clients": args.clients, "concurrency": args.concurrency}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""What archiving closed seasons does to the main database.
+
+Builds a synthetic history, then measures the main file's size, a backup
+and a few current-season reads (today's dashboard, this week's sales,
+this month's analytics) before and after archive_season.py moves
+everything older than `--keep-days` into an archive (and vacuums). A
+report over the whole history, which has to read the archive too, is
+timed both ways as well; every report must come out the same.
+
+    python -m benchmarks.season_archive --sales 200000 --keep-days 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+
+from benchmarks import dataset
+from benchmarks.load_test import summarize
+
+
+def requests():
+    today = date.today()
+    return {
+        "GET /dashboard/stats": ("/dashboard/stats", {}),
+        "GET /sales/ (last 7 days)": ("/sales/", {"date_from": str(today - timedelta(days=6)), "limit": 1000}),
+        "GET /analytics/sales (this month)": ("/analytics/sales", {"date_from": str(today.replace(day=1))}),
+        "GET /analytics/sales (all history)": ("/analytics/sales", {
+            "date_from": str(today - timedelta(days=3650)), "granularity": "week",
+        }),
+    }
+
+
+async def measure(client, runs):
+    from utils import analytics
+
+    report, bodies = {}, {}
+    for name, (path, params) in requests().items():
+        latencies = []
+        for _ in range(runs):
+            # Time the queries, not the analytics cache
+            analytics.cache.clear()
+            start = time.perf_counter()
+            response = await client.get(path, params=params)
+            latencies.append(time.perf_counter() - start)
+        bodies[name] = response.json()
+        report[name] = summarize({name: latencies}, {}, sum(latencies))[name]["p50_ms"]
+    return report, bodies
+
+
+def database_report(db_path, backup_dir):
+    from utils.backup import BackupManager
+
+    started = time.perf_counter()
+    result = BackupManager(backup_dir=str(backup_dir)).create_backup()
+    return {
+        "main_file_mb": round(db_path.stat().st_size / 1024 / 1024, 1),
+        "backup_seconds": round(time.perf_counter() - started, 2),
+        "backup_ok": result["success"],
+    }
+
+
+async def run(args, db_path, backup_dir):
+    from main import app
+    from utils import archive
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            token = (await client.post(
+                "/auth/token", data={"username": "admin", "password": "admin123"}
+            )).json()["access_token"]
+            client.headers["Authorization"] = f"Bearer {token}"
+
+            before = database_report(db_path, backup_dir)
+            before["p50_ms"], before_bodies = await measure(client, args.runs)
+
+            started = time.perf_counter()
+            moved = archive.archive_season("bench", date.today() - timedelta(days=args.keep_days))
+            archive.vacuum()
+            archive_seconds = time.perf_counter() - started
+
+            after = database_report(db_path, backup_dir)
+            after["p50_ms"], after_bodies = await measure(client, args.runs)
+    finally:
+        await app.router.shutdown()
+
+    return {
+        "archived": {
+            "sales": moved["sales"],
+            "balance_transactions": moved["balance_transactions"],
+            "archive_mb": round(moved["bytes"] / 1024 / 1024, 1),
+            "seconds": round(archive_seconds, 2),
+        },
+        "before": before,
+        "after": after,
+        "same_results": before_bodies == after_bodies,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, default=1_000)
+    parser.add_argument("--produtos", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=50_000)
+    parser.add_argument("--keep-days", type=int, default=30, help="Days left in the main file")
+    parser.add_argument("--runs", type=int, default=10, help="Requests per endpoint")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "cantina_bench.db"
+        # The app binds its engines to DATABASE_URL at import time
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+        os.environ["EVENT_LOG_DIR"] = str(Path(tmp) / "event_log")
+        os.environ["ARCHIVE_DIR"] = str(Path(tmp) / "archives")
+        os.environ.setdefault("SLOW_QUERY_MS", "0")
+        dataset.prepare(db_path, args.usuarios, args.produtos, args.sales)
+        backup_dir = Path(tmp) / "backups"
+        report = asyncio.run(run(args, db_path, backup_dir))
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
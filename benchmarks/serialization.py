@@ -0,0 +1,132 @@
+"""Serialization time and payload size of 1,000-sale pages.
+
+Builds the same pages of a synthetic dataset two ways and checks they
+produce the same JSON:
+
+    response_model  the previous read_sales (with its relationships eager
+                    loaded, so both sides run the same queries): ORM objects
+                    validated against the response_model, then
+                    jsonable_encoder + JSONResponse (FastAPI's default)
+    dump_json       the current read_sales: plain rows written straight to
+                    JSON bytes by the precompiled schemas.SaleList adapter
+
+then reports the size and cost of the gzip/br encodings the compression
+middleware negotiates:
+
+    python -m benchmarks.serialization --page-size 1000 --pages 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks import dataset
+
+
+def _timed(function, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def run(args):
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from sqlalchemy.orm import joinedload, selectinload
+
+    import models
+    from database import SessionLocal
+    from main import app
+    from routers.sales import read_sales
+    from utils import compression
+
+    route = next(route for route in app.routes if route.path == "/sales/" and "GET" in route.methods)
+    loop = asyncio.new_event_loop()
+    db = SessionLocal()
+    results = {"response_model_ms": [], "dump_json_ms": [], "bytes": [], "gzip": [], "br": []}
+    try:
+        for page in range(args.pages):
+            skip = page * args.page_size
+
+            def default_path():
+                db.expunge_all()
+                sales = db.query(models.Sale).join(models.Usuario).options(
+                    joinedload(models.Sale.usuario),
+                    selectinload(models.Sale.items).joinedload(models.SaleItem.produto)
+                ).offset(skip).limit(args.page_size).all()
+                for sale in sales:
+                    sale.usuario_nome = sale.usuario.nome
+                    sale.usuario_nickname = sale.usuario.nickname
+                    for sale_item in sale.items:
+                        sale_item.produto_nome = sale_item.produto.nome
+                content = loop.run_until_complete(serialize_response(
+                    field=route.response_field, response_content=sales, is_coroutine=False
+                ))
+                return JSONResponse(content).body
+
+            def fast_path():
+                return read_sales(
+                    skip=skip, limit=args.page_size, usuario_id=None, date_from=None, date_to=None,
+                    db=db, current_user=None
+                ).body
+
+            default_seconds, default_body = _timed(default_path, args.repeat)
+            fast_seconds, fast_body = _timed(fast_path, args.repeat)
+            assert json.loads(default_body) == json.loads(fast_body)
+
+            results["response_model_ms"].append(default_seconds * 1000)
+            results["dump_json_ms"].append(fast_seconds * 1000)
+            results["bytes"].append(len(fast_body))
+            for encoding in ("gzip", "br"):
+                if encoding == "br" and compression.brotli is None:
+                    continue
+                seconds, compressed = _timed(lambda: compression._compress(encoding, fast_body), args.repeat)
+                results[encoding].append((len(compressed), seconds * 1000))
+    finally:
+        db.close()
+        loop.close()
+
+    report = {
+        "page_size": args.page_size,
+        "pages": args.pages,
+        "response_model_ms": round(statistics.median(results["response_model_ms"]), 2),
+        "dump_json_ms": round(statistics.median(results["dump_json_ms"]), 2),
+        "identity_bytes": round(statistics.median(results["bytes"])),
+    }
+    report["speedup"] = round(report["response_model_ms"] / report["dump_json_ms"], 1)
+    for encoding in ("gzip", "br"):
+        if results[encoding]:
+            report[f"{encoding}_bytes"] = round(statistics.median(size for size, _ in results[encoding]))
+            report[f"{encoding}_ms"] = round(statistics.median(ms for _, ms in results[encoding]), 2)
+            report[f"{encoding}_ratio"] = round(report["identity_bytes"] / report[f"{encoding}_bytes"], 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, default=1_000)
+    parser.add_argument("--produtos", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=50_000)
+    parser.add_argument("--page-size", type=int, default=1_000)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5, help="Timings per page (median is kept)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "cantina_bench.db"
+        # The app binds its engines to DATABASE_URL at import time
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+        dataset.prepare(db_path, args.usuarios, args.produtos, args.sales)
+        print(json.dumps(run(args), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""In-process benchmark suite on a synthetic cantina.
+
+Seeds (or reuses a cached copy of) a deterministic dataset, then drives the
+FastAPI app in-process through httpx.ASGITransport with realistic workloads:
+
+    checkout   bursts of POST /sales/ from many tills at once
+    dashboard  staff screens polling the dashboard endpoints
+    search     type-ahead over produtos and usuarios, one request per keystroke
+    backup     periodic POST /backup/create while everything else runs
+    mixed      all of the above at the same time
+
+For every endpoint it reports throughput, p50/p95/p99 latency and the
+database queries per request (from utils.metrics), as JSON:
+
+    python -m benchmarks.suite                                 # 10k usuarios, 500 produtos, 1M sales
+    python -m benchmarks.suite --sales 100000 --duration 10 --output before.json
+    python -m benchmarks.suite --scenario checkout --scenario mixed
+
+Client and app share one event loop, so absolute latencies include the
+client's own overhead; compare runs made on the same machine.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks import dataset
+from benchmarks.load_test import summarize
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SCENARIOS = ("checkout", "dashboard", "search", "backup", "mixed")
+
+# Clients per workload in the mixed scenario
+MIXED_CLIENTS = {"checkout": 20, "dashboard": 5, "search": 10, "backup": 1}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    async def request(self, client, method, route, url=None, **kwargs):
+        endpoint = f"{method} {route}"
+        samples = self.latencies.setdefault(endpoint, [])
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url or route, **kwargs)
+            failed = response.status_code >= 400
+        except httpx.TransportError:
+            response, failed = None, True
+        samples.append(time.perf_counter() - start)
+        if failed:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return response
+
+
+class Workloads:
+    def __init__(self, usuario_ids, produto_ids, nomes):
+        self.usuario_ids = usuario_ids
+        self.produto_ids = produto_ids
+        self.nomes = nomes
+
+    async def checkout(self, client, recorder, deadline, rng):
+        # A till rings up a queue of students, then waits for the next rush
+        while time.perf_counter() < deadline:
+            for _ in range(rng.randint(5, 20)):
+                await recorder.request(client, "POST", "/sales/", json={
+                    "usuario_id": rng.choice(self.usuario_ids),
+                    "items": [
+                        {"produto_id": produto_id, "quantity": rng.randint(1, 3), "unit_price": 0}
+                        for produto_id in rng.sample(self.produto_ids, rng.randint(1, 4))
+                    ],
+                })
+            await asyncio.sleep(rng.uniform(0.05, 0.2))
+
+    async def dashboard(self, client, recorder, deadline, rng):
+        while time.perf_counter() < deadline:
+            await recorder.request(client, "GET", "/dashboard/stats")
+            await recorder.request(client, "GET", "/dashboard/recent-sales")
+            await recorder.request(client, "GET", "/dashboard/low-stock")
+            await asyncio.sleep(rng.uniform(0.5, 1.0))
+
+    async def search(self, client, recorder, deadline, rng):
+        while time.perf_counter() < deadline:
+            route = rng.choice(["/produtos/", "/usuarios/"])
+            term = rng.choice(self.nomes[route])
+            for length in range(1, len(term) + 1):
+                await recorder.request(
+                    client, "GET", route, params={"search": term[:length], "limit": 10}
+                )
+                await asyncio.sleep(rng.uniform(0.01, 0.05))
+
+    async def backup(self, client, recorder, deadline, rng):
+        while time.perf_counter() < deadline:
+            response = await recorder.request(client, "POST", "/backup/create")
+            if response is not None and response.status_code == 200:
+                filename = response.json()["filename"]
+                await recorder.request(
+                    client, "DELETE", "/backup/delete/{filename}", url=f"/backup/delete/{filename}"
+                )
+            await asyncio.sleep(rng.uniform(1.0, 2.0))
+
+
+async def run_scenario(client, workloads, scenario, concurrency, duration, seed):
+    from utils.metrics import registry
+
+    recorder = Recorder()
+    clients = MIXED_CLIENTS if scenario == "mixed" else {scenario: 1 if scenario == "backup" else concurrency}
+
+    registry.reset()
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        getattr(workloads, workload)(client, recorder, deadline, random.Random(f"{seed}-{workload}-{index}"))
+        for workload, count in clients.items()
+        for index in range(count)
+    ))
+    report = summarize(recorder.latencies, recorder.errors, time.perf_counter() - started)
+
+    for endpoint, totals in registry.snapshot().items():
+        if endpoint in report and totals["requests"]:
+            report[endpoint]["queries_per_request"] = round(totals["queries"] / totals["requests"], 2)
+            report[endpoint]["db_ms_per_request"] = round(totals["db_seconds"] / totals["requests"] * 1000, 2)
+    return report
+
+
+def _prepare_for_checkout(db_path):
+    # Keep checkouts from failing on balance or stock during long runs
+    connection = sqlite3.connect(db_path)
+    with connection:
+        connection.execute("UPDATE usuarios SET saldo_cents = saldo_cents + 100000000")
+        connection.execute("UPDATE usuario_summaries SET saldo_cents = saldo_cents + 100000000")
+        connection.execute("UPDATE produtos SET estoque = estoque + 1000000")
+    connection.close()
+
+
+async def run_suite(args, db_path, backup_dir):
+    # The app binds its engines to DATABASE_URL at import time
+    from main import app
+    from routers import backup
+
+    backup.backup_manager.backup_dir = Path(backup_dir)
+
+    connection = sqlite3.connect(db_path)
+    usuario_ids = [row[0] for row in connection.execute("SELECT id FROM usuarios")]
+    produto_ids = [row[0] for row in connection.execute("SELECT id FROM produtos")]
+    nomes = {
+        "/produtos/": [row[0] for row in connection.execute("SELECT DISTINCT nome FROM produtos LIMIT 200")],
+        "/usuarios/": [row[0] for row in connection.execute("SELECT DISTINCT nome FROM usuarios LIMIT 200")],
+    }
+    connection.close()
+    workloads = Workloads(usuario_ids, produto_ids, nomes)
+
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            token = (await client.post(
+                "/auth/token", data={"username": "admin", "password": "admin123"}
+            )).json()["access_token"]
+            client.headers["Authorization"] = f"Bearer {token}"
+
+            reports = {}
+            for scenario in args.scenario or SCENARIOS:
+                reports[scenario] = await run_scenario(
+                    client, workloads, scenario, args.concurrency, args.duration, args.seed
+                )
+            return reports
+    finally:
+        await app.router.shutdown()
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuarios", type=int, default=10_000)
+    parser.add_argument("--produtos", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rebuild", action="store_true", help="Regenerate the cached dataset")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS)
+    parser.add_argument("--concurrency", type=int, default=20, help="Clients per single-workload scenario")
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per scenario")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "cantina_bench.db"
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+        os.environ["EVENT_LOG_DIR"] = str(Path(tmp) / "event_log")
+        os.environ.setdefault("SLOW_QUERY_MS", "0")
+
+        started = time.perf_counter()
+        dataset.prepare(db_path, args.usuarios, args.produtos, args.sales, args.seed, args.rebuild)
+        _prepare_for_checkout(db_path)
+        setup_seconds = time.perf_counter() - started
+
+        backup_dir = Path(tmp) / "backups"
+        backup_dir.mkdir()
+        reports = asyncio.run(run_suite(args, db_path, backup_dir))
+
+    reports["__config__"] = {
+        "revision": _git_revision(),
+        "usuarios": args.usuarios,
+        "produtos": args.produtos,
+        "sales": args.sales,
+        "seed": args.seed,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "setup_s": round(setup_seconds, 1),
+    }
+    output = json.dumps(reports, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Per-schema validation and serialization cost of list responses.
+
+For each response schema, times a list of `--items` in-memory objects (ORM
+instances or dicts, as the routers produce them) through:
+
+    response_model  FastAPI's path for returned objects: validate against the
+                    route's response field, serialize to Python, json.dumps
+    adapter         utils.responses.json_response with the precompiled
+                    schemas.*List adapter: validate once, JSON from pydantic-core
+
+and reports how long each request body schema takes to validate from JSON.
+No database is involved:
+
+    python -m benchmarks.validation --items 1000 --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+import models
+import schemas
+from utils.events import sale_event
+from utils.responses import json_response
+
+
+def _usuarios(count, now):
+    return [
+        models.Usuario(
+            id=index, nome=f"Usuario {index}", nickname=f"user{index}", quarto=f"{index % 40}",
+            nome_pai="Pai", nome_mae="Mae", saldo_cents=index * 137, created_at=now
+        )
+        for index in range(count)
+    ]
+
+
+def _produtos(count, now):
+    return [
+        models.Produto(id=index, nome=f"Produto {index}", valor_cents=250 + index, estoque=index % 90, created_at=now)
+        for index in range(count)
+    ]
+
+
+def _produto_stats(count, now):
+    return [
+        {
+            "produto_id": index, "produto_nome": f"Produto {index}", "produto_valor": Decimal("2.50"),
+            "estoque_atual": index % 90, "total_vendas": index * 3, "quantidade_vendida": index * 4,
+            "receita_total": Decimal(index * 10), "ultima_venda": now, "vendas_7d": 12, "vendas_30d": 40,
+            "velocidade_7d": 1.71, "velocidade_30d": 1.33,
+        }
+        for index in range(count)
+    ]
+
+
+def _recent_sales(count, now):
+    usuario = models.Usuario(nome="Usuario")
+    return [
+        sale_event(
+            models.Sale(id=index, total_amount_cents=index * 55, created_at=now), usuario,
+            ["Refrigerante", "Salgado", "Bala"]
+        )
+        for index in range(count)
+    ]
+
+
+def _low_stock(count, now):
+    return [
+        {
+            "id": index, "nome": f"Produto {index}", "estoque": index % 10, "consumo_diario": 2.5,
+            "dias_ate_esgotar": (index % 10) / 2.5, "ultimo_reabastecimento": now - timedelta(days=3),
+        }
+        for index in range(count)
+    ]
+
+
+def _balance_transactions(count, now):
+    return [
+        models.BalanceTransaction(
+            id=index, usuario_id=7, amount_cents=index * 25, transaction_type="credit" if index % 2 else "debit",
+            description="Recarga de saldo", created_at=now
+        )
+        for index in range(count)
+    ]
+
+
+def _backups(count, now):
+    return [
+        {
+            "filename": f"cantina_backup_{index}.db", "path": f"backups/cantina_backup_{index}.db",
+            "size": 1_048_576, "size_mb": 1.0, "created_at": now.isoformat(),
+            "created_at_formatted": now.strftime("%d/%m/%Y %H:%M:%S"),
+        }
+        for index in range(count)
+    ]
+
+
+# schema, its precompiled list adapter, sample factory
+SCHEMAS = {
+    "Usuario": (schemas.Usuario, schemas.UsuarioList, _usuarios),
+    "Produto": (schemas.Produto, schemas.ProdutoList, _produtos),
+    "ProdutoStats": (schemas.ProdutoStats, schemas.ProdutoStatsList, _produto_stats),
+    "RecentSale": (schemas.RecentSale, schemas.RecentSaleList, _recent_sales),
+    "LowStockProduto": (schemas.LowStockProduto, schemas.LowStockProdutoList, _low_stock),
+    "BalanceTransaction": (schemas.BalanceTransaction, schemas.BalanceTransactionList, _balance_transactions),
+    "BackupInfo": (schemas.BackupInfo, schemas.BackupInfoList, _backups),
+}
+
+
+# Request bodies as the tills and the admin screens send them
+REQUEST_BODIES = {
+    "SaleCreate": (schemas.SaleCreate, {
+        "usuario_id": 12,
+        "items": [{"produto_id": produto_id, "quantity": 2, "unit_price": 3.5} for produto_id in range(1, 4)],
+    }),
+    "UsuarioCreate": (schemas.UsuarioCreate, {
+        "nome": "Usuario", "nickname": "usuario", "quarto": "12", "saldo": 50.0,
+    }),
+    "ProdutoCreate": (schemas.ProdutoCreate, {"nome": "Refrigerante", "valor": 5.5, "estoque": 48}),
+    "ProdutoUpdate": (schemas.ProdutoUpdate, {"valor": 6.0}),
+}
+
+
+def _median_seconds(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--schema", action="append", choices=sorted(SCHEMAS))
+    args = parser.parse_args()
+
+    now = datetime(2024, 3, 1, 12, 30)
+    loop = asyncio.new_event_loop()
+    report = {}
+    try:
+        for name in args.schema or SCHEMAS:
+            schema, adapter, factory = SCHEMAS[name]
+            items = factory(args.items, now)
+            field = create_response_field(name=f"Response_{name}", type_=List[schema])
+
+            def response_model():
+                content = loop.run_until_complete(serialize_response(
+                    field=field, response_content=items, is_coroutine=True
+                ))
+                return JSONResponse(content).body
+
+            def precompiled():
+                return json_response(adapter, items).body
+
+            assert json.loads(response_model()) == json.loads(precompiled())
+            default_seconds = _median_seconds(response_model, args.repeat)
+            adapter_seconds = _median_seconds(precompiled, args.repeat)
+            report[name] = {
+                "response_model_us_per_item": round(default_seconds / args.items * 1e6, 2),
+                "adapter_us_per_item": round(adapter_seconds / args.items * 1e6, 2),
+                "speedup": round(default_seconds / adapter_seconds, 1),
+            }
+    finally:
+        loop.close()
+
+    report["requests"] = {}
+    for name, (schema, body) in REQUEST_BODIES.items():
+        raw = json.dumps(body).encode()
+        seconds = _median_seconds(lambda: [schema.model_validate_json(raw) for _ in range(args.items)], args.repeat)
+        report["requests"][name] = {"validate_json_us": round(seconds / args.items * 1e6, 2)}
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
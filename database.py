@@ -1,19 +1,147 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import sessionmaker, declarative_base
+import logging
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cantina.db")
 
+# Async drivers for the same database, used by the async request path
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def get_async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+def get_read_only_url(url: str) -> str:
+    # SQLite files are reopened through a read-only URI; other databases
+    # just get a separate pool unless READ_DATABASE_URL points at a replica
+    if url.startswith("sqlite:///") and ":memory:" not in url:
+        return f"sqlite:///file:{url[len('sqlite:///'):]}?mode=ro&uri=true"
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", get_async_url(DATABASE_URL))
+
+# Read-only routing for GET endpoints. Reads run on their own pool, so a slow
+# dashboard or export never holds a connection that checkout needs.
+#
+# Consistency: with the default read-only URI, readers open the primary file
+# itself and every read transaction sees everything committed before it
+# started (WAL snapshot), so a client reads its own writes. If
+# READ_DATABASE_URL points at a replica copy instead, reads are only as fresh
+# as the last time the replica was synced.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL", get_read_only_url(DATABASE_URL))
+ASYNC_READ_DATABASE_URL = os.getenv("ASYNC_READ_DATABASE_URL", get_async_url(READ_DATABASE_URL))
+READ_POOL_SIZE = int(os.getenv("READ_POOL_SIZE", "10"))
+
 engine = create_engine(
     DATABASE_URL, 
     connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
 )
 
+read_engine = create_engine(
+    READ_DATABASE_URL,
+    connect_args={"check_same_thread": False} if "sqlite" in READ_DATABASE_URL else {},
+    pool_size=READ_POOL_SIZE,
+    max_overflow=READ_POOL_SIZE * 2
+)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+# aiosqlite defaults to NullPool (a new connection and thread per session);
+# pool the async connections like the sync ones
+async_engine = create_async_engine(ASYNC_DATABASE_URL, poolclass=AsyncAdaptedQueuePool)
+async_read_engine = create_async_engine(
+    ASYNC_READ_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=READ_POOL_SIZE,
+    max_overflow=READ_POOL_SIZE * 2
+)
+
+# expire_on_commit=False: attributes can't be lazily reloaded outside the
+# event loop, so objects must stay usable after commit for the response
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+AsyncReadSessionLocal = async_sessionmaker(
+    async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+def _enable_wal(dbapi_connection, connection_record):
+    # WAL lets readers keep their snapshot while a writer commits, instead
+    # of the rollback journal's shared lock blocking create_sale
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+if DATABASE_URL.startswith("sqlite") and ":memory:" not in DATABASE_URL:
+    event.listen(engine, "connect", _enable_wal)
+    event.listen(async_engine.sync_engine, "connect", _enable_wal)
+
+
+# Closed seasons moved out by archive_season.py (see utils.archive)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archives")
+ARCHIVE_SCHEMA_PREFIX = "season_"
+
+
+def _attach_archives(dbapi_connection, connection_record, connection_proxy):
+    # Every checkout (outside any transaction: ATTACH can't run inside one)
+    # brings the connection's attached archives in line with the registry,
+    # so archives added or restored by another process are picked up. What
+    # is attached, with its date range, goes in connection_record.info for
+    # utils.archive to build its queries from.
+    cursor = dbapi_connection.cursor()
+    try:
+        try:
+            cursor.execute("SELECT id, filename, date_from, date_to FROM season_archives ORDER BY id")
+            registered = cursor.fetchall()
+        except Exception:
+            # Before the season_archives migration
+            registered = []
+        wanted = {f"{ARCHIVE_SCHEMA_PREFIX}{row[0]}": row for row in registered}
+
+        cursor.execute("PRAGMA database_list")
+        attached = {row[1] for row in cursor.fetchall() if row[1].startswith(ARCHIVE_SCHEMA_PREFIX)}
+        for schema in attached - wanted.keys():
+            cursor.execute(f"DETACH DATABASE {schema}")
+        archives = []
+        for schema, (_, filename, date_from, date_to) in wanted.items():
+            if schema not in attached:
+                path = os.path.join(ARCHIVE_DIR, filename)
+                if not os.path.exists(path):
+                    logger.error("season archive %s is registered but missing", path)
+                    continue
+                cursor.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+            archives.append((schema, str(date_from), str(date_to)))
+        connection_record.info["season_archives"] = archives
+    finally:
+        cursor.close()
+
+
+def attach_archives(db_engine):
+    """Keep season archives attached on `db_engine`'s connections"""
+    if db_engine.dialect.name == "sqlite" and ":memory:" not in str(db_engine.url):
+        event.listen(db_engine, "checkout", _attach_archives)
+
+
+for _engine in (engine, read_engine, async_engine.sync_engine, async_read_engine.sync_engine):
+    attach_archives(_engine)
+
 
 Base = declarative_base()
 
@@ -24,3 +152,21 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
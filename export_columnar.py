@@ -0,0 +1,42 @@
+"""Export usuarios, produtos, sales and sale_items as columnar NumPy files.
+
+    python export_columnar.py                           # exports/cantina-<timestamp>/
+    python export_columnar.py exports/temporada-2026    # a chosen directory
+    python export_columnar.py --chunk-size 10000 DIR    # smaller read chunks
+
+Safe to run against a live server: it reads one consistent snapshot over
+the read-only connection. Load the result with utils.columnar.load().
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+from utils import columnar
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", nargs="?", help="Where to write the export (must not exist)")
+    parser.add_argument("--chunk-size", type=int, default=columnar.CHUNK_SIZE, help="Rows read at a time")
+    args = parser.parse_args(argv)
+
+    directory = args.directory or f"exports/cantina-{datetime.utcnow():%Y%m%d-%H%M%S}"
+    started = time.perf_counter()
+    try:
+        manifest = columnar.export(directory, chunk_size=args.chunk_size)
+    except FileExistsError as exc:
+        print(f"❌ {exc}")
+        return 1
+
+    size = sum(path.stat().st_size for path in Path(directory).rglob("*") if path.is_file())
+    for name, table in manifest["tables"].items():
+        print(f"  {name}: {table['rows']} rows, {len(table['columns'])} columns")
+    print(f"  strings: {manifest['strings']} distinct")
+    print(f"✅ exported to {directory} ({size / 1024 / 1024:.1f} MB in {time.perf_counter() - started:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
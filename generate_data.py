@@ -0,0 +1,327 @@
+"""Bulk synthetic data for demos, benchmarks and capacity tests.
+
+Loads usuarios, produtos, sales, sale_items, restocks and
+balance_transactions with batched executemany of Core inserts inside a
+single transaction, with bulk-load pragmas and the secondary indexes
+built once at the end, then rebuilds the materialized tables in SQL:
+
+    python generate_data.py                                   # 10k usuarios, 500 produtos, 1M vendas
+    python generate_data.py --sales 5000000 --database sqlite:///./capacity.db
+    python generate_data.py --usuarios 50 --produtos 20 --sales 500 --reset
+
+The history is consistent: every sale has its debit, every usuario's saldo
+equals credits minus debits and every produto's estoque equals its initial
+stock plus restocks minus units sold. The same --seed always produces the
+same rows.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate, chain
+
+from sqlalchemy import create_engine, event, insert, text
+
+BATCH_SIZE = 100_000
+
+# The cantina is open from 7h to 21h
+OPEN_HOUR, CLOSE_HOUR = 7, 21
+
+# Items per sale and how often each size happens
+ITEMS_PER_SALE = [1, 2, 3, 4]
+ITEMS_WEIGHTS = [45, 30, 15, 10]
+
+PRODUTO_NOMES = [
+    "Refrigerante", "Suco", "Água Mineral", "Sanduíche", "Pão de Queijo", "Coxinha",
+    "Chocolate", "Sorvete", "Biscoito", "Salgadinho", "Bala", "Picolé", "Açaí",
+]
+PRIMEIROS_NOMES = [
+    "Ana", "João", "Maria", "Pedro", "Lucas", "Julia", "Gabriel", "Beatriz",
+    "Rafael", "Larissa", "Mateus", "Camila", "Felipe", "Sofia", "Bruno", "Laura",
+]
+SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Costa", "Pereira", "Lima", "Almeida"]
+
+# Tables written by the generator, children first (order used by --reset)
+GENERATED_TABLES = [
+    "produto_daily_sales", "produto_stats", "usuario_summaries",
+    "balance_transactions", "restocks", "sale_items", "sales", "produtos", "usuarios",
+]
+
+
+def _bulk_pragmas(dbapi_connection, connection_record):
+    # Single writer, throwaway data: skip fsyncs, keep the rollback journal
+    # in memory and give SQLite a large page cache
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=MEMORY")
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute("PRAGMA cache_size=-262144")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA locking_mode=EXCLUSIVE")
+    cursor.close()
+
+
+def _insert_batches(connection, table, columns, rows, batch_size=BATCH_SIZE):
+    """executemany of a Core insert() in batches; `rows` are tuples in `columns` order.
+
+    The statement is compiled once and each batch goes straight to the
+    DBAPI cursor: at millions of rows SQLAlchemy's per-row parameter
+    handling costs more than SQLite's insert itself. Values must already be
+    in database form (see _to_db).
+    """
+    dialect = connection.dialect
+    compiled = insert(table).compile(dialect=dialect, column_keys=list(columns))
+    if dialect.positional and list(compiled.positiontup) != list(columns):
+        raise ValueError(f"Unexpected parameter order for {table.name}: {compiled.positiontup}")
+
+    count = 0
+    for batch in _batched(rows, batch_size):
+        if not dialect.positional:
+            batch = [dict(zip(columns, row)) for row in batch]
+        connection.exec_driver_sql(str(compiled), batch)
+        count += len(batch)
+    return count
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _to_db(connection, column):
+    """The column type's own bind conversion, so rows match what the ORM writes"""
+    processor = column.type.bind_processor(connection.dialect)
+    return processor or (lambda value: value)
+
+
+def _timestamps(rng, count, start, days):
+    """`count` sorted datetimes within opening hours over `days` days"""
+    open_seconds = (CLOSE_HOUR - OPEN_HOUR) * 3600
+    offsets = sorted(
+        day * 86400 + OPEN_HOUR * 3600 + rng.random() * open_seconds
+        for day in rng.choices(range(days), k=count)
+    )
+    return [start + timedelta(seconds=offset) for offset in offsets]
+
+
+def generate(engine, usuarios=10_000, produtos=500, sales=1_000_000, restocks_per_produto=20,
+             days=90, until=None, seed=42, batch_size=BATCH_SIZE, log=print):
+    """Bulk-load a synthetic history into an empty (or --reset) database"""
+    import models
+    from utils.summaries import rebuild_materialized
+
+    rng = random.Random(seed)
+    until = until or datetime.utcnow()
+    start = datetime(until.year, until.month, until.day) - timedelta(days=days - 1)
+    counts = {}
+    timer = time.perf_counter()
+
+    def step(name, count=None):
+        nonlocal timer
+        now = time.perf_counter()
+        if count is None:
+            log(f"  {name}: {now - timer:.1f}s")
+        else:
+            counts[name] = count
+            log(f"  {name}: {count} rows in {now - timer:.1f}s")
+        timer = now
+
+    with engine.begin() as connection:
+        # Secondary indexes are rebuilt once at the end instead of per row
+        bulk_tables = [models.Sale.__table__, models.SaleItem.__table__, models.BalanceTransaction.__table__]
+        indexes = [index for table in bulk_tables for index in table.indexes]
+        for index in indexes:
+            index.drop(connection, checkfirst=True)
+
+        # Produtos: a few best sellers and a long tail
+        produto_ids = list(range(1, produtos + 1))
+        prices = [rng.randrange(150, 2500, 50) for _ in produto_ids]
+        popularity = list(accumulate(1 / rank ** 0.8 for rank in range(1, produtos + 1)))
+        popularity_order = list(produto_ids)
+        rng.shuffle(popularity_order)
+
+        # Sales, their items and who paid for them
+        sale_times = _timestamps(rng, sales, start, days)
+        sale_sizes = rng.choices(ITEMS_PER_SALE, ITEMS_WEIGHTS, k=sales)
+        sale_usuarios = rng.choices(range(1, usuarios + 1), k=sales)
+        item_produtos = rng.choices(popularity_order, cum_weights=popularity, k=sum(sale_sizes))
+        item_quantities = rng.choices([1, 1, 1, 2, 2, 3], k=len(item_produtos))
+
+        sold = [0] * (produtos + 1)
+        spent = [0] * (usuarios + 1)
+        sale_totals = []
+        position = 0
+        for usuario_id, size in zip(sale_usuarios, sale_sizes):
+            total = 0
+            for index in range(position, position + size):
+                produto_id = item_produtos[index]
+                total += prices[produto_id - 1] * item_quantities[index]
+                sold[produto_id] += item_quantities[index]
+            position += size
+            sale_totals.append(total)
+            spent[usuario_id] += total
+
+        def item_rows():
+            # Built while inserting, millions of rows don't need to sit in memory
+            position = 0
+            for sale_id, size in enumerate(sale_sizes, start=1):
+                for index in range(position, position + size):
+                    produto_id = item_produtos[index]
+                    price = prices[produto_id - 1]
+                    quantity = item_quantities[index]
+                    yield (sale_id, produto_id, quantity, price, price * quantity)
+                position += size
+
+        # Restocks cover what was sold beyond the initial stock
+        initial_estoque = [rng.randint(0, 200) for _ in produto_ids]
+        restock_rows = []
+        final_estoque = []
+        for produto_id in produto_ids:
+            needed = max(0, sold[produto_id] - initial_estoque[produto_id - 1]) + rng.randint(0, 300)
+            times = sorted(start + timedelta(seconds=rng.random() * days * 86400)
+                           for _ in range(restocks_per_produto)) if needed else []
+            remaining = needed
+            for number, created_at in enumerate(times):
+                quantity = remaining if number == len(times) - 1 else needed // len(times)
+                remaining -= quantity
+                if quantity > 0:
+                    restock_rows.append((produto_id, quantity, created_at))
+            final_estoque.append(initial_estoque[produto_id - 1] + needed - sold[produto_id])
+
+        to_db = _to_db(connection, models.Sale.__table__.c.created_at)
+        start_db = to_db(start)
+        sale_times = [to_db(moment) for moment in sale_times]
+
+        step("produtos", _insert_batches(
+            connection, models.Produto.__table__, ("id", "nome", "valor_cents", "estoque", "created_at"),
+            (
+                (produto_id, f"{rng.choice(PRODUTO_NOMES)} {produto_id}", prices[produto_id - 1],
+                 final_estoque[produto_id - 1], start_db)
+                for produto_id in produto_ids
+            ),
+            batch_size,
+        ))
+        step("restocks", _insert_batches(
+            connection, models.Restock.__table__, ("produto_id", "quantity", "created_at"),
+            ((produto_id, quantity, to_db(created_at)) for produto_id, quantity, created_at in restock_rows),
+            batch_size,
+        ))
+
+        # Credits cover each usuario's spending plus what is left as saldo
+        saldos = [rng.randint(0, 20_000) for _ in range(usuarios + 1)]
+        credit_rows = []
+        for usuario_id in range(1, usuarios + 1):
+            deposited = spent[usuario_id] + saldos[usuario_id]
+            deposits = max(1, min(12, deposited // 5_000))
+            moments = sorted(start + timedelta(seconds=rng.random() * days * 86400) for _ in range(deposits))
+            moments[0] = start
+            for number, created_at in enumerate(moments):
+                amount = deposited // deposits + (deposited % deposits if number == 0 else 0)
+                if amount > 0:
+                    credit_rows.append((usuario_id, amount, "credit", "Depósito", to_db(created_at)))
+
+        step("usuarios", _insert_batches(
+            connection, models.Usuario.__table__, ("id", "nome", "nickname", "quarto", "saldo_cents", "created_at"),
+            (
+                (usuario_id, f"{rng.choice(PRIMEIROS_NOMES)} {rng.choice(SOBRENOMES)}", f"user{usuario_id}",
+                 str(rng.randint(100, 499)), saldos[usuario_id], start_db)
+                for usuario_id in range(1, usuarios + 1)
+            ),
+            batch_size,
+        ))
+
+        step("sales", _insert_batches(
+            connection, models.Sale.__table__, ("id", "usuario_id", "total_amount_cents", "created_at"),
+            zip(range(1, sales + 1), sale_usuarios, sale_totals, sale_times),
+            batch_size,
+        ))
+        step("sale_items", _insert_batches(
+            connection, models.SaleItem.__table__,
+            ("sale_id", "produto_id", "quantity", "unit_price_cents", "total_price_cents"),
+            item_rows(),
+            batch_size,
+        ))
+
+        debit_rows = (
+            (usuario_id, total, "debit", f"Compra - Venda #{sale_id}", created_at)
+            for sale_id, usuario_id, total, created_at
+            in zip(range(1, sales + 1), sale_usuarios, sale_totals, sale_times)
+        )
+        step("balance_transactions", _insert_batches(
+            connection, models.BalanceTransaction.__table__,
+            ("usuario_id", "amount_cents", "transaction_type", "description", "created_at"),
+            chain(credit_rows, debit_rows),
+            batch_size,
+        ))
+
+        for index in indexes:
+            index.create(connection)
+        step("indexes")
+
+        rebuild_materialized(connection)
+        step("summaries")
+
+    return counts
+
+
+def reset(engine):
+    """Delete everything the generator writes (users and schema are kept)"""
+    with engine.begin() as connection:
+        for table in GENERATED_TABLES:
+            connection.execute(text(f"DELETE FROM {table}"))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=os.getenv("DATABASE_URL", "sqlite:///./cantina.db"))
+    parser.add_argument("--usuarios", type=int, default=10_000)
+    parser.add_argument("--produtos", type=int, default=500)
+    parser.add_argument("--sales", type=int, default=1_000_000)
+    parser.add_argument("--restocks", type=int, default=20, help="Reabastecimentos por produto")
+    parser.add_argument("--days", type=int, default=90, help="Dias de histórico até hoje")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--reset", action="store_true", help="Apagar os dados existentes antes")
+    args = parser.parse_args(argv)
+
+    from utils.migrations import upgrade
+
+    engine = create_engine(args.database)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _bulk_pragmas)
+
+    upgrade(bind=engine)
+    with engine.connect() as connection:
+        archived = connection.execute(text("SELECT COUNT(*) FROM season_archives")).scalar()
+    if archived:
+        # Generated ids start over and would clash with the archived seasons'
+        print("❌ Database has archived seasons (see archive_season.py --list); generate into a new database")
+        return 1
+    if args.reset:
+        reset(engine)
+    else:
+        with engine.connect() as connection:
+            if connection.execute(text("SELECT 1 FROM usuarios LIMIT 1")).first() is not None:
+                print("❌ Database already has data; use --reset to replace it")
+                return 1
+
+    started = time.perf_counter()
+    print(f"📝 Generating data into {engine.url.render_as_string(hide_password=True)}")
+    counts = generate(
+        engine, args.usuarios, args.produtos, args.sales, args.restocks,
+        days=args.days, seed=args.seed, batch_size=args.batch_size,
+    )
+    engine.dispose()
+    print(f"✅ {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
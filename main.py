@@ -1,19 +1,28 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+import math
 import os
 from dotenv import load_dotenv
 
-from database import engine, get_db
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from database import get_db, engine, read_engine, async_engine, async_read_engine
 import models
-from routers import auth, usuarios, produtos, sales, dashboard, backup
+from routers import auth, usuarios, produtos, sales, dashboard, analytics, backup, profiling
+from utils.migrations import ensure_schema
+from utils.metrics import MetricsMiddleware, instrument_engine, instrument_models, registry
+from utils.profiling import ProfilingMiddleware
+from utils.compression import CompressionMiddleware
+from utils.idempotency import IdempotentReplay, replay_response
+from utils import event_log, group_commit, workers
 
 # Load environment variables
 load_dotenv()
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
-
 app = FastAPI(
     title="Cantina Swift Flow API",
     description="API para gerenciamento de cantina",
@@ -30,13 +39,43 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# gzip/br for bodies over COMPRESSION_MIN_SIZE, negotiated per request
+app.add_middleware(CompressionMiddleware)
+
+# Per-route latency, query count, DB time and rows written, served on /metrics (admins only)
+app.add_middleware(MetricsMiddleware)
+for db_engine in (engine, read_engine, async_engine.sync_engine, async_read_engine.sync_engine):
+    instrument_engine(db_engine)
+instrument_models(models.Base)
+
+# Admin requests with `X-Profile: 1` are captured with cProfile
+app.add_middleware(ProfilingMiddleware)
+
+# Retried mutations with an Idempotency-Key get the stored response back
+app.add_exception_handler(IdempotentReplay, replay_response)
+
+
+# FastAPI's default 422 echoes the input back, and a JSON body may carry
+# NaN or Infinity, which JSONResponse refuses to encode (a 500 instead)
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    return JSONResponse(
+        status_code=422,
+        content=jsonable_encoder(
+            {"detail": exc.errors()},
+            custom_encoder={float: lambda value: value if math.isfinite(value) else str(value)},
+        ),
+    )
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(usuarios.router)
 app.include_router(produtos.router)
 app.include_router(sales.router)
 app.include_router(dashboard.router)
+app.include_router(analytics.router)
 app.include_router(backup.router)
+app.include_router(profiling.router)
 
 
 @app.get("/")
@@ -49,35 +88,124 @@ def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics(current_user: models.User = Depends(auth.get_current_admin)):
+    # Prometheus text exposition format
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+# Apply (or verify) the schema before anything touches the database.
+# Workers started after `python migrate.py` should set SCHEMA_MODE=skip.
+# With WORKERS > 1 the launcher runs this and the next two once, for all.
+@app.on_event("startup")
+def prepare_schema():
+    if not workers.is_worker():
+        ensure_schema()
+
+
 # Create default admin user if it doesn't exist
 @app.on_event("startup")
 def create_default_user():
     from auth import get_password_hash
-    
+
+    if workers.is_worker():
+        return
+
     db = next(get_db())
-    
-    # Check if admin user exists
-    admin_user = db.query(models.User).filter(models.User.username == "admin").first()
-    
-    if not admin_user:
-        # Create default admin user
-        hashed_password = get_password_hash("admin123")
-        admin_user = models.User(
-            username="admin",
-            email="admin@cantina.com",
-            full_name="Administrator",
-            hashed_password=hashed_password,
-            is_active=True
-        )
-        db.add(admin_user)
-        db.commit()
-        print("✅ Default admin user created (username: admin, password: admin123)")
-    
-    db.close()
+    try:
+        # Check if admin user exists
+        admin_user = db.query(models.User).filter(models.User.username == "admin").first()
+
+        if not admin_user:
+            # Create default admin user
+            hashed_password = get_password_hash("admin123")
+            admin_user = models.User(
+                username="admin",
+                email="admin@cantina.com",
+                full_name="Administrator",
+                hashed_password=hashed_password,
+                is_active=True
+            )
+            db.add(admin_user)
+            try:
+                db.commit()
+                print("✅ Default admin user created (username: admin, password: admin123)")
+            except IntegrityError:
+                # Another process starting against the same database won
+                db.rollback()
+    finally:
+        db.close()
+
+
+# Background writer of the saldo/estoque event log
+@app.on_event("startup")
+def start_event_log():
+    if workers.is_worker():
+        # The launcher took the baseline; each worker has a stream of its own
+        event_log.log.start(stream=f"{event_log.STREAM_PREFIX}{os.getpid()}")
+    elif event_log.log.start():
+        # First run (or a new EVENT_LOG_DIR): baseline from the current data
+        event_log.snapshot()
+
+
+# Logouts stored by earlier runs (or, while running, by other workers)
+@app.on_event("startup")
+def load_revoked_tokens():
+    db = next(get_db())
+    try:
+        auth.load_revoked_tokens(db)
+    finally:
+        db.close()
+
+
+# Shared table versions and invalidation between worker processes
+@app.on_event("startup")
+def start_worker_sync():
+    if workers.is_worker():
+        workers.sync.start()
+
+
+# Checkout group commit (opt-in); stopped before the event log so the
+# last batch's events are still written
+@app.on_event("startup")
+def start_group_commit():
+    if group_commit.CHECKOUT_GROUP_COMMIT:
+        group_commit.writer.start()
+
+
+@app.on_event("shutdown")
+def stop_group_commit():
+    group_commit.writer.stop()
+
+
+@app.on_event("shutdown")
+def stop_worker_sync():
+    workers.sync.stop()
+
+
+@app.on_event("shutdown")
+def stop_event_log():
+    event_log.log.stop()
+
+
+def run_startup_tasks():
+    """Startup work that must happen once however many workers serve the
+    app; the multi-worker launcher runs it before starting them"""
+    prepare_schema()
+    create_default_user()
+    start_event_log()
+    stop_event_log()
+    # The workers open their own connections
+    engine.dispose()
 
 
 if __name__ == "__main__":
     import uvicorn
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host=host, port=port)
+    if workers.WORKERS > 1:
+        run_startup_tasks()
+        os.environ[workers.WORKER_ENV] = "1"
+        uvicorn.run("main:app", host=host, port=port, workers=workers.WORKERS)
+    else:
+        uvicorn.run(app, host=host, port=port)
@@ -0,0 +1,27 @@
+"""One-shot schema migration command.
+
+Run this once per deploy, before starting the API workers with
+SCHEMA_MODE=skip:
+
+    python migrate.py              # upgrade to the latest revision
+    python migrate.py --current    # show the revision the database is at
+    python migrate.py 0001         # upgrade (or stay) at a specific revision
+"""
+import sys
+
+from utils.migrations import get_current_revision, get_head_revision, upgrade
+
+
+def main(argv):
+    if "--current" in argv:
+        print(f"current: {get_current_revision()}  head: {get_head_revision()}")
+        return 0
+
+    target = argv[0] if argv else "head"
+    revision = upgrade(target)
+    print(f"✅ Database at revision {revision}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,52 @@
+"""money as integer cents
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 00:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# (table, float column, integer centavos column)
+MONEY_COLUMNS = [
+    ('usuarios', 'saldo', 'saldo_cents'),
+    ('produtos', 'valor', 'valor_cents'),
+    ('sales', 'total_amount', 'total_amount_cents'),
+    ('sale_items', 'unit_price', 'unit_price_cents'),
+    ('sale_items', 'total_price', 'total_price_cents'),
+    ('balance_transactions', 'amount', 'amount_cents'),
+]
+
+
+def upgrade():
+    for table, old, new in MONEY_COLUMNS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column(new, sa.Integer(), nullable=True))
+        # ROUND() on the scaled float absorbs the binary drift (15.2999... -> 1530)
+        op.execute(f"UPDATE {table} SET {new} = CAST(ROUND(COALESCE({old}, 0) * 100) AS INTEGER)")
+
+    for table, old, new in MONEY_COLUMNS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(new, existing_type=sa.Integer(), nullable=False)
+            batch_op.drop_column(old)
+
+
+def downgrade():
+    for table, old, new in MONEY_COLUMNS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column(old, sa.Float(), nullable=True))
+        op.execute(f"UPDATE {table} SET {old} = {new} / 100.0")
+
+    for table, old, new in MONEY_COLUMNS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            if old != 'saldo':
+                batch_op.alter_column(old, existing_type=sa.Float(), nullable=False)
+            batch_op.drop_column(new)
@@ -0,0 +1,44 @@
+"""usuario summaries
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 00:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('usuario_summaries',
+    sa.Column('usuario_id', sa.Integer(), nullable=False),
+    sa.Column('total_vendas', sa.Integer(), nullable=False),
+    sa.Column('total_gasto_cents', sa.Integer(), nullable=False),
+    sa.Column('last_purchase_at', sa.DateTime(), nullable=True),
+    sa.Column('saldo_cents', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ),
+    sa.PrimaryKeyConstraint('usuario_id')
+    )
+
+    # Backfill from the raw tables; `python reconcile.py` does the same later
+    op.execute("""
+        INSERT INTO usuario_summaries
+            (usuario_id, total_vendas, total_gasto_cents, last_purchase_at, saldo_cents, updated_at)
+        SELECT u.id, COUNT(s.id), COALESCE(SUM(s.total_amount_cents), 0), MAX(s.created_at),
+               u.saldo_cents, CURRENT_TIMESTAMP
+        FROM usuarios u
+        LEFT JOIN sales s ON s.usuario_id = u.id
+        GROUP BY u.id
+    """)
+
+
+def downgrade():
+    op.drop_table('usuario_summaries')
@@ -0,0 +1,65 @@
+"""produto stats and daily sales
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 00:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('produto_stats',
+    sa.Column('produto_id', sa.Integer(), nullable=False),
+    sa.Column('total_vendas', sa.Integer(), nullable=False),
+    sa.Column('quantidade_vendida', sa.Integer(), nullable=False),
+    sa.Column('receita_cents', sa.Integer(), nullable=False),
+    sa.Column('last_sale_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['produto_id'], ['produtos.id'], ),
+    sa.PrimaryKeyConstraint('produto_id')
+    )
+    op.create_table('produto_daily_sales',
+    sa.Column('produto_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('receita_cents', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['produto_id'], ['produtos.id'], ),
+    sa.PrimaryKeyConstraint('produto_id', 'day')
+    )
+    with op.batch_alter_table('produto_daily_sales', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_produto_daily_sales_day'), ['day'], unique=False)
+
+    # Backfill from the raw tables; `python reconcile.py` does the same later
+    op.execute("""
+        INSERT INTO produto_stats
+            (produto_id, total_vendas, quantidade_vendida, receita_cents, last_sale_at)
+        SELECT p.id, COUNT(si.id), COALESCE(SUM(si.quantity), 0),
+               COALESCE(SUM(si.total_price_cents), 0), MAX(s.created_at)
+        FROM produtos p
+        LEFT JOIN sale_items si ON si.produto_id = p.id
+        LEFT JOIN sales s ON s.id = si.sale_id
+        GROUP BY p.id
+    """)
+    op.execute("""
+        INSERT INTO produto_daily_sales (produto_id, day, quantity, receita_cents)
+        SELECT si.produto_id, DATE(s.created_at), SUM(si.quantity), SUM(si.total_price_cents)
+        FROM sale_items si
+        JOIN sales s ON s.id = si.sale_id
+        GROUP BY si.produto_id, DATE(s.created_at)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('produto_daily_sales', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_produto_daily_sales_day'))
+
+    op.drop_table('produto_daily_sales')
+    op.drop_table('produto_stats')
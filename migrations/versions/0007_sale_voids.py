@@ -0,0 +1,35 @@
+"""sale voids
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 04:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sales', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('voided_at', sa.DateTime(), nullable=True))
+        # Voiding a usuario's or produto's latest sale looks up the one before it
+        batch_op.create_index(batch_op.f('ix_sales_usuario_id'), ['usuario_id'], unique=False)
+
+    with op.batch_alter_table('sale_items', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_sale_items_produto_id'), ['produto_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sale_items', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sale_items_produto_id'))
+
+    with op.batch_alter_table('sales', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sales_usuario_id'))
+        batch_op.drop_column('voided_at')
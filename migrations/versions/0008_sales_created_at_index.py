@@ -0,0 +1,26 @@
+"""sales created_at index
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 05:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sales', schema=None) as batch_op:
+        # GET /analytics/sales scans a date range of sales
+        batch_op.create_index(batch_op.f('ix_sales_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('sales', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_sales_created_at'))
@@ -0,0 +1,41 @@
+"""season archives
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 06:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('season_archives',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('date_from', sa.Date(), nullable=False),
+    sa.Column('date_to', sa.Date(), nullable=False),
+    sa.Column('sales', sa.Integer(), nullable=False),
+    sa.Column('sale_items', sa.Integer(), nullable=False),
+    sa.Column('balance_transactions', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    with op.batch_alter_table('season_archives', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_season_archives_id'), ['id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('season_archives', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_season_archives_id'))
+
+    op.drop_table('season_archives')
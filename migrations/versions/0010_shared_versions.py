@@ -0,0 +1,39 @@
+"""shared data versions and revoked access tokens
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 07:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('data_versions',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('revoked_access_tokens',
+    sa.Column('token_hash', sa.String(length=64), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('token_hash')
+    )
+    with op.batch_alter_table('revoked_access_tokens', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_revoked_access_tokens_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('revoked_access_tokens', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_revoked_access_tokens_expires_at'))
+
+    op.drop_table('revoked_access_tokens')
+    op.drop_table('data_versions')
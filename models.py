@@ -1,9 +1,9 @@
-from sqlalchemy import Boolean, Column, Integer, String, Float, DateTime, ForeignKey, Text
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Boolean, Column, Integer, String, Date, DateTime, ForeignKey, Text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
-Base = declarative_base()
+from database import Base
+from utils.money import from_cents, to_cents
 
 
 class User(Base):
@@ -18,6 +18,55 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
+class RefreshToken(Base):
+    """Long-lived login, exchanged at /auth/refresh for new access tokens.
+
+    Only the SHA-256 of the token is stored. Every refresh rotates it: the
+    used row is revoked and a new one joins the same `family_id`, so a
+    revoked token coming back (stolen and replayed) revokes the family.
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
+    family_id = Column(String(32), index=True, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    user = relationship("User")
+
+
+class RevokedAccessToken(Base):
+    """Access token rejected before its `exp` (logout), so every worker
+    process rejects it, and keeps rejecting it after a restart"""
+    __tablename__ = "revoked_access_tokens"
+
+    # SHA-256 of the token, like refresh_tokens.token_hash
+    token_hash = Column(String(64), primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class IdempotencyKey(Base):
+    """Stored response of a mutation sent with an Idempotency-Key header.
+
+    Inserted in the same transaction as the mutation itself, so a retry
+    either finds this row or finds no trace of the first attempt.
+    `scope` hashes the user, method, path and key.
+    """
+    __tablename__ = "idempotency_keys"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String(64), unique=True, index=True, nullable=False)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
 class Usuario(Base):
     __tablename__ = "usuarios"
 
@@ -25,7 +74,9 @@ class Usuario(Base):
     nome = Column(String(255), nullable=False)
     nickname = Column(String(255), unique=True, index=True, nullable=False)
     quarto = Column(String(100))
-    saldo = Column(Float, default=0.0)
+    # Money is stored as integer centavos; the reais properties below are
+    # what the API schemas read and write.
+    saldo_cents = Column(Integer, nullable=False, default=0)
     nome_pai = Column(String(255))
     nome_mae = Column(String(255))
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -34,13 +85,21 @@ class Usuario(Base):
     sales = relationship("Sale", back_populates="usuario")
     balance_transactions = relationship("BalanceTransaction", back_populates="usuario")
 
+    @property
+    def saldo(self):
+        return from_cents(self.saldo_cents)
+
+    @saldo.setter
+    def saldo(self, value):
+        self.saldo_cents = to_cents(value or 0)
+
 
 class Produto(Base):
     __tablename__ = "produtos"
 
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String(255), nullable=False)
-    valor = Column(Float, nullable=False)
+    valor_cents = Column(Integer, nullable=False)
     estoque = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.utcnow)
 
@@ -48,34 +107,57 @@ class Produto(Base):
     sale_items = relationship("SaleItem", back_populates="produto")
     restocks = relationship("Restock", back_populates="produto")
 
+    @property
+    def valor(self):
+        return from_cents(self.valor_cents)
+
+    @valor.setter
+    def valor(self, value):
+        self.valor_cents = to_cents(value)
+
 
 class Sale(Base):
     __tablename__ = "sales"
 
     id = Column(Integer, primary_key=True, index=True)
-    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
-    total_amount = Column(Float, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False, index=True)
+    total_amount_cents = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # Set by POST /sales/{id}/void; voided sales stay for history but are
+    # left out of every total
+    voided_at = Column(DateTime, nullable=True)
 
     # Relationships
     usuario = relationship("Usuario", back_populates="sales")
     items = relationship("SaleItem", back_populates="sale", cascade="all, delete-orphan")
 
+    @property
+    def total_amount(self):
+        return from_cents(self.total_amount_cents)
+
 
 class SaleItem(Base):
     __tablename__ = "sale_items"
 
     id = Column(Integer, primary_key=True, index=True)
     sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False)
-    produto_id = Column(Integer, ForeignKey("produtos.id"), nullable=False)
+    produto_id = Column(Integer, ForeignKey("produtos.id"), nullable=False, index=True)
     quantity = Column(Integer, nullable=False)
-    unit_price = Column(Float, nullable=False)
-    total_price = Column(Float, nullable=False)
+    unit_price_cents = Column(Integer, nullable=False)
+    total_price_cents = Column(Integer, nullable=False)
 
     # Relationships
     sale = relationship("Sale", back_populates="items")
     produto = relationship("Produto", back_populates="sale_items")
 
+    @property
+    def unit_price(self):
+        return from_cents(self.unit_price_cents)
+
+    @property
+    def total_price(self):
+        return from_cents(self.total_price_cents)
+
 
 class Restock(Base):
     __tablename__ = "restocks"
@@ -94,10 +176,92 @@ class BalanceTransaction(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
-    amount = Column(Float, nullable=False)
+    amount_cents = Column(Integer, nullable=False)
     transaction_type = Column(String(50), nullable=False)  # "credit" or "debit"
     description = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     # Relationships
     usuario = relationship("Usuario", back_populates="balance_transactions")
+
+    @property
+    def amount(self):
+        return from_cents(self.amount_cents)
+
+
+class UsuarioSummary(Base):
+    """Per-usuario spending totals, maintained by create_sale and add_balance.
+
+    Rebuilt and checked against the raw tables by `python reconcile.py`.
+    """
+    __tablename__ = "usuario_summaries"
+
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), primary_key=True)
+    total_vendas = Column(Integer, nullable=False, default=0)
+    total_gasto_cents = Column(Integer, nullable=False, default=0)
+    last_purchase_at = Column(DateTime)
+    saldo_cents = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    usuario = relationship("Usuario")
+
+    @property
+    def total_gasto(self):
+        return from_cents(self.total_gasto_cents)
+
+    @property
+    def saldo(self):
+        return from_cents(self.saldo_cents)
+
+
+class ProdutoStats(Base):
+    """Per-produto running sales totals, maintained by create_sale"""
+    __tablename__ = "produto_stats"
+
+    produto_id = Column(Integer, ForeignKey("produtos.id"), primary_key=True)
+    total_vendas = Column(Integer, nullable=False, default=0)
+    quantidade_vendida = Column(Integer, nullable=False, default=0)
+    receita_cents = Column(Integer, nullable=False, default=0)
+    last_sale_at = Column(DateTime)
+
+    @property
+    def receita_total(self):
+        return from_cents(self.receita_cents)
+
+
+class ProdutoDailySales(Base):
+    """Units and revenue per produto per (UTC) day, used for rolling velocity"""
+    __tablename__ = "produto_daily_sales"
+
+    produto_id = Column(Integer, ForeignKey("produtos.id"), primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    quantity = Column(Integer, nullable=False, default=0)
+    receita_cents = Column(Integer, nullable=False, default=0)
+
+
+class SeasonArchive(Base):
+    """A closed season whose sales, sale items and balance transactions were
+    moved to their own SQLite file by archive_season.py"""
+    __tablename__ = "season_archives"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), unique=True, nullable=False)
+    # Relative to ARCHIVE_DIR
+    filename = Column(String(255), nullable=False)
+    # Days (UTC, inclusive) the archived rows cover
+    date_from = Column(Date, nullable=False)
+    date_to = Column(Date, nullable=False)
+    sales = Column(Integer, nullable=False, default=0)
+    sale_items = Column(Integer, nullable=False, default=0)
+    balance_transactions = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DataVersion(Base):
+    """Write counter of a table, shared by the worker processes when the
+    API runs with WORKERS > 1 (see utils.versions)"""
+    __tablename__ = "data_versions"
+
+    name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,38 @@
+"""Rebuild materialized summaries and diff them against the raw tables.
+
+    python reconcile.py          # report differences, change nothing
+    python reconcile.py --fix    # rewrite stale/missing summaries
+
+Exits with status 1 when differences were found, so it can run from cron.
+"""
+import json
+import sys
+
+from database import SessionLocal
+from utils.summaries import reconcile_usuario_summaries, reconcile_produto_stats
+
+
+def main(argv):
+    fix = "--fix" in argv
+    action = "fixed" if fix else "found"
+    found = 0
+
+    db = SessionLocal()
+    try:
+        for name, reconcile in [
+            ("usuario_summaries", reconcile_usuario_summaries),
+            ("produto_stats", reconcile_produto_stats),
+        ]:
+            diffs = reconcile(db, fix=fix)
+            for diff in diffs:
+                print(json.dumps(diff, default=str))
+            print(f"{'⚠️' if diffs else '✅'} {name}: {len(diffs)} differences {action}")
+            found += len(diffs)
+    finally:
+        db.close()
+
+    return 1 if found and not fix else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
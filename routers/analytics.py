@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import date, datetime, timedelta
+
+from database import get_read_db
+from routers.auth import get_current_user
+import models
+import schemas
+from utils import analytics
+from utils.versions import conditional
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+# Range used when date_from/date_to are left out
+DEFAULT_RANGE_DAYS = 30
+
+
+@router.get(
+    "/sales",
+    response_model=schemas.SalesAnalytics,
+    dependencies=[Depends(conditional(*analytics.TABLES, dated=True))]
+)
+def get_sales_analytics(
+    response: Response,
+    date_from: Optional[date] = Query(None, description="First day (UTC); defaults to 30 days ago"),
+    date_to: Optional[date] = Query(None, description="Last day (UTC); defaults to today"),
+    granularity: schemas.AnalyticsGranularity = Query(schemas.AnalyticsGranularity.day),
+    top: int = Query(10, ge=1, le=100, description="How many produtos to rank"),
+    distribution: bool = Query(False, description="Include ticket-size percentiles and histogram"),
+    db: Session = Depends(get_read_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    date_to = date_to or datetime.utcnow().date()
+    date_from = date_from or date_to - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_from deve ser anterior a date_to"
+        )
+
+    key = (date_from, date_to, granularity.value, top, distribution)
+    token = analytics.cache.token()
+    body = analytics.cache.get(key, token)
+    if body is None:
+        buckets = analytics.sales_buckets(db, date_from, date_to, granularity.value)
+        result = schemas.SalesAnalytics(
+            date_from=date_from,
+            date_to=date_to,
+            granularity=granularity,
+            total_vendas=sum(bucket["vendas"] for bucket in buckets),
+            receita_total=sum((bucket["receita"] for bucket in buckets), 0),
+            buckets=buckets,
+            top_produtos=analytics.top_produtos(db, date_from, date_to, top),
+            quartos=analytics.quarto_spending(db, date_from, date_to),
+            distribuicao=analytics.ticket_distribution(db, date_from, date_to) if distribution else None,
+        )
+        body = result.model_dump_json().encode()
+        analytics.cache.put(key, token, body)
+
+    # Keep the ETag/Cache-Control set by conditional()
+    return Response(content=body, media_type="application/json", headers=dict(response.headers))
@@ -1,17 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from datetime import timedelta
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
 
-from database import get_db
-from auth import verify_password, create_access_token, verify_token, get_password_hash, ACCESS_TOKEN_EXPIRE_MINUTES
+from database import get_db, get_read_db, get_async_read_db
+from auth import (
+    verify_password, create_access_token, verify_token, revoke_token, get_password_hash, is_admin,
+    create_refresh_token, hash_refresh_token, token_cache, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
+)
 import models
 import schemas
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="auth/token", auto_error=False)
 
 
 def get_user(db: Session, username: str):
@@ -27,7 +34,9 @@ def authenticate_user(db: Session, username: str, password: str):
     return user
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# Token checks only read, so they use the read-only pool and never take a
+# connection that a write endpoint needs
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -36,11 +45,49 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     
     username = verify_token(token)
     user = get_user(db, username=username)
-    if user is None:
+    if user is None or not user.is_active:
         raise credentials_exception
     return user
 
 
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_read_db)):
+    # Same as get_current_user, for async endpoints (no threadpool hop)
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    username = verify_token(token)
+    user = await db.scalar(select(models.User).where(models.User.username == username))
+    if user is None or not user.is_active:
+        raise credentials_exception
+    return user
+
+
+async def get_current_user_stream(
+    access_token: Optional[str] = None,
+    token: Optional[str] = Depends(oauth2_scheme_optional),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    # Browsers' EventSource can't send headers, so streams also accept
+    # ?access_token=. The session is closed right away: a stream stays open
+    # for hours and must not hold a read connection that long.
+    try:
+        return await get_current_user_async(token or access_token or "", db)
+    finally:
+        await db.close()
+
+
+def get_current_admin(current_user: models.User = Depends(get_current_user)):
+    if not is_admin(current_user.username):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
+
+
 @router.post("/register", response_model=schemas.User)
 def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     # Check if user already exists
@@ -65,6 +112,48 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return db_user
 
 
+def issue_tokens(db: Session, user: models.User, family_id: Optional[str] = None) -> dict:
+    """A new access token plus a refresh token (continuing `family_id` when rotating)"""
+    now = datetime.utcnow()
+    access_token = create_access_token(
+        data={"sub": user.username}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    refresh_token, token_hash = create_refresh_token()
+
+    # Drop this user's expired refresh tokens while we are here
+    db.query(models.RefreshToken).filter(
+        models.RefreshToken.user_id == user.id,
+        models.RefreshToken.expires_at <= now
+    ).delete(synchronize_session=False)
+
+    db.add(models.RefreshToken(
+        user_id=user.id,
+        token_hash=token_hash,
+        family_id=family_id or secrets.token_hex(16),
+        expires_at=now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    ))
+    db.commit()
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+def revoke_refresh_family(db: Session, family_id: str):
+    db.query(models.RefreshToken).filter(
+        models.RefreshToken.family_id == family_id,
+        models.RefreshToken.revoked_at.is_(None)
+    ).update({models.RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+
+
+def load_revoked_tokens(db: Session):
+    """Bring the verified-token cache's revocations in line with the table
+    (at startup, and when another worker process logged a token out)"""
+    now = datetime.utcnow()
+    rows = db.query(models.RevokedAccessToken).filter(models.RevokedAccessToken.expires_at > now).all()
+    token_cache.load_revoked({
+        bytes.fromhex(row.token_hash): row.expires_at.replace(tzinfo=timezone.utc).timestamp()
+        for row in rows
+    })
+
+
 @router.post("/token", response_model=schemas.Token)
 def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = authenticate_user(db, form_data.username, form_data.password)
@@ -74,11 +163,73 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+    return issue_tokens(db, user)
+
+
+@router.post("/refresh", response_model=schemas.Token)
+def refresh_access_token(request: schemas.RefreshTokenRequest, db: Session = Depends(get_db)):
+    # No password check here: one SHA-256 and an indexed lookup instead of bcrypt
+    invalid_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+
+    stored = db.query(models.RefreshToken).filter(
+        models.RefreshToken.token_hash == hash_refresh_token(request.refresh_token)
+    ).first()
+    if stored is None or stored.expires_at <= datetime.utcnow():
+        raise invalid_exception
+
+    # Rotate: only one caller can retire a given token
+    rotated = db.query(models.RefreshToken).filter(
+        models.RefreshToken.id == stored.id,
+        models.RefreshToken.revoked_at.is_(None)
+    ).update({models.RefreshToken.revoked_at: datetime.utcnow()}, synchronize_session=False)
+    if not rotated:
+        # A rotated token came back: someone else holds a copy, end the session
+        revoke_refresh_family(db, stored.family_id)
+        db.commit()
+        raise invalid_exception
+
+    user = stored.user
+    if user is None or not user.is_active:
+        db.commit()
+        raise invalid_exception
+
+    return issue_tokens(db, user, stored.family_id)
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(
+    request: Optional[schemas.RefreshTokenRequest] = None,
+    token: str = Depends(oauth2_scheme),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # The access token is rejected from now on, even though it has not expired;
+    # stored so other worker processes (and restarts) reject it too
+    revoked = revoke_token(token)
+    if revoked is not None:
+        key, expires_at = revoked
+        now = datetime.utcnow()
+        db.query(models.RevokedAccessToken).filter(
+            models.RevokedAccessToken.expires_at <= now
+        ).delete(synchronize_session=False)
+        db.merge(models.RevokedAccessToken(
+            token_hash=key.hex(),
+            expires_at=datetime.fromtimestamp(expires_at, timezone.utc).replace(tzinfo=None)
+        ))
+
+    # ...and so is the whole refresh chain, when the client sends it
+    if request is not None:
+        stored = db.query(models.RefreshToken).filter(
+            models.RefreshToken.token_hash == hash_refresh_token(request.refresh_token),
+            models.RefreshToken.user_id == current_user.id
+        ).first()
+        if stored is not None:
+            revoke_refresh_family(db, stored.family_id)
+    db.commit()
 
 
 @router.get("/me", response_model=schemas.User)
@@ -6,6 +6,10 @@ from routers.auth import get_current_user
 import models
 import schemas
 from utils.backup import BackupManager
+from utils.forecast import forecast
+from utils.versions import versions
+from utils.responses import json_response
+from utils import idempotency, event_log
 
 # Load environment variables
 load_dotenv()
@@ -37,8 +41,7 @@ def create_backup(current_user: models.User = Depends(get_current_user)):
 @router.get("/list", response_model=List[schemas.BackupInfo])
 def list_backups(current_user: models.User = Depends(get_current_user)):
     """List all available backups"""
-    backups = backup_manager.list_backups()
-    return [schemas.BackupInfo(**backup) for backup in backups]
+    return json_response(schemas.BackupInfoList, backup_manager.list_backups())
 
 
 @router.post("/restore/{filename}", response_model=schemas.BackupResponse)
@@ -62,6 +65,12 @@ def restore_backup(
             detail=result.get("error", "Failed to restore backup")
         )
 
+    # Every in-memory view of the data is stale now
+    forecast.invalidate()
+    versions.bump_all()
+    idempotency.store.clear()
+    event_log.snapshot()
+
     return schemas.BackupResponse(
         success=True,
         message=result["message"]
@@ -106,6 +115,11 @@ def clear_database(current_user: models.User = Depends(get_current_user)):
             detail=result.get("error", "Failed to clear database")
         )
 
+    forecast.invalidate()
+    versions.bump_all()
+    idempotency.store.clear()
+    event_log.snapshot()
+
     return schemas.BackupResponse(
         success=True,
         message=result["message"],
@@ -1,101 +1,159 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy import func, select
+from typing import List, Optional
 
-from database import get_db
-from routers.auth import get_current_user
+from database import get_async_read_db
+from routers.auth import get_current_user_async, get_current_user_stream
 import models
 import schemas
+from utils.money import from_cents
+from utils.forecast import forecast, LOW_STOCK_THRESHOLD, LOW_STOCK_DAYS
+from utils.events import bus, format_sse, sale_event, KEEPALIVE_SECONDS
+from utils.versions import conditional
+from utils.responses import json_response
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
+# What utils.forecast reads, plus the forecast cache itself
+FORECAST_TABLES = ("produtos", "produto_daily_sales", "restocks", "forecast")
 
-@router.get("/stats", response_model=schemas.DashboardStats)
-def get_dashboard_stats(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+
+@router.get(
+    "/stats",
+    response_model=schemas.DashboardStats,
+    dependencies=[Depends(conditional("usuarios", "sales", *FORECAST_TABLES, dated=True))]
+)
+async def get_dashboard_stats(
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
     # Total usuarios
-    total_usuarios = db.query(func.count(models.Usuario.id)).scalar() or 0
-    
+    total_usuarios = await db.scalar(select(func.count(models.Usuario.id))) or 0
+
     # Total produtos
-    total_produtos = db.query(func.count(models.Produto.id)).scalar() or 0
-    
-    # Low stock produtos (estoque <= 10)
-    low_stock_produtos = db.query(func.count(models.Produto.id)).filter(
-        models.Produto.estoque <= 10
-    ).scalar() or 0
-    
-    # Today's sales
+    total_produtos = await db.scalar(select(func.count(models.Produto.id))) or 0
+
+    # Low stock produtos (few units left or forecast to run out soon)
+    low_stock_produtos = len(await db.run_sync(forecast.low_stock))
+
+    # Today's sales (amount and count in a single pass)
     from datetime import date
     today = date.today()
-    
-    total_sales_today = db.query(func.sum(models.Sale.total_amount)).filter(
-        func.date(models.Sale.created_at) == today
-    ).scalar() or 0
-    
-    total_sales_count_today = db.query(func.count(models.Sale.id)).filter(
-        func.date(models.Sale.created_at) == today
-    ).scalar() or 0
-    
+
+    today_sales = (await db.execute(
+        select(
+            func.sum(models.Sale.total_amount_cents),
+            func.count(models.Sale.id)
+        ).where(func.date(models.Sale.created_at) == today, models.Sale.voided_at.is_(None))
+    )).one()
+
     return schemas.DashboardStats(
         total_usuarios=total_usuarios,
         total_produtos=total_produtos,
         low_stock_produtos=low_stock_produtos,
-        total_sales_today=float(total_sales_today),
-        total_sales_count_today=total_sales_count_today
+        total_sales_today=from_cents(today_sales[0]),
+        total_sales_count_today=today_sales[1] or 0
     )
 
 
-@router.get("/recent-sales", response_model=List[schemas.RecentSale])
-def get_recent_sales(
+@router.get(
+    "/recent-sales",
+    response_model=List[schemas.RecentSale],
+    dependencies=[Depends(conditional("sales", "sale_items", "usuarios", "produtos"))]
+)
+async def get_recent_sales(
+    response: Response,
     limit: int = 10,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
-    # Get recent sales with usuario and produto info
-    sales = db.query(models.Sale).join(models.Usuario).order_by(
-        models.Sale.created_at.desc()
-    ).limit(limit).all()
-    
-    recent_sales = []
-    for sale in sales:
-        # Get sale items to show produtos
-        sale_items = db.query(models.SaleItem).filter(
-            models.SaleItem.sale_id == sale.id
-        ).join(models.Produto).all()
-        
-        # Create a summary of produtos
-        produtos = [item.produto.nome for item in sale_items]
-        produto_summary = ", ".join(produtos[:2])  # Show first 2 produtos
-        if len(produtos) > 2:
-            produto_summary += f" e mais {len(produtos) - 2}"
-        
-        recent_sales.append(schemas.RecentSale(
-            id=sale.id,
-            usuario_nome=sale.usuario.nome,
-            produtos=produto_summary,
-            total_amount=sale.total_amount,
-            created_at=sale.created_at
-        ))
-    
-    return recent_sales
-
-
-@router.get("/low-stock", response_model=List[schemas.LowStockProduto])
-def get_low_stock_produtos(
-    threshold: int = 10,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    # Get recent sales with usuario and produto info, eagerly loaded
+    # (one query for sales + usuarios, one for all their items + produtos)
+    sales = await db.scalars(
+        select(models.Sale)
+        .options(
+            joinedload(models.Sale.usuario),
+            selectinload(models.Sale.items).joinedload(models.SaleItem.produto)
+        )
+        .where(models.Sale.voided_at.is_(None))
+        .order_by(models.Sale.created_at.desc())
+        .limit(limit)
+    )
+
+    # Same summary ("A, B e mais N") as the live `sale` events
+    recent_sales = [
+        sale_event(sale, sale.usuario, [item.produto.nome for item in sale.items])
+        for sale in sales
+    ]
+    return json_response(schemas.RecentSaleList, recent_sales, response)
+
+
+@router.get(
+    "/low-stock",
+    response_model=List[schemas.LowStockProduto],
+    dependencies=[Depends(conditional(*FORECAST_TABLES, dated=True))]
+)
+async def get_low_stock_produtos(
+    response: Response,
+    threshold: int = LOW_STOCK_THRESHOLD,
+    dias: float = Query(LOW_STOCK_DAYS, description="Incluir produtos que esgotam em até N dias"),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
-    # Get produtos with estoque <= threshold
-    produtos = db.query(models.Produto).filter(
-        models.Produto.estoque <= threshold
-    ).order_by(models.Produto.estoque.asc()).all()
-    
-    return [schemas.LowStockProduto(
-        id=produto.id,
-        nome=produto.nome,
-        estoque=produto.estoque
-    ) for produto in produtos]
+    # Produtos with estoque <= threshold or forecast to run out within `dias`,
+    # most urgent first, served from the precomputed forecast
+    produtos = await db.run_sync(lambda session: forecast.low_stock(session, threshold=threshold, days=dias))
+    return json_response(schemas.LowStockProdutoList, produtos, response)
+
+
+@router.get(
+    "/stock-forecast",
+    response_model=List[schemas.LowStockProduto],
+    dependencies=[Depends(conditional(*FORECAST_TABLES, dated=True))]
+)
+async def get_stock_forecast(
+    response: Response,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    # Days until stockout for every produto, most urgent first
+    return json_response(schemas.LowStockProdutoList, await db.run_sync(forecast.all), response)
+
+
+@router.get("/events")
+async def stream_dashboard_events(
+    request: Request,
+    last_event_id: Optional[int] = Header(None),
+    current_user: models.User = Depends(get_current_user_stream)
+):
+    """Server-sent events: `sale`, `stock` and `balance` as they happen.
+
+    Screens load the dashboard once and then apply these events instead of
+    polling. A `resync` event means events were missed and the screen
+    should refetch once. Reconnects send Last-Event-ID to catch up.
+    """
+    async def event_stream():
+        subscription, backlog = bus.subscribe(last_event_id)
+        try:
+            yield "retry: 3000\n\n"
+            for event in backlog:
+                yield format_sse(event)
+            while True:
+                event = await subscription.get(timeout=KEEPALIVE_SECONDS)
+                if event is None:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update
 from typing import List, Optional
 
-from database import get_db
-from routers.auth import get_current_user
+from database import get_db, get_read_db, get_async_read_db
+from routers.auth import get_current_user, get_current_user_async
 import models
 import schemas
+from utils import summaries, event_log, archive
+from utils.forecast import forecast
+from utils.events import bus, stock_event
+from utils.versions import conditional
+from utils.responses import json_response
 
 router = APIRouter(prefix="/produtos", tags=["produtos"])
 
@@ -24,42 +31,66 @@ def create_produto(
             detail="Produto com este nome já existe"
         )
     
-    db_produto = models.Produto(**produto.dict())
+    db_produto = models.Produto(**produto.model_dump())
     db.add(db_produto)
+    db.flush()
+    db.add(models.ProdutoStats(produto_id=db_produto.id))
+    event_log.record(db, "stock.set", produto_id=db_produto.id, estoque=db_produto.estoque, ref="create")
     db.commit()
     db.refresh(db_produto)
+    forecast.refresh(db, [db_produto.id])
     return db_produto
 
 
-@router.get("/", response_model=List[schemas.Produto])
-def read_produtos(
+@router.get(
+    "/",
+    response_model=List[schemas.Produto],
+    # The low_stock filter reads the forecast
+    dependencies=[Depends(conditional("produtos", "produto_daily_sales", "restocks", "forecast", dated=True))]
+)
+async def read_produtos(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = Query(None, description="Buscar por nome"),
     low_stock: Optional[bool] = Query(None, description="Filtrar produtos com estoque baixo"),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
-    query = db.query(models.Produto)
+    query = select(models.Produto)
     
     if search:
         search_term = f"%{search}%"
-        query = query.filter(models.Produto.nome.ilike(search_term))
+        query = query.where(models.Produto.nome.ilike(search_term))
     
     if low_stock:
-        query = query.filter(models.Produto.estoque <= 10)
+        low_stock_produtos = await db.run_sync(forecast.low_stock)
+        query = query.where(models.Produto.id.in_([item["id"] for item in low_stock_produtos]))
     
-    produtos = query.offset(skip).limit(limit).all()
-    return produtos
+    produtos = await db.scalars(query.offset(skip).limit(limit))
+    return json_response(schemas.ProdutoList, produtos.all(), response)
+
+
+@router.get("/stats", response_model=List[schemas.ProdutoStats])
+async def get_all_produtos_stats(
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: models.User = Depends(get_current_user_async)
+):
+    # Running totals and 7/30-day velocity for every produto in one query
+    return json_response(schemas.ProdutoStatsList, await db.run_sync(summaries.get_produto_stats))
 
 
-@router.get("/{produto_id}", response_model=schemas.Produto)
-def read_produto(
+@router.get(
+    "/{produto_id}",
+    response_model=schemas.Produto,
+    dependencies=[Depends(conditional("produtos"))]
+)
+async def read_produto(
     produto_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
-    produto = db.query(models.Produto).filter(models.Produto.id == produto_id).first()
+    produto = await db.get(models.Produto, produto_id)
     if produto is None:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
     return produto
@@ -88,12 +119,16 @@ def update_produto(
                 detail="Produto com este nome já existe"
             )
     
-    update_data = produto_update.dict(exclude_unset=True)
+    update_data = produto_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(produto, field, value)
     
+    if "estoque" in update_data:
+        event_log.record(db, "stock.set", produto_id=produto_id, estoque=produto.estoque, ref="edit")
+    
     db.commit()
     db.refresh(produto)
+    forecast.refresh(db, [produto_id])
     return produto
 
 
@@ -107,16 +142,19 @@ def delete_produto(
     if produto is None:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
     
-    # Check if produto has any sales
-    has_sales = db.query(models.SaleItem).filter(models.SaleItem.produto_id == produto_id).first()
+    # Check if produto has any sales (archived seasons included)
+    _, SaleItem = archive.history(db)
+    has_sales = db.query(SaleItem.id).filter(SaleItem.produto_id == produto_id).first()
     if has_sales:
         raise HTTPException(
             status_code=400,
             detail="Não é possível excluir produto com histórico de vendas"
         )
     
+    db.query(models.ProdutoStats).filter(models.ProdutoStats.produto_id == produto_id).delete()
     db.delete(produto)
     db.commit()
+    forecast.refresh(db, [produto_id])
     return {"message": "Produto excluído com sucesso"}
 
 
@@ -134,9 +172,15 @@ def restock_produto(
     if quantidade <= 0:
         raise HTTPException(status_code=400, detail="Quantidade deve ser positiva")
     
-    # Update stock
-    old_stock = produto.estoque
-    produto.estoque += quantidade
+    # Update stock relative to the committed value; sales may land meanwhile
+    estoque = db.scalar(
+        update(models.Produto)
+        .where(models.Produto.id == produto_id)
+        .values(estoque=models.Produto.estoque + quantidade)
+        .returning(models.Produto.estoque),
+        execution_options={"synchronize_session": False},
+    )
+    old_stock = estoque - quantidade
     
     # Create restock record
     restock = models.Restock(
@@ -144,9 +188,13 @@ def restock_produto(
         quantity=quantidade
     )
     db.add(restock)
+    db.flush()
+    event_log.record(db, "stock.restock", produto_id=produto_id, quantity=quantidade, ref=f"restock:{restock.id}")
     
     db.commit()
     db.refresh(produto)
+    forecast.refresh(db, [produto_id])
+    bus.publish("stock", stock_event(produto))
     
     return {
         "message": f"Estoque reabastecido com sucesso",
@@ -160,7 +208,7 @@ def restock_produto(
 @router.get("/{produto_id}/restock-history")
 def get_restock_history(
     produto_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
     produto = db.query(models.Produto).filter(models.Produto.id == produto_id).first()
@@ -180,30 +228,15 @@ def get_restock_history(
     }
 
 
-@router.get("/{produto_id}/sales-stats")
+@router.get("/{produto_id}/sales-stats", response_model=schemas.ProdutoStats)
 def get_produto_sales_stats(
     produto_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    produto = db.query(models.Produto).filter(models.Produto.id == produto_id).first()
-    if produto is None:
+    # Served from the materialized produto_stats instead of scanning sale_items
+    stats = summaries.get_produto_stats(db, produto_id)
+    if not stats:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
     
-    # Get sales stats
-    from sqlalchemy import func
-    sales_stats = db.query(
-        func.count(models.SaleItem.id).label('total_vendas'),
-        func.sum(models.SaleItem.quantity).label('quantidade_vendida'),
-        func.sum(models.SaleItem.total_price).label('receita_total')
-    ).filter(models.SaleItem.produto_id == produto_id).first()
-    
-    return {
-        "produto_id": produto_id,
-        "produto_nome": produto.nome,
-        "produto_valor": produto.valor,
-        "estoque_atual": produto.estoque,
-        "total_vendas": sales_stats.total_vendas or 0,
-        "quantidade_vendida": sales_stats.quantidade_vendida or 0,
-        "receita_total": float(sales_stats.receita_total or 0)
-    }
+    return stats[0]
@@ -0,0 +1,54 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from routers.auth import get_current_admin
+import models
+from utils.profiling import sampler, request_profiles, ProfilerBusy
+
+router = APIRouter(prefix="/profiling", tags=["profiling"])
+
+
+@router.post("/sample", response_class=PlainTextResponse)
+async def sample_stacks(
+    seconds: float = Query(10, gt=0, le=120, description="Duração da amostragem"),
+    interval_ms: float = Query(5, ge=1, le=1000, description="Intervalo entre amostras"),
+    include_idle: bool = Query(False, description="Incluir threads ociosas"),
+    current_user: models.User = Depends(get_current_admin)
+):
+    """Sample every thread's stack for N seconds; returns collapsed stacks for flamegraphs"""
+    try:
+        future = sampler.start(seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusy:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profiling session is already running"
+        )
+
+    # Waits without holding a worker thread, so the app keeps serving
+    result = await asyncio.wrap_future(future)
+    return PlainTextResponse(
+        sampler.render(result["stacks"]),
+        headers={"X-Profile-Samples": str(result["samples"])}
+    )
+
+
+@router.get("/requests")
+def list_request_profiles(current_user: models.User = Depends(get_current_admin)):
+    """Requests captured with the X-Profile header, newest first"""
+    return request_profiles.list()
+
+
+@router.get("/requests/{profile_id}", response_class=PlainTextResponse)
+def read_request_profile(
+    profile_id: int,
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls|ncalls)$"),
+    limit: int = Query(50, ge=1, le=500),
+    current_user: models.User = Depends(get_current_admin)
+):
+    """pstats report of one captured request"""
+    report = request_profiles.render(profile_id, sort=sort, limit=limit)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(report)
@@ -1,34 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, and_, select, update
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 from datetime import datetime, date
 
-from database import get_db
-from routers.auth import get_current_user
+from database import get_db, get_read_db, get_async_db
+from routers.auth import get_current_user, get_current_user_async
 import models
 import schemas
+from utils.money import to_cents, from_cents
+from utils import summaries, event_log, group_commit, archive
+from utils.forecast import forecast
+from utils.events import bus, sale_event, stock_event, balance_event
+from utils.idempotency import IdempotentRequest, idempotent_request
 
 router = APIRouter(prefix="/sales", tags=["sales"])
 
 
-@router.post("/", response_model=schemas.Sale)
-def create_sale(
-    sale: schemas.SaleCreate,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
-):
+def ring_up(db: Session, sale: schemas.SaleCreate):
+    """Apply a sale to `db` without committing it.
+
+    Returns (response, sale, usuario, produtos by id); the response is built
+    before the commit so an Idempotency-Key can store it in the same
+    transaction. Runs on the request's session, or inside a savepoint of a
+    shared transaction when checkout group commit is on.
+    """
     # Verify usuario exists
-    usuario = db.query(models.Usuario).filter(models.Usuario.id == sale.usuario_id).first()
+    usuario = db.get(models.Usuario, sale.usuario_id)
     if usuario is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
+    # Load every produto in the cart with a single query
+    produto_ids = {item.produto_id for item in sale.items}
+    produtos = {
+        produto.id: produto
+        for produto in db.scalars(select(models.Produto).where(models.Produto.id.in_(produto_ids)))
+    }
+    
     # Verify all produtos exist and have sufficient stock
+    # (all money math below is in integer centavos)
     total_amount = 0
     validated_items = []
     
     for item in sale.items:
-        produto = db.query(models.Produto).filter(models.Produto.id == item.produto_id).first()
+        produto = produtos.get(item.produto_id)
         if produto is None:
             raise HTTPException(status_code=404, detail=f"Produto com id {item.produto_id} não encontrado")
         
@@ -39,7 +57,7 @@ def create_sale(
             )
         
         # Use current produto price if not provided
-        unit_price = item.unit_price if item.unit_price else produto.valor
+        unit_price = to_cents(item.unit_price) if item.unit_price else produto.valor_cents
         item_total = unit_price * item.quantity
         total_amount += item_total
         
@@ -52,62 +70,191 @@ def create_sale(
         })
     
     # Check usuario balance
-    if usuario.saldo < total_amount:
+    if usuario.saldo_cents < total_amount:
         raise HTTPException(
             status_code=400,
-            detail=f"Saldo insuficiente. Disponível: {usuario.saldo}, Necessário: {total_amount}"
+            detail=f"Saldo insuficiente. Disponível: {usuario.saldo}, Necessário: {from_cents(total_amount)}"
         )
     
-    # Create sale
+    # Create sale together with its items, so the response needs no reload
     db_sale = models.Sale(
         usuario_id=sale.usuario_id,
-        total_amount=total_amount
+        total_amount_cents=total_amount,
+        items=[
+            models.SaleItem(
+                produto_id=item_data["produto_id"],
+                quantity=item_data["quantity"],
+                unit_price_cents=item_data["unit_price"],
+                total_price_cents=item_data["total_price"]
+            )
+            for item_data in validated_items
+        ]
     )
     db.add(db_sale)
     db.flush()  # Get the sale ID
     
-    # Create sale items and update produto stock
-    sale_items = []
+    # Update produto stock and usuario balance. The checks above read outside
+    # the write lock, so each UPDATE is relative and re-checks its guard;
+    # a failed guard raises and the caller rolls the whole sale back.
+    quantities = {}
     for item_data in validated_items:
-        db_sale_item = models.SaleItem(
-            sale_id=db_sale.id,
-            produto_id=item_data["produto_id"],
-            quantity=item_data["quantity"],
-            unit_price=item_data["unit_price"],
-            total_price=item_data["total_price"]
+        quantities[item_data["produto_id"]] = quantities.get(item_data["produto_id"], 0) + item_data["quantity"]
+    for produto_id, quantity in quantities.items():
+        produto = produtos[produto_id]
+        estoque = db.scalar(
+            update(models.Produto)
+            .where(models.Produto.id == produto_id, models.Produto.estoque >= quantity)
+            .values(estoque=models.Produto.estoque - quantity)
+            .returning(models.Produto.estoque),
+            execution_options={"synchronize_session": False},
         )
-        sale_items.append(db_sale_item)
-        db.add(db_sale_item)
-        
-        # Update produto stock
-        produto = item_data["produto"]
-        produto.estoque -= item_data["quantity"]
-    
-    # Update usuario balance
-    usuario.saldo -= total_amount
+        if estoque is None:
+            available = db.scalar(select(models.Produto.estoque).where(models.Produto.id == produto_id))
+            raise HTTPException(
+                status_code=400,
+                detail=f"Estoque insuficiente para {produto.nome}. Disponível: {available}, Solicitado: {quantity}"
+            )
+        set_committed_value(produto, "estoque", estoque)
+
+    saldo_cents = db.scalar(
+        update(models.Usuario)
+        .where(models.Usuario.id == usuario.id, models.Usuario.saldo_cents >= total_amount)
+        .values(saldo_cents=models.Usuario.saldo_cents - total_amount)
+        .returning(models.Usuario.saldo_cents),
+        execution_options={"synchronize_session": False},
+    )
+    if saldo_cents is None:
+        available = db.scalar(select(models.Usuario.saldo_cents).where(models.Usuario.id == usuario.id))
+        raise HTTPException(
+            status_code=400,
+            detail=f"Saldo insuficiente. Disponível: {from_cents(available)}, Necessário: {from_cents(total_amount)}"
+        )
+    set_committed_value(usuario, "saldo_cents", saldo_cents)
+
+    # Ledger entries, appended to the event log once the sale commits
+    for item_data in validated_items:
+        event_log.record(
+            db, "stock.sale", produto_id=item_data["produto_id"],
+            quantity=-item_data["quantity"], ref=f"sale:{db_sale.id}"
+        )
+    event_log.record(db, "balance.debit", usuario_id=usuario.id, amount_cents=-total_amount, ref=f"sale:{db_sale.id}")
     
     # Create balance transaction
     balance_transaction = models.BalanceTransaction(
         usuario_id=usuario.id,
-        amount=total_amount,
+        amount_cents=total_amount,
         transaction_type="debit",
         description=f"Compra - Venda #{db_sale.id}"
     )
     db.add(balance_transaction)
     
-    db.commit()
-    db.refresh(db_sale)
+    summaries.record_sale(db, usuario, db_sale)
+    summaries.record_sale_items(db, db_sale, db_sale.items)
     
     # Prepare response
     db_sale.usuario_nome = usuario.nome
     db_sale.usuario_nickname = usuario.nickname
     
     # Add produto info to sale items
-    for i, sale_item in enumerate(db_sale.items):
-        produto = validated_items[i]["produto"]
-        sale_item.produto_nome = produto.nome
+    for sale_item in db_sale.items:
+        sale_item.produto_nome = produtos[sale_item.produto_id].nome
+    
+    response = Response(
+        content=schemas.Sale.model_validate(db_sale).model_dump_json(),
+        media_type="application/json"
+    )
+    return response, db_sale, usuario, produtos
+
+
+@router.post("/", response_model=schemas.Sale)
+async def create_sale(
+    sale: schemas.SaleCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async),
+    idempotency: IdempotentRequest = Depends(idempotent_request)
+):
+    if group_commit.writer.running:
+        def apply(session):
+            result = ring_up(session, sale)
+            # Stored with the sale; a clashing key fails only this savepoint
+            idempotency.stage(session, result[0].body)
+            session.flush()
+            return result
+        
+        try:
+            response, db_sale, usuario, produtos = await group_commit.writer.submit(apply)
+        except IntegrityError:
+            await db.run_sync(idempotency.conflict)
+            raise
+        idempotency.committed()
+    else:
+        response, db_sale, usuario, produtos = await db.run_sync(ring_up, sale)
+        # With an Idempotency-Key the response is stored in the same
+        # transaction, for retries to get back
+        await db.run_sync(idempotency.commit, response.body)
+    
+    await db.run_sync(lambda session: forecast.refresh(session, produtos.keys()))
+    
+    # Live dashboard updates (after commit, so screens never see a rollback)
+    bus.publish("sale", sale_event(db_sale, usuario, [item.produto_nome for item in db_sale.items]))
+    for produto in produtos.values():
+        bus.publish("stock", stock_event(produto))
+    bus.publish("balance", balance_event(usuario))
     
-    return db_sale
+    return response
+
+
+def _sale_rows(db: Session, Sale):
+    return db.query(
+        Sale.id,
+        Sale.usuario_id,
+        Sale.total_amount_cents,
+        Sale.created_at,
+        Sale.voided_at,
+        models.Usuario.nome,
+        models.Usuario.nickname
+    ).join(models.Usuario, models.Usuario.id == Sale.usuario_id)
+
+
+def _sale_dicts(db: Session, rows, SaleItem) -> List[dict]:
+    """Sale rows plus every item (and produto name) of them, in one query"""
+    items = {row.id: [] for row in rows}
+    if items:
+        item_rows = db.query(
+            SaleItem.id,
+            SaleItem.sale_id,
+            SaleItem.produto_id,
+            SaleItem.quantity,
+            SaleItem.unit_price_cents,
+            SaleItem.total_price_cents,
+            models.Produto.nome
+        ).join(models.Produto, models.Produto.id == SaleItem.produto_id)\
+            .filter(SaleItem.sale_id.in_(list(items)))\
+            .order_by(SaleItem.id)
+        for item in item_rows:
+            items[item.sale_id].append({
+                "produto_id": item.produto_id,
+                "quantity": item.quantity,
+                "unit_price": item.unit_price_cents / 100,
+                "id": item.id,
+                "sale_id": item.sale_id,
+                "produto_nome": item.nome,
+                "total_price": item.total_price_cents / 100
+            })
+
+    return [
+        {
+            "usuario_id": row.usuario_id,
+            "id": row.id,
+            "total_amount": row.total_amount_cents / 100,
+            "created_at": row.created_at,
+            "voided_at": row.voided_at,
+            "usuario_nome": row.nome,
+            "usuario_nickname": row.nickname,
+            "items": items[row.id]
+        }
+        for row in rows
+    ]
 
 
 @router.get("/", response_model=List[schemas.Sale])
@@ -117,43 +264,47 @@ def read_sales(
     usuario_id: Optional[int] = Query(None, description="Filter by usuario ID"),
     date_from: Optional[date] = Query(None, description="Filter sales from this date"),
     date_to: Optional[date] = Query(None, description="Filter sales to this date"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    query = db.query(models.Sale).join(models.Usuario)
+    # Plain rows in two queries (sales + usuarios, then every item + produto
+    # of the page) instead of lazy-loading each sale's relationships.
+    # Archived seasons are read only when the date range reaches them.
+    Sale, SaleItem = archive.history(db, date_from, date_to)
+    query = _sale_rows(db, Sale)
     
     if usuario_id:
-        query = query.filter(models.Sale.usuario_id == usuario_id)
+        query = query.filter(Sale.usuario_id == usuario_id)
     
     if date_from:
-        query = query.filter(func.date(models.Sale.created_at) >= date_from)
+        query = query.filter(func.date(Sale.created_at) >= date_from)
     
     if date_to:
-        query = query.filter(func.date(models.Sale.created_at) <= date_to)
+        query = query.filter(func.date(Sale.created_at) <= date_to)
     
-    sales = query.offset(skip).limit(limit).all()
-    
-    # Add usuario info to each sale
-    for sale in sales:
-        sale.usuario_nome = sale.usuario.nome
-        sale.usuario_nickname = sale.usuario.nickname
-        
-        # Add produto info to sale items
-        for sale_item in sale.items:
-            sale_item.produto_nome = sale_item.produto.nome
+    rows = query.order_by(Sale.id).offset(skip).limit(limit).all()
     
-    return sales
+    # Values straight from the database need no validation: pydantic-core
+    # writes the JSON directly, instead of validating against response_model
+    # and then walking the result again with jsonable_encoder
+    sales = _sale_dicts(db, rows, SaleItem)
+    return Response(content=schemas.SaleList.dump_json(sales), media_type="application/json")
 
 
 @router.get("/{sale_id}", response_model=schemas.Sale)
 def read_sale(
     sale_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
     sale = db.query(models.Sale).filter(models.Sale.id == sale_id).first()
     if sale is None:
-        raise HTTPException(status_code=404, detail="Venda não encontrada")
+        # Not in the main file: maybe in an archived season
+        Sale, SaleItem = archive.history(db)
+        rows = _sale_rows(db, Sale).filter(Sale.id == sale_id).all() if Sale is not models.Sale else []
+        if not rows:
+            raise HTTPException(status_code=404, detail="Venda não encontrada")
+        return _sale_dicts(db, rows, SaleItem)[0]
     
     # Add usuario info
     sale.usuario_nome = sale.usuario.nome
@@ -166,25 +317,103 @@ def read_sale(
     return sale
 
 
+@router.post("/{sale_id}/void", response_model=schemas.Sale)
+def void_sale(
+    sale_id: int,
+    motivo: Optional[str] = Query(None, description="Motivo do estorno"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    # Conditional update first: of two voids racing for the same sale only
+    # one matches, and it holds the write lock for the rest of the transaction
+    voided = db.query(models.Sale).filter(
+        models.Sale.id == sale_id,
+        models.Sale.voided_at.is_(None)
+    ).update({models.Sale.voided_at: datetime.utcnow()}, synchronize_session=False)
+    if not voided:
+        if db.get(models.Sale, sale_id) is None:
+            if archive.is_archived_sale(db, sale_id):
+                raise HTTPException(status_code=409, detail="Venda de temporada arquivada não pode ser estornada")
+            raise HTTPException(status_code=404, detail="Venda não encontrada")
+        raise HTTPException(status_code=409, detail="Venda já estornada")
+    
+    sale = db.get(models.Sale, sale_id)
+    
+    # Put the stock back, one relative update per produto
+    quantities = {}
+    for item in sale.items:
+        quantities[item.produto_id] = quantities.get(item.produto_id, 0) + item.quantity
+    for produto_id, quantity in quantities.items():
+        db.query(models.Produto).filter(models.Produto.id == produto_id).update(
+            {models.Produto.estoque: models.Produto.estoque + quantity}, synchronize_session=False
+        )
+        event_log.record(db, "stock.void", produto_id=produto_id, quantity=quantity, ref=f"void:{sale_id}")
+    
+    # Refund the usuario
+    db.query(models.Usuario).filter(models.Usuario.id == sale.usuario_id).update(
+        {models.Usuario.saldo_cents: models.Usuario.saldo_cents + sale.total_amount_cents},
+        synchronize_session=False
+    )
+    event_log.record(
+        db, "balance.credit", usuario_id=sale.usuario_id,
+        amount_cents=sale.total_amount_cents, ref=f"void:{sale_id}"
+    )
+    description = f"Estorno - Venda #{sale_id}"
+    if motivo:
+        description += f" ({motivo})"
+    db.add(models.BalanceTransaction(
+        usuario_id=sale.usuario_id,
+        amount_cents=sale.total_amount_cents,
+        transaction_type="credit",
+        description=description
+    ))
+    
+    # Take the sale out of the materialized totals
+    summaries.record_void(db, sale)
+    summaries.record_void_items(db, sale, sale.items)
+    
+    db.commit()
+    
+    # Reload what the relative updates changed
+    db.refresh(sale)
+    usuario = db.get(models.Usuario, sale.usuario_id)
+    db.refresh(usuario)
+    produtos = {produto.id: produto for produto in db.query(models.Produto).filter(models.Produto.id.in_(quantities))}
+    forecast.refresh(db, quantities.keys())
+    
+    bus.publish("sale_void", {"id": sale.id, "usuario_id": sale.usuario_id, "total_amount": sale.total_amount})
+    for produto in produtos.values():
+        bus.publish("stock", stock_event(produto))
+    bus.publish("balance", balance_event(usuario))
+    
+    sale.usuario_nome = usuario.nome
+    sale.usuario_nickname = usuario.nickname
+    for sale_item in sale.items:
+        sale_item.produto_nome = produtos[sale_item.produto_id].nome
+    return sale
+
+
 @router.get("/stats/today")
 def get_today_stats(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
     today = date.today()
     
     # Total sales amount today
-    total_amount = db.query(func.sum(models.Sale.total_amount)).filter(
-        func.date(models.Sale.created_at) == today
+    total_amount = db.query(func.sum(models.Sale.total_amount_cents)).filter(
+        func.date(models.Sale.created_at) == today,
+        models.Sale.voided_at.is_(None)
     ).scalar() or 0
     
     # Total sales count today
     total_count = db.query(func.count(models.Sale.id)).filter(
-        func.date(models.Sale.created_at) == today
+        func.date(models.Sale.created_at) == today,
+        models.Sale.voided_at.is_(None)
     ).scalar() or 0
     
     return {
-        "total_amount": float(total_amount),
+        "total_amount": float(from_cents(total_amount)),
         "total_count": total_count,
         "date": today
     }
@@ -1,11 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from sqlalchemy import update
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from decimal import Decimal
 from typing import List, Optional
 
-from database import get_db
+from database import get_db, get_read_db
 from routers.auth import get_current_user
 import models
 import schemas
+from utils.money import to_cents, from_cents
+from utils import summaries, event_log, archive
+from utils.events import bus, balance_event
+from utils.responses import json_response
+from utils.idempotency import IdempotentRequest, idempotent_request
 
 router = APIRouter(prefix="/usuarios", tags=["usuarios"])
 
@@ -24,8 +34,11 @@ def create_usuario(
             detail="Nickname já existe"
         )
     
-    db_usuario = models.Usuario(**usuario.dict())
+    db_usuario = models.Usuario(**usuario.model_dump())
     db.add(db_usuario)
+    db.flush()
+    summaries.record_balance(db, db_usuario)
+    event_log.record(db, "balance.set", usuario_id=db_usuario.id, saldo_cents=db_usuario.saldo_cents, ref="create")
     db.commit()
     db.refresh(db_usuario)
     return db_usuario
@@ -36,7 +49,7 @@ def read_usuarios(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = Query(None, description="Buscar por nome ou nickname"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
     query = db.query(models.Usuario)
@@ -49,13 +62,13 @@ def read_usuarios(
         )
     
     usuarios = query.offset(skip).limit(limit).all()
-    return usuarios
+    return json_response(schemas.UsuarioList, usuarios)
 
 
 @router.get("/{usuario_id}", response_model=schemas.Usuario)
 def read_usuario(
     usuario_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
     usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
@@ -87,10 +100,14 @@ def update_usuario(
                 detail="Nickname já existe"
             )
     
-    update_data = usuario_update.dict(exclude_unset=True)
+    update_data = usuario_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(usuario, field, value)
     
+    if "saldo" in update_data:
+        summaries.record_balance(db, usuario)
+        event_log.record(db, "balance.set", usuario_id=usuario.id, saldo_cents=usuario.saldo_cents, ref="edit")
+    
     db.commit()
     db.refresh(usuario)
     return usuario
@@ -106,14 +123,16 @@ def delete_usuario(
     if usuario is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
-    # Check if usuario has any sales
-    has_sales = db.query(models.Sale).filter(models.Sale.usuario_id == usuario_id).first()
+    # Check if usuario has any sales (archived seasons included)
+    Sale, _ = archive.history(db)
+    has_sales = db.query(Sale.id).filter(Sale.usuario_id == usuario_id).first()
     if has_sales:
         raise HTTPException(
             status_code=400,
             detail="Não é possível excluir usuário com histórico de vendas"
         )
     
+    db.query(models.UsuarioSummary).filter(models.UsuarioSummary.usuario_id == usuario_id).delete()
     db.delete(usuario)
     db.commit()
     return {"message": "Usuário excluído com sucesso"}
@@ -122,86 +141,109 @@ def delete_usuario(
 @router.post("/{usuario_id}/add-balance")
 def add_balance(
     usuario_id: int,
-    amount: float,
+    amount: Decimal,
     description: str = "Recarga de saldo",
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: models.User = Depends(get_current_user),
+    idempotency: IdempotentRequest = Depends(idempotent_request)
 ):
     usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
     if usuario is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
-    if amount <= 0:
+    # FastAPI (0.104) drops Money's validator on query parameters, so the
+    # range check runs here and fails like a body field would, with a 422
+    try:
+        amount_cents = to_cents(amount)
+    except ValueError as exc:
+        raise RequestValidationError([
+            {"type": "value_error", "loc": ("query", "amount"), "msg": str(exc), "input": str(amount)}
+        ])
+    if amount_cents <= 0:
         raise HTTPException(status_code=400, detail="Valor deve ser positivo")
     
-    # Update balance
-    usuario.saldo += amount
+    # Relative update, so a sale committing meanwhile isn't overwritten
+    saldo_cents = db.scalar(
+        update(models.Usuario)
+        .where(models.Usuario.id == usuario_id)
+        .values(saldo_cents=models.Usuario.saldo_cents + amount_cents)
+        .returning(models.Usuario.saldo_cents),
+        execution_options={"synchronize_session": False},
+    )
+    set_committed_value(usuario, "saldo_cents", saldo_cents)
     
     # Create balance transaction
     balance_transaction = models.BalanceTransaction(
         usuario_id=usuario_id,
-        amount=amount,
+        amount_cents=amount_cents,
         transaction_type="credit",
         description=description
     )
     db.add(balance_transaction)
     
-    db.commit()
-    db.refresh(usuario)
+    summaries.record_balance(db, usuario)
+    event_log.record(db, "balance.credit", usuario_id=usuario_id, amount_cents=amount_cents, ref="add-balance")
     
-    return {
+    response = JSONResponse({
         "message": f"Saldo adicionado com sucesso",
-        "novo_saldo": usuario.saldo,
-        "valor_adicionado": amount
-    }
+        "novo_saldo": float(usuario.saldo),
+        "valor_adicionado": float(from_cents(amount_cents))
+    })
+    # Stored with the recarga when the till sent an Idempotency-Key
+    idempotency.commit(db, response.body)
+    db.refresh(usuario)
+    bus.publish("balance", balance_event(usuario))
+    
+    return response
 
 
 @router.get("/{usuario_id}/balance-history")
 def get_balance_history(
     usuario_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
     usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
     if usuario is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
-    transactions = db.query(models.BalanceTransaction)\
-        .filter(models.BalanceTransaction.usuario_id == usuario_id)\
-        .order_by(models.BalanceTransaction.created_at.desc())\
+    # Archived seasons included
+    BalanceTransaction = archive.balance_history(db)
+    transactions = db.query(BalanceTransaction)\
+        .filter(BalanceTransaction.usuario_id == usuario_id)\
+        .order_by(BalanceTransaction.created_at.desc())\
         .all()
     
     return {
         "usuario_id": usuario_id,
         "usuario_nome": usuario.nome,
-        "saldo_atual": usuario.saldo,
-        "historico": transactions
+        "saldo_atual": float(usuario.saldo),
+        "historico": schemas.BalanceTransactionList.dump_python(
+            schemas.BalanceTransactionList.validate_python(transactions, from_attributes=True),
+            mode="json"
+        )
     }
 
 
 @router.get("/{usuario_id}/sales-summary")
 def get_usuario_sales_summary(
     usuario_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
-    if usuario is None:
+    # Materialized summary: a primary-key lookup instead of aggregating sales
+    summary = summaries.get_usuario_summary(db, usuario_id)
+    if summary is None:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
     
-    # Get sales summary
-    from sqlalchemy import func
-    sales_summary = db.query(
-        func.count(models.Sale.id).label('total_vendas'),
-        func.sum(models.Sale.total_amount).label('total_gasto'),
-        func.avg(models.Sale.total_amount).label('gasto_medio')
-    ).filter(models.Sale.usuario_id == usuario_id).first()
+    gasto_medio = round(summary.total_gasto_cents / summary.total_vendas) if summary.total_vendas else 0
     
     return {
         "usuario_id": usuario_id,
-        "usuario_nome": usuario.nome,
-        "saldo_atual": usuario.saldo,
-        "total_vendas": sales_summary.total_vendas or 0,
-        "total_gasto": float(sales_summary.total_gasto or 0),
-        "gasto_medio": float(sales_summary.gasto_medio or 0)
+        "usuario_nome": summary.usuario.nome,
+        "saldo_atual": float(summary.saldo),
+        "total_vendas": summary.total_vendas,
+        "total_gasto": float(summary.total_gasto),
+        "gasto_medio": float(from_cents(gasto_medio)),
+        "ultima_compra": summary.last_purchase_at
     }
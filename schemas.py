@@ -1,19 +1,37 @@
-from pydantic import BaseModel
-from datetime import datetime
-from typing import Optional, List
+from pydantic import BaseModel, AfterValidator, ConfigDict, PlainSerializer, TypeAdapter
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Optional, List, Annotated
 from enum import Enum
 
+from typing_extensions import TypedDict
+
+from utils.money import quantize
+
+
+# Money amounts are exact Decimals rounded to centavos, serialized as plain
+# JSON numbers so existing clients keep receiving e.g. 15.3
+Money = Annotated[
+    Decimal,
+    AfterValidator(quantize),
+    PlainSerializer(float, return_type=float, when_used="json"),
+]
+
 
 # Base Schemas
 class BaseSchema(BaseModel):
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Auth Schemas
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 
 class TokenData(BaseModel):
@@ -35,8 +53,7 @@ class User(UserBase):
     is_active: bool
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class UserLogin(BaseModel):
@@ -54,31 +71,30 @@ class UsuarioBase(BaseModel):
 
 
 class UsuarioCreate(UsuarioBase):
-    saldo: Optional[float] = 0.0
+    saldo: Optional[Money] = Decimal(0)
 
 
 class UsuarioUpdate(BaseModel):
     nome: Optional[str] = None
     nickname: Optional[str] = None
     quarto: Optional[str] = None
-    saldo: Optional[float] = None
+    saldo: Optional[Money] = None
     nome_pai: Optional[str] = None
     nome_mae: Optional[str] = None
 
 
 class Usuario(UsuarioBase):
     id: int
-    saldo: float
+    saldo: Money
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Produto Schemas
 class ProdutoBase(BaseModel):
     nome: str
-    valor: float
+    valor: Money
 
 
 class ProdutoCreate(ProdutoBase):
@@ -87,7 +103,7 @@ class ProdutoCreate(ProdutoBase):
 
 class ProdutoUpdate(BaseModel):
     nome: Optional[str] = None
-    valor: Optional[float] = None
+    valor: Optional[Money] = None
     estoque: Optional[int] = None
 
 
@@ -96,15 +112,29 @@ class Produto(ProdutoBase):
     estoque: int
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ProdutoStats(BaseModel):
+    produto_id: int
+    produto_nome: str
+    produto_valor: Money
+    estoque_atual: int
+    total_vendas: int
+    quantidade_vendida: int
+    receita_total: Money
+    ultima_venda: Optional[datetime] = None
+    vendas_7d: int
+    vendas_30d: int
+    velocidade_7d: float
+    velocidade_30d: float
 
 
 # Sale Item Schemas
 class SaleItemBase(BaseModel):
     produto_id: int
     quantity: int
-    unit_price: float
+    unit_price: Money
 
 
 class SaleItemCreate(SaleItemBase):
@@ -115,10 +145,9 @@ class SaleItem(SaleItemBase):
     id: int
     sale_id: int
     produto_nome: str
-    total_price: float
+    total_price: Money
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Sale Schemas
@@ -132,14 +161,38 @@ class SaleCreate(SaleBase):
 
 class Sale(SaleBase):
     id: int
-    total_amount: float
+    total_amount: Money
     created_at: datetime
+    voided_at: Optional[datetime] = None
     usuario_nome: str
     usuario_nickname: str
     items: List[SaleItem]
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+# Wire format of Sale as plain dicts, for large pages: read_sales fills
+# these straight from database rows and skips model validation. Money is
+# cents / 100, the same float Money serializes to.
+class SaleItemRow(TypedDict):
+    produto_id: int
+    quantity: int
+    unit_price: float
+    id: int
+    sale_id: int
+    produto_nome: str
+    total_price: float
+
+
+class SaleRow(TypedDict):
+    usuario_id: int
+    id: int
+    total_amount: float
+    created_at: datetime
+    voided_at: Optional[datetime]
+    usuario_nome: str
+    usuario_nickname: str
+    items: List[SaleItemRow]
 
 
 # Restock Schemas
@@ -157,15 +210,19 @@ class Restock(RestockBase):
     produto_nome: str
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Balance Transaction Schemas
+class BalanceTransactionType(str, Enum):
+    CREDIT = "credit"
+    DEBIT = "debit"
+
+
 class BalanceTransactionBase(BaseModel):
     usuario_id: int
-    amount: float
-    transaction_type: str
+    amount: Money
+    transaction_type: BalanceTransactionType
     description: Optional[str] = None
 
 
@@ -177,8 +234,7 @@ class BalanceTransaction(BalanceTransactionBase):
     id: int
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Dashboard Schemas
@@ -186,7 +242,7 @@ class DashboardStats(BaseModel):
     total_usuarios: int
     total_produtos: int
     low_stock_produtos: int
-    total_sales_today: float
+    total_sales_today: Money
     total_sales_count_today: int
 
 
@@ -194,47 +250,77 @@ class RecentSale(BaseModel):
     id: int
     usuario_nome: str
     produtos: str
-    total_amount: float
+    total_amount: Money
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class LowStockProduto(BaseModel):
     id: int
     nome: str
     estoque: int
+    consumo_diario: float = 0.0
+    dias_ate_esgotar: Optional[float] = None
+    ultimo_reabastecimento: Optional[datetime] = None
 
-    class Config:
-        from_attributes = True
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
-# Balance Transaction Schemas
-class BalanceTransactionType(str, Enum):
-    CREDIT = "credit"
-    DEBIT = "debit"
+# Analytics Schemas
+class AnalyticsGranularity(str, Enum):
+    hour = "hour"
+    day = "day"
+    week = "week"
 
 
-class BalanceTransactionBase(BaseModel):
-    customer_id: int
-    amount: float
-    transaction_type: BalanceTransactionType
-    description: Optional[str] = None
+class SalesBucket(BaseModel):
+    bucket: str
+    vendas: int
+    itens: int
+    receita: Money
 
 
-class BalanceTransactionCreate(BalanceTransactionBase):
-    pass
+class TopProduto(BaseModel):
+    produto_id: int
+    produto_nome: str
+    quantidade: int
+    receita: Money
 
 
-class BalanceTransaction(BalanceTransactionBase):
-    id: int
-    created_at: datetime
-    customer_name: str
+class QuartoGasto(BaseModel):
+    quarto: Optional[str] = None
+    usuarios: int
+    vendas: int
+    receita: Money
+
 
-    class Config:
-        from_attributes = True
+class HistogramBin(BaseModel):
+    de: Money
+    ate: Money
+    vendas: int
+
+
+class TicketDistribution(BaseModel):
+    vendas: int
+    media: Money
+    desvio_padrao: Money
+    minimo: Money
+    maximo: Money
+    percentis: Dict[str, Money]
+    histograma: List[HistogramBin]
+
+
+class SalesAnalytics(BaseModel):
+    date_from: date
+    date_to: date
+    granularity: AnalyticsGranularity
+    total_vendas: int
+    receita_total: Money
+    buckets: List[SalesBucket]
+    top_produtos: List[TopProduto]
+    quartos: List[QuartoGasto]
+    distribuicao: Optional[TicketDistribution] = None
 
 
 # Backup Schemas
@@ -254,3 +340,17 @@ class BackupResponse(BaseModel):
     backups: Optional[List[BackupInfo]] = None
     error: Optional[str] = None
     tables_cleared: Optional[int] = None
+
+
+# List adapters, built once at import instead of per request. Used with
+# utils.responses.json_response: one validation, JSON bytes from pydantic-core.
+UsuarioList = TypeAdapter(List[Usuario])
+ProdutoList = TypeAdapter(List[Produto])
+ProdutoStatsList = TypeAdapter(List[ProdutoStats])
+RecentSaleList = TypeAdapter(List[RecentSale])
+LowStockProdutoList = TypeAdapter(List[LowStockProduto])
+BalanceTransactionList = TypeAdapter(List[BalanceTransaction])
+BackupInfoList = TypeAdapter(List[BackupInfo])
+
+# Sale pages skip validation entirely, see SaleRow
+SaleList = TypeAdapter(List[SaleRow])
@@ -5,42 +5,17 @@ from pathlib import Path
 
 def create_sample_data():
     """Create sample data for testing"""
-    from database import get_db
-    from auth import get_password_hash
-    import models
-    
-    db = next(get_db())
-    
-    # Create sample customers
-    customers_data = [
-        {"name": "João Silva", "code": "CLI001", "phone": "(11) 99999-9999", "balance": 50.00, "room": "101", "season": "Verão 2024"},
-        {"name": "Maria Santos", "code": "CLI002", "phone": "(11) 88888-8888", "balance": 75.50, "room": "205", "season": "Verão 2024"},
-        {"name": "Pedro Costa", "code": "CLI003", "phone": "(11) 77777-7777", "balance": 25.30, "room": "318", "season": "Verão 2024"},
-    ]
-    
-    for customer_data in customers_data:
-        existing = db.query(models.Customer).filter(models.Customer.code == customer_data["code"]).first()
-        if not existing:
-            customer = models.Customer(**customer_data)
-            db.add(customer)
-    
-    # Create sample products
-    products_data = [
-        {"name": "Refrigerante Coca-Cola", "code": "REF001", "price": 5.00, "stock": 50},
-        {"name": "Sanduíche Natural", "code": "SAN001", "price": 12.00, "stock": 25},
-        {"name": "Suco de Laranja", "code": "SUC001", "price": 8.50, "stock": 15},
-        {"name": "Água Mineral", "code": "AGU001", "price": 3.00, "stock": 8},
-        {"name": "Pão de Açúcar", "code": "PAO001", "price": 6.50, "stock": 3},
-    ]
-    
-    for product_data in products_data:
-        existing = db.query(models.Product).filter(models.Product.code == product_data["code"]).first()
-        if not existing:
-            product = models.Product(**product_data)
-            db.add(product)
-    
-    db.commit()
-    db.close()
+    from sqlalchemy import text
+    from database import engine
+    import generate_data
+
+    with engine.connect() as connection:
+        if connection.execute(text("SELECT 1 FROM usuarios LIMIT 1")).first() is not None:
+            print("ℹ️ Database already has data, skipping sample data")
+            return
+
+    # A small history; `python generate_data.py` builds larger ones
+    generate_data.generate(engine, usuarios=50, produtos=20, sales=500, log=lambda message: None)
     print("✅ Sample data created successfully!")
 
 
@@ -62,9 +37,8 @@ def main():
     # Create database tables
     print("🗄️ Creating database tables...")
     try:
-        from database import engine
-        import models
-        models.Base.metadata.create_all(bind=engine)
+        from utils.migrations import upgrade
+        upgrade()
         print("✅ Database tables created successfully!")
     except Exception as e:
         print(f"❌ Error creating database tables: {e}")
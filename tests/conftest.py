@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# The app reads its configuration on import: point it at a scratch database
+_tmp = tempfile.mkdtemp(prefix="cantina-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/cantina.db"
+os.environ["EVENT_LOG_DIR"] = os.path.join(_tmp, "event_log")
+os.environ["ARCHIVE_DIR"] = os.path.join(_tmp, "archives")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        token = client.post("/auth/token", data={"username": "admin", "password": "admin123"}).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        yield client
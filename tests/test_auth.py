@@ -0,0 +1,17 @@
+def _login(client):
+    response = client.post("/auth/token", data={"username": "admin", "password": "admin123"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_logout_revokes_only_its_own_session(client):
+    first = _login(client)
+    refreshed = client.post("/auth/refresh", json={"refresh_token": first["refresh_token"]}).json()
+    second = _login(client)
+    assert len({first["access_token"], refreshed["access_token"], second["access_token"]}) == 3
+
+    response = client.post("/auth/logout", headers={"Authorization": f"Bearer {refreshed['access_token']}"})
+    assert response.status_code == 204
+
+    assert client.get("/produtos/", headers={"Authorization": f"Bearer {refreshed['access_token']}"}).status_code == 401
+    assert client.get("/produtos/", headers={"Authorization": f"Bearer {second['access_token']}"}).status_code == 200
@@ -0,0 +1,25 @@
+import itertools
+
+import pytest
+
+_nicknames = (f"teste{index}" for index in itertools.count())
+
+
+@pytest.fixture
+def usuario(client):
+    response = client.post("/usuarios/", json={"nome": "Teste", "nickname": next(_nicknames), "quarto": "1"})
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.parametrize("amount", ["nan", "inf", "-inf", "1e30", "1e17", "abc"])
+def test_add_balance_rejects_invalid_amounts(client, usuario, amount):
+    response = client.post(f"/usuarios/{usuario['id']}/add-balance", params={"amount": amount})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["query", "amount"]
+
+
+def test_add_balance_rounds_to_centavos(client, usuario):
+    response = client.post(f"/usuarios/{usuario['id']}/add-balance", params={"amount": "5.105"})
+    assert response.status_code == 200
+    assert response.json()["novo_saldo"] == 5.11
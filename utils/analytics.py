@@ -0,0 +1,227 @@
+"""Grouped sales aggregates for reporting (GET /analytics/sales).
+
+Each aggregate is a single GROUP BY pass in SQL over the requested range
+(reading archived seasons when the range reaches them); voided sales are
+left out. Ticket-size percentiles and the histogram need
+every sale total of the range in memory and are computed with NumPy when
+it is installed, with the standard library otherwise (same results).
+
+Finished responses are cached per (range, granularity, options) together
+with the data versions they were computed at, so any write to the tables
+they read makes the entry stale.
+"""
+import os
+import statistics
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import distinct, func, select
+from sqlalchemy.orm import Session
+
+import models
+from utils import archive
+from utils.money import from_cents
+from utils.versions import versions
+
+try:
+    import numpy
+except ImportError:  # numpy is optional, the pure-Python path gives the same numbers
+    numpy = None
+
+# Analytics responses kept in memory
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "64"))
+
+# What the aggregates read; a write to any of them invalidates the cache
+TABLES = ("sales", "sale_items", "usuarios", "produtos")
+
+PERCENTILES = (25, 50, 75, 90, 99)
+HISTOGRAM_BINS = 10
+
+
+def _bucket(Sale, granularity: str):
+    """SQL expression labelling a sale's bucket (timestamps are UTC)"""
+    if granularity == "hour":
+        return func.strftime("%Y-%m-%d %H:00", Sale.created_at)
+    if granularity == "week":
+        # Monday of the sale's week
+        return func.date(Sale.created_at, "weekday 0", "-6 days")
+    return func.date(Sale.created_at)
+
+
+def _in_range(Sale, start: date, end: date):
+    # Compared on the raw column (no DATE() around it) so an index can serve it
+    return (
+        Sale.created_at >= datetime.combine(start, time.min),
+        Sale.created_at < datetime.combine(end + timedelta(days=1), time.min),
+        Sale.voided_at.is_(None),
+    )
+
+
+def sales_buckets(db: Session, start: date, end: date, granularity: str) -> List[dict]:
+    Sale, SaleItem = archive.history(db, start, end)
+    bucket = _bucket(Sale, granularity).label("bucket")
+    rows = db.execute(
+        select(
+            bucket,
+            func.count(distinct(Sale.id)),
+            func.sum(SaleItem.quantity),
+            func.sum(SaleItem.total_price_cents),
+        )
+        .join(SaleItem, SaleItem.sale_id == Sale.id)
+        .where(*_in_range(Sale, start, end))
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+    return [
+        {"bucket": label, "vendas": vendas, "itens": itens, "receita": from_cents(receita_cents)}
+        for label, vendas, itens, receita_cents in rows
+    ]
+
+
+def top_produtos(db: Session, start: date, end: date, limit: int) -> List[dict]:
+    Sale, SaleItem = archive.history(db, start, end)
+    receita = func.sum(SaleItem.total_price_cents).label("receita_cents")
+    rows = db.execute(
+        select(
+            models.Produto.id,
+            models.Produto.nome,
+            func.sum(SaleItem.quantity),
+            receita,
+        )
+        .join(SaleItem, SaleItem.produto_id == models.Produto.id)
+        .join(Sale, Sale.id == SaleItem.sale_id)
+        .where(*_in_range(Sale, start, end))
+        .group_by(models.Produto.id)
+        .order_by(receita.desc(), models.Produto.id)
+        .limit(limit)
+    )
+    return [
+        {"produto_id": produto_id, "produto_nome": nome, "quantidade": quantidade, "receita": from_cents(receita_cents)}
+        for produto_id, nome, quantidade, receita_cents in rows
+    ]
+
+
+def quarto_spending(db: Session, start: date, end: date) -> List[dict]:
+    Sale, _ = archive.history(db, start, end)
+    receita = func.sum(Sale.total_amount_cents).label("receita_cents")
+    rows = db.execute(
+        select(
+            models.Usuario.quarto,
+            func.count(distinct(models.Usuario.id)),
+            func.count(Sale.id),
+            receita,
+        )
+        .join(Sale, Sale.usuario_id == models.Usuario.id)
+        .where(*_in_range(Sale, start, end))
+        .group_by(models.Usuario.quarto)
+        .order_by(receita.desc())
+    )
+    return [
+        {"quarto": quarto, "usuarios": usuarios, "vendas": vendas, "receita": from_cents(receita_cents)}
+        for quarto, usuarios, vendas, receita_cents in rows
+    ]
+
+
+def _cents(value: float):
+    return from_cents(int(round(value)))
+
+
+def _distribution_numpy(totals: List[int]) -> Tuple[float, float, List[float], List[int], List[float]]:
+    values = numpy.asarray(totals, dtype=numpy.int64)
+    counts, edges = numpy.histogram(values, bins=HISTOGRAM_BINS)
+    return (
+        float(values.mean()),
+        float(values.std()),
+        numpy.percentile(values, PERCENTILES).tolist(),
+        counts.tolist(),
+        edges.tolist(),
+    )
+
+
+def _distribution_python(totals: List[int]) -> Tuple[float, float, List[float], List[int], List[float]]:
+    # "inclusive" quantiles interpolate like numpy.percentile's default
+    cuts = statistics.quantiles(totals, n=100, method="inclusive") if len(totals) > 1 else [totals[0]] * 99
+    low, high = min(totals), max(totals)
+    if low == high:
+        # numpy widens an empty range to +-0.5
+        low, high = low - 0.5, high + 0.5
+    width = (high - low) / HISTOGRAM_BINS
+    edges = [low + width * index for index in range(HISTOGRAM_BINS)] + [high]
+    counts = [0] * HISTOGRAM_BINS
+    for total in totals:
+        # The last bin is closed on the right, like numpy.histogram's
+        counts[min(int((total - low) / width), HISTOGRAM_BINS - 1)] += 1
+    return (
+        statistics.fmean(totals),
+        statistics.pstdev(totals),
+        [cuts[percentile - 1] for percentile in PERCENTILES],
+        counts,
+        edges,
+    )
+
+
+def ticket_distribution(db: Session, start: date, end: date) -> Optional[dict]:
+    """Spread of sale totals: mean, deviation, percentiles and a histogram"""
+    Sale, _ = archive.history(db, start, end)
+    totals = db.scalars(select(Sale.total_amount_cents).where(*_in_range(Sale, start, end))).all()
+    if not totals:
+        return None
+    compute = _distribution_numpy if numpy is not None else _distribution_python
+    mean, deviation, percentiles, counts, edges = compute(totals)
+    return {
+        "vendas": len(totals),
+        "media": _cents(mean),
+        "desvio_padrao": _cents(deviation),
+        "minimo": from_cents(min(totals)),
+        "maximo": from_cents(max(totals)),
+        "percentis": {f"p{percentile}": _cents(value) for percentile, value in zip(PERCENTILES, percentiles)},
+        "histograma": [
+            {"de": _cents(edges[index]), "ate": _cents(edges[index + 1]), "vendas": count}
+            for index, count in enumerate(counts)
+        ],
+    }
+
+
+class AnalyticsCache:
+    """LRU of serialized responses, each valid for the data versions it
+    was computed at"""
+
+    def __init__(self, size: int = ANALYTICS_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, Tuple[str, bytes]]" = OrderedDict()
+
+    @staticmethod
+    def token() -> str:
+        # Taken before querying, so a concurrent write can only make an
+        # entry look older than its data, never newer
+        return versions.etag(TABLES)
+
+    def get(self, key: tuple, token: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != token:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: tuple, token: str, body: bytes):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (token, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = AnalyticsCache()
@@ -0,0 +1,275 @@
+"""Closed seasons in their own SQLite files.
+
+archive_season() moves a closed season's sales (with their items) and
+balance transactions out of the main database into ARCHIVE_DIR/<name>.db
+and registers it in season_archives. The main file only keeps the current
+season, so backups, summaries rebuilds and unindexed scans stay small.
+
+Every pooled connection keeps the registered archives ATTACHed as
+`season_<id>` (database.attach_archives). History queries get their
+entities from history() and balance_history(): when the requested date
+range reaches an archived season, these are the ORM models aliased over a
+UNION ALL of the main table and the archives' copies (same columns), so
+callers keep writing ordinary queries; otherwise the plain models, at no
+extra cost.
+
+Archived rows are history: they can be read but not voided or edited.
+"""
+import logging
+import os
+import re
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Column, Index, MetaData, Table, create_engine, delete, func, insert, select, union_all
+from sqlalchemy.orm import Session, aliased
+
+import models
+from database import ARCHIVE_DIR, SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+# Moved to the archive, in copy order
+ARCHIVED_MODELS = (models.Sale, models.SaleItem, models.BalanceTransaction)
+
+# SQLite attaches at most 10 databases to a connection (SQLITE_MAX_ATTACHED)
+MAX_ARCHIVES = 10
+
+# Rows copied to the archive file at a time
+ARCHIVE_CHUNK_SIZE = int(os.getenv("ARCHIVE_CHUNK_SIZE", "20000"))
+
+NAME_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,100}")
+
+# Indexes of the archive copies (the hot tables' foreign keys are left out:
+# usuarios and produtos stay in the main file)
+ARCHIVE_INDEXES = {
+    "sales": [("created_at",), ("usuario_id",)],
+    "sale_items": [("sale_id",), ("produto_id",)],
+    "balance_transactions": [("usuario_id", "created_at")],
+}
+
+_tables: Dict[Tuple[str, Optional[str]], Table] = {}
+
+
+def archive_table(model, schema: Optional[str] = None) -> Table:
+    """`model`'s table as stored in an archive (attached as `schema`)"""
+    key = (model.__tablename__, schema)
+    if key not in _tables:
+        metadata = MetaData(schema=schema)
+        table = Table(
+            model.__tablename__, metadata,
+            *[
+                Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+                for column in model.__table__.columns
+            ],
+        )
+        for columns in ARCHIVE_INDEXES.get(model.__tablename__, ()):
+            Index(f"ix_{model.__tablename__}_{'_'.join(columns)}", *[table.c[name] for name in columns])
+        _tables[key] = table
+    return _tables[key]
+
+
+def attached(db: Session) -> List[Tuple[str, date, date]]:
+    """(schema, date_from, date_to) of the archives attached to the
+    session's connection, oldest first"""
+    info = db.connection().connection.info
+    return [
+        (schema, date.fromisoformat(date_from), date.fromisoformat(date_to))
+        for schema, date_from, date_to in info.get("season_archives", ())
+    ]
+
+
+def _needed(db: Session, date_from: Optional[date], date_to: Optional[date]) -> List[str]:
+    return [
+        schema
+        for schema, archive_from, archive_to in attached(db)
+        if (date_from is None or archive_to >= date_from) and (date_to is None or archive_from <= date_to)
+    ]
+
+
+def _union(model, schemas: List[str]):
+    if not schemas:
+        return model
+    columns = [column.name for column in model.__table__.columns]
+    selects = [select(model.__table__)] + [
+        select(*[archive_table(model, schema).c[name] for name in columns]) for schema in schemas
+    ]
+    name = f"{model.__tablename__}_history"
+    return aliased(model, union_all(*selects).subquery(name), name=name, adapt_on_names=True)
+
+
+def history(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    """(Sale, SaleItem) entities covering sales from `date_from` to
+    `date_to` (UTC days, inclusive; None for unbounded)"""
+    schemas = _needed(db, date_from, date_to)
+    return _union(models.Sale, schemas), _union(models.SaleItem, schemas)
+
+
+def balance_history(db: Session, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    """BalanceTransaction entity covering `date_from` to `date_to`"""
+    return _union(models.BalanceTransaction, _needed(db, date_from, date_to))
+
+
+def is_archived_sale(db: Session, sale_id: int) -> bool:
+    for schema, _, _ in attached(db):
+        sales = archive_table(models.Sale, schema)
+        if db.scalar(select(sales.c.id).where(sales.c.id == sale_id)) is not None:
+            return True
+    return False
+
+
+def _moved(model, cutoff: datetime):
+    """WHERE clause of the rows of `model` that belong to the season"""
+    if model is models.SaleItem:
+        return models.SaleItem.sale_id.in_(select(models.Sale.id).where(models.Sale.created_at < cutoff))
+    return model.created_at < cutoff
+
+
+def _fingerprint(connection, cutoff: datetime) -> dict:
+    """What would be moved, to detect changes (a void, a late insert)
+    between copying and deleting"""
+    fingerprint = {}
+    for model in ARCHIVED_MODELS:
+        count, max_id = connection.execute(
+            select(func.count(), func.max(model.id)).where(_moved(model, cutoff))
+        ).one()
+        fingerprint[model.__tablename__] = {
+            "rows": count,
+            "max_id": max_id,
+            "newest_id": connection.scalar(select(func.max(model.id))),
+        }
+    fingerprint["sales"]["voided"] = connection.scalar(
+        select(func.count(models.Sale.voided_at)).where(_moved(models.Sale, cutoff))
+    )
+    fingerprint["date_from"] = min(
+        (value for value in (
+            connection.scalar(select(func.min(models.Sale.created_at)).where(_moved(models.Sale, cutoff))),
+            connection.scalar(select(func.min(models.BalanceTransaction.created_at)).where(_moved(models.BalanceTransaction, cutoff))),
+        ) if value is not None),
+        default=None,
+    )
+    return fingerprint
+
+
+def archive_season(name: str, until: date, chunk_size: int = ARCHIVE_CHUNK_SIZE) -> dict:
+    """Move everything up to `until` (inclusive, UTC) into ARCHIVE_DIR/<name>.db.
+
+    Seasons are archived in order and only once closed (`until` before
+    today). Rows are copied to the new file from a read snapshot first,
+    without blocking checkout; then, holding the write lock, the command
+    checks nothing in the season changed meanwhile, deletes the rows and
+    registers the archive in one transaction. An interrupted run leaves at
+    most an unregistered file, which the next run replaces.
+    """
+    if not NAME_PATTERN.fullmatch(name):
+        raise ValueError("season name may only contain letters, digits, '-' and '_'")
+    if until >= datetime.utcnow().date():
+        raise ValueError("only closed seasons can be archived (until must be before today)")
+
+    db = SessionLocal()
+    try:
+        registered = db.query(models.SeasonArchive).order_by(models.SeasonArchive.date_to).all()
+    finally:
+        db.close()
+    if any(archive.name == name for archive in registered):
+        raise ValueError(f"season {name} is already archived")
+    if len(registered) >= MAX_ARCHIVES:
+        raise ValueError(f"at most {MAX_ARCHIVES} seasons can be archived (SQLite's ATTACH limit)")
+    if registered and until <= registered[-1].date_to:
+        raise ValueError(f"season {registered[-1].name} already covers up to {registered[-1].date_to}")
+
+    cutoff = datetime.combine(until + timedelta(days=1), time.min)
+    directory = Path(ARCHIVE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    filename = f"{name}.db"
+    path = directory / filename
+    if path.exists():
+        logger.warning("replacing %s, left over by an interrupted archive run", path)
+        path.unlink()
+
+    try:
+        fingerprint = _copy(path, cutoff, chunk_size)
+        _move(cutoff, fingerprint, name, filename, until)
+    except BaseException:
+        if path.exists():
+            path.unlink()
+        raise
+
+    return {
+        "name": name,
+        "filename": filename,
+        "date_from": fingerprint["date_from"].date(),
+        "date_to": until,
+        **{model.__tablename__: fingerprint[model.__tablename__]["rows"] for model in ARCHIVED_MODELS},
+        "bytes": path.stat().st_size,
+    }
+
+
+def _copy(path: Path, cutoff: datetime, chunk_size: int) -> dict:
+    archive_engine = create_engine(f"sqlite:///{path}")
+    try:
+        with engine.connect() as connection, archive_engine.begin() as archive:
+            # pysqlite only opens a transaction before writes; open one by
+            # hand so the copy and its fingerprint see the same snapshot
+            connection.exec_driver_sql("BEGIN")
+            try:
+                fingerprint = _fingerprint(connection, cutoff)
+                if not fingerprint["sales"]["rows"] and not fingerprint["balance_transactions"]["rows"]:
+                    raise ValueError(f"nothing to archive before {cutoff.date()}")
+                for model in ARCHIVED_MODELS:
+                    moved = fingerprint[model.__tablename__]
+                    if moved["rows"] and moved["max_id"] == moved["newest_id"]:
+                        # SQLite hands out max(id) + 1: with the newest row
+                        # gone its id would be reused and clash with the archive
+                        raise ValueError(
+                            f"the newest {model.__tablename__} row is in the season; archive once the next season has started"
+                        )
+
+                for model in ARCHIVED_MODELS:
+                    table = archive_table(model)
+                    table.create(archive)
+                    result = connection.execute(
+                        select(model.__table__).where(_moved(model, cutoff)).order_by(model.id)
+                        .execution_options(yield_per=chunk_size)
+                    )
+                    for chunk in result.partitions():
+                        archive.execute(insert(table), [row._asdict() for row in chunk])
+            finally:
+                connection.rollback()
+    finally:
+        archive_engine.dispose()
+    return fingerprint
+
+
+def _move(cutoff: datetime, fingerprint: dict, name: str, filename: str, until: date):
+    with engine.connect() as connection:
+        # Block writers until the rows are gone, so no void slips in
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            if _fingerprint(connection, cutoff) != fingerprint:
+                raise ValueError("the season changed while it was being copied (a void?); run the command again")
+            # Items first, while their sales still select them
+            for model in (models.SaleItem, models.Sale, models.BalanceTransaction):
+                connection.execute(delete(model.__table__).where(_moved(model, cutoff)))
+            connection.execute(insert(models.SeasonArchive.__table__).values(
+                name=name,
+                filename=filename,
+                date_from=fingerprint["date_from"].date(),
+                date_to=until,
+                sales=fingerprint["sales"]["rows"],
+                sale_items=fingerprint["sale_items"]["rows"],
+                balance_transactions=fingerprint["balance_transactions"]["rows"],
+                created_at=datetime.utcnow(),
+            ))
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+
+
+def vacuum():
+    """Give the space freed by archiving back to the filesystem (needs the
+    database to itself for a moment)"""
+    with engine.connect() as connection:
+        connection.exec_driver_sql("VACUUM")
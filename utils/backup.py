@@ -1,10 +1,18 @@
 import os
 import shutil
+import sqlite3
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict
 import gzip
 
+from database import ARCHIVE_DIR
+
+# Bookkeeping rather than data: the schema revision (an empty table makes
+# the next start re-run every migration) and the shared ETag counters
+# (clearing bumps them to a new epoch instead)
+KEPT_TABLES = ("alembic_version", "data_versions")
+
 
 class BackupManager:
     def __init__(self, backup_dir: str = None):
@@ -37,8 +45,10 @@ class BackupManager:
             if not self.db_path.exists():
                 raise Exception(f"Database file not found: {self.db_path}")
 
-            # Copy the database file
-            shutil.copy2(self.db_path, backup_path)
+            # Copy through SQLite's online backup API: the database runs in WAL
+            # mode, so recent commits may still live in the -wal file and a
+            # plain file copy would miss them
+            self._copy_database(self.db_path, backup_path)
 
             # Compress the backup
             compressed_filename = f"{backup_filename}.gz"
@@ -71,6 +81,16 @@ class BackupManager:
                 "message": f"Backup failed: {str(e)}"
             }
 
+    @staticmethod
+    def _copy_database(source_path: Path, target_path: Path):
+        source = sqlite3.connect(str(source_path))
+        target = sqlite3.connect(str(target_path))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
     def list_backups(self) -> List[Dict[str, any]]:
         """List all available backups"""
         backups = []
@@ -132,8 +152,9 @@ class BackupManager:
                 with open(temp_db_path, "wb") as f_out:
                     shutil.copyfileobj(f_in, f_out)
 
-            # Replace the current database with the backup
-            shutil.copy2(temp_db_path, self.db_path)
+            # Replace the current database contents with the backup (page by
+            # page under SQLite's locks, so open connections stay valid)
+            self._copy_database(temp_db_path, self.db_path)
 
             # Clean up decompressed file
             if temp_db_path and temp_db_path.exists():
@@ -153,11 +174,21 @@ class BackupManager:
                 "message": f"Restore failed: {str(e)}"
             }
 
+    def _set_aside_archives(self, filenames: List[str]):
+        """Move cleared season archives to ARCHIVE_DIR/cleared_<timestamp>/"""
+        if not filenames:
+            return None
+        target = Path(ARCHIVE_DIR) / f"cleared_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        target.mkdir(parents=True, exist_ok=True)
+        for filename in filenames:
+            path = Path(ARCHIVE_DIR) / filename
+            if path.exists():
+                shutil.move(str(path), str(target / filename))
+        return target
+
     def clear_database(self) -> Dict[str, any]:
         """Clear all data from database tables (keep structure)"""
         try:
-            import sqlite3
-
             if not self.db_path.exists():
                 return {
                     "success": False,
@@ -170,7 +201,15 @@ class BackupManager:
 
             # Get list of tables
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-            tables = [row[0] for row in cursor.fetchall()]
+            tables = [row[0] for row in cursor.fetchall() if row[0] not in KEPT_TABLES]
+
+            # Archived seasons are history of the usuarios being deleted, and
+            # their sale ids would clash with the new ones: they are cleared
+            # too, their files set aside rather than deleted
+            archives = []
+            if "season_archives" in tables:
+                cursor.execute("SELECT filename FROM season_archives")
+                archives = [row[0] for row in cursor.fetchall()]
 
             if not tables:
                 conn.close()
@@ -190,10 +229,15 @@ class BackupManager:
             conn.commit()
             conn.close()
 
+            set_aside = self._set_aside_archives(archives)
+
+            message = f"Database cleared successfully. {len(tables)} tables emptied."
+            if set_aside:
+                message += f" {len(archives)} season archives moved to {set_aside}."
             return {
                 "success": True,
                 "tables_cleared": len(tables),
-                "message": f"Database cleared successfully. {len(tables)} tables emptied."
+                "message": message
             }
 
         except Exception as e:
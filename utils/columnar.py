@@ -0,0 +1,307 @@
+"""Columnar snapshots of the sales history for offline analysis.
+
+export() writes `usuarios`, `produtos`, `sales` and `sale_items` as one
+NumPy `.npy` file per column (`<table>/<column>.npy`), read through
+`yield_per` cursors and written chunk by chunk into preallocated files, so
+memory stays bounded by the chunk size whatever the table size. All four
+tables are read in a single transaction, so they are consistent with each
+other. `sales` and `sale_items` include the seasons moved to the attached
+archives (utils.archive), oldest first, so the export covers the whole
+history.
+
+Column encodings:
+- integers (ids, quantities, `*_cents` money) are int64;
+- timestamps are datetime64[us] (UTC), NULL as NaT;
+- strings are int32 codes into one dictionary shared by every string
+  column (`strings.utf8` plus `strings.offsets.npy`), NULL as -1;
+- nullable integers get a `<column>.valid.npy` mask next to them.
+
+load() memory-maps everything back: nothing is read until it is used.
+"""
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy
+from numpy.lib.format import open_memmap
+from sqlalchemy import DateTime, Integer, String, Text, func, select
+
+import models
+from database import read_engine
+from utils import archive
+
+FORMAT_VERSION = 1
+
+# Exported tables, in the order they are written
+TABLES = {
+    "usuarios": models.Usuario,
+    "produtos": models.Produto,
+    "sales": models.Sale,
+    "sale_items": models.SaleItem,
+}
+
+# Rows fetched from the database (and written to disk) at a time
+CHUNK_SIZE = int(os.getenv("COLUMNAR_CHUNK_SIZE", "50000"))
+
+NULL_CODE = -1
+MANIFEST = "manifest.json"
+STRINGS = "strings.utf8"
+STRING_OFFSETS = "strings.offsets.npy"
+
+
+def _kind(column) -> str:
+    if isinstance(column.type, DateTime):
+        return "datetime"
+    if isinstance(column.type, (String, Text)):
+        return "string"
+    if isinstance(column.type, Integer):
+        return "int"
+    raise TypeError(f"{column.table.name}.{column.name}: no columnar encoding for {column.type}")
+
+
+_DTYPES = {"int": "int64", "datetime": "datetime64[us]", "string": "int32"}
+
+
+class _StringDictionary:
+    """Codes for distinct strings, in first-seen order; the text goes to a
+    single UTF-8 file as it is seen"""
+
+    def __init__(self, path: Path):
+        self._codes: Dict[str, int] = {}
+        self._offsets: List[int] = [0]
+        self._file = open(path, "wb")
+
+    def encode(self, values: Iterable[Optional[str]]) -> numpy.ndarray:
+        codes = self._codes
+        encoded = []
+        for value in values:
+            if value is None:
+                encoded.append(NULL_CODE)
+                continue
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(codes)
+                data = value.encode()
+                self._file.write(data)
+                self._offsets.append(self._offsets[-1] + len(data))
+            encoded.append(code)
+        return numpy.asarray(encoded, dtype=numpy.int32)
+
+    def close(self, offsets_path: Path) -> int:
+        self._file.close()
+        numpy.save(offsets_path, numpy.asarray(self._offsets, dtype=numpy.int64))
+        return len(self._codes)
+
+
+def _encode(kind: str, values: List, strings: _StringDictionary) -> numpy.ndarray:
+    if kind == "string":
+        return strings.encode(values)
+    if kind == "datetime":
+        # None becomes NaT
+        return numpy.array(values, dtype="datetime64[us]")
+    return numpy.array([0 if value is None else value for value in values], dtype=numpy.int64)
+
+
+def export(directory: str, chunk_size: int = CHUNK_SIZE, engine=read_engine) -> dict:
+    """Write a snapshot to `directory` (which must not exist yet) and
+    return its manifest.
+
+    The snapshot is assembled in `<directory>.partial` and renamed when
+    complete, so a half-written export is never mistaken for a good one.
+    """
+    target = Path(directory)
+    if target.exists():
+        raise FileExistsError(f"{target} already exists")
+    partial = target.with_name(target.name + ".partial")
+    if partial.exists():
+        shutil.rmtree(partial)
+    partial.mkdir(parents=True)
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "exported_at": datetime.utcnow().isoformat(),
+        "tables": {},
+    }
+    strings = _StringDictionary(partial / STRINGS)
+    with engine.connect() as connection:
+        # pysqlite only opens a transaction before writes; open one by hand
+        # so every table (and its row count) comes from the same snapshot
+        if engine.dialect.name == "sqlite":
+            connection.exec_driver_sql("BEGIN")
+        try:
+            for name, model in TABLES.items():
+                manifest["tables"][name] = _export_table(connection, model, partial / name, chunk_size, strings)
+        finally:
+            connection.rollback()
+    manifest["strings"] = strings.close(partial / STRING_OFFSETS)
+
+    with open(partial / MANIFEST, "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(partial, target)
+    return manifest
+
+
+def _sources(connection, model) -> list:
+    """`model`'s table copies in the attached season archives, oldest
+    first, then its table in the main file: ids ascend across them"""
+    if model not in archive.ARCHIVED_MODELS:
+        return [model.__table__]
+    schemas = [schema for schema, _, _ in connection.connection.info.get("season_archives", ())]
+    return [archive.archive_table(model, schema) for schema in schemas] + [model.__table__]
+
+
+def _export_table(connection, model, directory: Path, chunk_size: int, strings: _StringDictionary) -> dict:
+    directory.mkdir()
+    columns = list(model.__table__.columns)
+    kinds = [_kind(column) for column in columns]
+    sources = _sources(connection, model)
+    rows = sum(connection.scalar(select(func.count()).select_from(table)) for table in sources)
+
+    arrays = [
+        open_memmap(directory / f"{column.name}.npy", mode="w+", dtype=_DTYPES[kind], shape=(rows,))
+        for column, kind in zip(columns, kinds)
+    ]
+    # Validity masks for nullable integers; NULL strings and timestamps
+    # have their own sentinel (-1, NaT)
+    masks = {
+        index: open_memmap(directory / f"{column.name}.valid.npy", mode="w+", dtype=numpy.bool_, shape=(rows,))
+        for index, (column, kind) in enumerate(zip(columns, kinds))
+        if kind == "int" and column.nullable and not column.primary_key
+    }
+
+    start = 0
+    for table in sources:
+        result = connection.execute(
+            select(*[table.c[column.name] for column in columns])
+            .order_by(*[table.c[column.name] for column in model.__table__.primary_key.columns])
+            .execution_options(yield_per=chunk_size)
+        )
+        for chunk in result.partitions():
+            end = start + len(chunk)
+            for index, (kind, values) in enumerate(zip(kinds, zip(*chunk))):
+                arrays[index][start:end] = _encode(kind, values, strings)
+                if index in masks:
+                    masks[index][start:end] = [value is not None for value in values]
+            start = end
+
+    for array in [*arrays, *masks.values()]:
+        array.flush()
+    del arrays, masks
+
+    return {
+        "rows": rows,
+        "columns": {
+            column.name: {
+                "kind": kind,
+                "dtype": _DTYPES[kind],
+                "nullable": bool(column.nullable) and not column.primary_key,
+            }
+            for column, kind in zip(columns, kinds)
+        },
+    }
+
+
+class StringTable:
+    """The shared string dictionary, memory-mapped"""
+
+    def __init__(self, directory: Path):
+        self.offsets = numpy.load(directory / STRING_OFFSETS, mmap_mode="r")
+        path = directory / STRINGS
+        # numpy can't map an empty file
+        self._data = numpy.memmap(path, dtype=numpy.uint8, mode="r") if path.stat().st_size else numpy.zeros(0, numpy.uint8)
+        self._codes: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, code: int) -> Optional[str]:
+        if code == NULL_CODE:
+            return None
+        return self._data[self.offsets[code]:self.offsets[code + 1]].tobytes().decode()
+
+    def code(self, value: str) -> int:
+        """Code of `value` (NULL_CODE if it never occurs), to filter on
+        codes instead of decoding a whole column"""
+        if self._codes is None:
+            self._codes = {self[code]: code for code in range(len(self))}
+        return self._codes.get(value, NULL_CODE)
+
+    def decode(self, codes: numpy.ndarray) -> numpy.ndarray:
+        """Object array of the strings behind `codes` (None for NULL)"""
+        unique, inverse = numpy.unique(codes, return_inverse=True)
+        values = numpy.array([self[int(code)] for code in unique] + [None], dtype=object)[:-1]
+        return values[inverse.reshape(numpy.shape(codes))]
+
+
+class ColumnarTable:
+    def __init__(self, directory: Path, info: dict, strings: StringTable):
+        self.rows = info["rows"]
+        self.kinds = {name: column["kind"] for name, column in info["columns"].items()}
+        self.strings = strings
+        self._directory = directory
+        self._columns: Dict[str, numpy.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.kinds)
+
+    def __getitem__(self, name: str) -> numpy.ndarray:
+        """The column as stored (string columns as codes)"""
+        if name not in self.kinds:
+            raise KeyError(name)
+        if name not in self._columns:
+            self._columns[name] = self._load(f"{name}.npy")
+        return self._columns[name]
+
+    def valid(self, name: str) -> numpy.ndarray:
+        """False where the column is NULL"""
+        kind = self.kinds[name]
+        if kind == "string":
+            return self[name] != NULL_CODE
+        if kind == "datetime":
+            return ~numpy.isnat(self[name])
+        path = self._directory / f"{name}.valid.npy"
+        return self._load(path.name) if path.exists() else numpy.ones(self.rows, dtype=numpy.bool_)
+
+    def text(self, name: str) -> numpy.ndarray:
+        """A string column decoded to Python strings"""
+        return self.strings.decode(self[name])
+
+    def _load(self, filename: str) -> numpy.ndarray:
+        # numpy can't map an empty file either
+        return numpy.load(self._directory / filename, mmap_mode="r" if self.rows else None)
+
+
+class ColumnarSnapshot:
+    def __init__(self, directory: Path, manifest: dict):
+        self.directory = directory
+        self.manifest = manifest
+        self.strings = StringTable(directory)
+        self.tables = {
+            name: ColumnarTable(directory / name, info, self.strings)
+            for name, info in manifest["tables"].items()
+        }
+
+    def __getitem__(self, table: str) -> ColumnarTable:
+        return self.tables[table]
+
+
+def load(directory: str) -> ColumnarSnapshot:
+    """Open an export; columns are memory-mapped on first access.
+
+        snapshot = columnar.load("exports/2026")
+        sales = snapshot["sales"]
+        live = numpy.isnat(sales["voided_at"])
+        revenue_cents = sales["total_amount_cents"][live].sum()
+    """
+    path = Path(directory)
+    with open(path / MANIFEST) as file:
+        manifest = json.load(file)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{path}: unsupported export format {manifest.get('format')}")
+    return ColumnarSnapshot(path, manifest)
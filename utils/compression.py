@@ -0,0 +1,148 @@
+"""Negotiated gzip/brotli compression for response bodies.
+
+Only bodies sent in a single ASGI message (JSON responses) are compressed;
+streamed ones (server-sent events, backup downloads) pass through as-is so
+events are never held back in a compressor buffer.
+"""
+import gzip
+import os
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed (bytes)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# Tuned for per-request compression of dynamic JSON, not for archives
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+# Bodies at least this large are compressed off the event loop (zlib and
+# brotli release the GIL)
+THREADPOOL_MIN_SIZE = 64 * 1024
+
+SKIPPED_MEDIA_TYPES = (b"text/event-stream", b"application/zip", b"application/gzip", b"image/")
+
+
+def _compress(encoding: str, body: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Best of br/gzip the client accepts, honouring q-values"""
+    best, best_q = None, 0.0
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding == "*":
+            candidates = ["br", "gzip"]
+        elif coding in ("br", "gzip"):
+            candidates = [coding]
+        else:
+            continue
+        for candidate in candidates:
+            if candidate == "br" and brotli is None:
+                continue
+            # On ties prefer brotli, it is smaller at similar CPU cost
+            if q > best_q or (q == best_q and q > 0 and candidate == "br"):
+                best, best_q = candidate, q
+    return best
+
+
+def _weaken(etag: bytes) -> bytes:
+    # A compressed body is a different byte sequence than the one the strong
+    # ETag names; If-None-Match compares weakly, so 304s keep working
+    return etag if etag.startswith(b"W/") else b"W/" + etag
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware compressing single-message response bodies"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = b""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value
+                break
+        encoding = negotiate(accept_encoding.decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            headers = list(start.get("headers", []))
+            body = message.get("body", b"")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or not self._compressible(headers)
+            ):
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= THREADPOOL_MIN_SIZE:
+                compressed = await run_in_threadpool(_compress, encoding, body)
+            else:
+                compressed = _compress(encoding, body)
+            rewritten, vary = [], b"Accept-Encoding"
+            for name, value in headers:
+                if name == b"content-length":
+                    continue
+                if name == b"vary":
+                    vary = value + b", " + vary
+                    continue
+                if name == b"etag":
+                    value = _weaken(value)
+                rewritten.append((name, value))
+            rewritten += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", vary),
+            ]
+            await send({**start, "headers": rewritten})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _compressible(headers) -> bool:
+        for name, value in headers:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type" and value.startswith(SKIPPED_MEDIA_TYPES):
+                return False
+        return True
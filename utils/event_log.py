@@ -0,0 +1,287 @@
+"""Append-only ledger of every change to saldo and estoque.
+
+Endpoints stage events on their session with record(); when the transaction
+commits they are handed to a background writer, which appends them to
+segmented NDJSON files (`events-<first seq>.ndjson` in EVENT_LOG_DIR) and
+fsyncs once per batch, so a busy checkout pays for one disk flush per batch
+instead of one per sale. Rolled back transactions never reach the log.
+
+Events are deltas (`balance.credit`/`balance.debit`, `stock.sale`/
+`stock.restock`) or absolute values from direct edits and creations
+(`balance.set`, `stock.set`). A `reset` followed by a `.set` for every row
+is written as a baseline when the log is empty and after the database is
+restored or cleared. replay() folds the log back into balances and stock,
+which `python replay_events.py` diffs against the database.
+
+With several worker processes (WORKERS > 1) each worker appends to a
+stream of its own, EVENT_LOG_DIR/worker-<pid>/, and read_events() merges
+the streams by timestamp. Deltas add up in any order; only a `.set` racing
+a delta on the same row in another worker could be replayed out of order.
+"""
+import heapq
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Where segments are written ("" disables the log)
+EVENT_LOG_DIR = os.getenv("EVENT_LOG_DIR", "event_log")
+# A new segment is started once the current one reaches this size (MB)
+EVENT_LOG_SEGMENT_MB = float(os.getenv("EVENT_LOG_SEGMENT_MB", "64"))
+# How long the writer waits for more events before flushing a batch (ms)
+EVENT_LOG_FLUSH_MS = float(os.getenv("EVENT_LOG_FLUSH_MS", "5"))
+# Most transactions written per batch
+EVENT_LOG_BATCH_SIZE = int(os.getenv("EVENT_LOG_BATCH_SIZE", "1000"))
+
+SEGMENT_PREFIX = "events-"
+SEGMENT_SUFFIX = ".ndjson"
+# Per-worker streams, next to the segments written by a single process
+STREAM_PREFIX = "worker-"
+
+_STOP = object()
+
+
+def record(session: Session, event_type: str, **fields):
+    """Stage an event; it is logged only if `session` commits.
+
+    Works with sync and async sessions (AsyncSession.info is the
+    underlying session's).
+    """
+    session.info.setdefault("event_log", []).append(
+        {"type": event_type, "ts": datetime.utcnow().isoformat(), **fields}
+    )
+
+
+@event.listens_for(Session, "after_commit")
+def _append_committed_events(session):
+    events = session.info.pop("event_log", None)
+    if events:
+        log.append(events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_events(session):
+    # Not for a rolled back SAVEPOINT: the outer transaction may still commit
+    # (whoever rolls back a savepoint drops the events staged inside it)
+    if not session.in_nested_transaction():
+        session.info.pop("event_log", None)
+
+
+def _segments(directory: Path) -> List[Path]:
+    # Zero-padded first seq in the name, so name order is log order
+    return sorted(directory.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"))
+
+
+def _segment_name(first_seq: int) -> str:
+    return f"{SEGMENT_PREFIX}{first_seq:012d}{SEGMENT_SUFFIX}"
+
+
+class EventLogWriter:
+    """Single background thread appending batches of committed events"""
+
+    def __init__(
+        self,
+        directory: str = EVENT_LOG_DIR,
+        segment_bytes: int = int(EVENT_LOG_SEGMENT_MB * 1024 * 1024),
+        flush_seconds: float = EVENT_LOG_FLUSH_MS / 1000,
+        batch_size: int = EVENT_LOG_BATCH_SIZE,
+    ):
+        self.directory = Path(directory) if directory else None
+        self._stream: Optional[Path] = None
+        self.segment_bytes = segment_bytes
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._last_seq = 0
+        self.batches_written = 0
+        self.events_written = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    def start(self, stream: Optional[str] = None) -> bool:
+        """Open the newest segment and start the writer; returns True when
+        the log was empty (and needs a baseline snapshot). `stream` names
+        a subdirectory to write to instead (one per worker process)."""
+        if self.directory is None or self.running:
+            return False
+        self._stream = self.directory / stream if stream else self.directory
+        self._stream.mkdir(parents=True, exist_ok=True)
+        self._last_seq = 0
+        segments = _segments(self._stream)
+        if segments:
+            self._last_seq = self._recover(segments[-1])
+            self._file = open(segments[-1], "ab")
+        self._thread = threading.Thread(target=self._run, name="event-log-writer", daemon=True)
+        self._thread.start()
+        return self._last_seq == 0
+
+    def stop(self):
+        """Write everything queued, then stop the writer"""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def append(self, events: List[dict]):
+        """Queue one transaction's events; they are written together"""
+        if self.running:
+            self._queue.put(events)
+
+    def flush(self):
+        """Block until everything queued so far is on disk"""
+        if self.running:
+            self._queue.join()
+
+    @staticmethod
+    def _recover(segment: Path) -> int:
+        """Last seq in `segment`, cutting off a line torn by a crash"""
+        with open(segment, "rb+") as file:
+            data = file.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                logger.warning("event log: truncating %d torn bytes at the end of %s", len(data) - end, segment.name)
+                file.truncate(end)
+        last_line = data[:end].rstrip(b"\n").rsplit(b"\n", 1)[-1]
+        if not last_line:
+            first_seq = int(segment.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            return first_seq - 1
+        return json.loads(last_line)["seq"]
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_seconds
+            # Group commit: whatever arrives while waiting (or while the
+            # previous fsync ran) goes out with the same flush
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+            try:
+                self._write([events for events in batch if events is not _STOP])
+            except Exception:
+                logger.exception("event log: failed to write %d transactions", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: List[List[dict]]):
+        if not batch:
+            return
+        if self._file is None or self._file.tell() >= self.segment_bytes:
+            if self._file is not None:
+                self._file.close()
+            self._file = open(self._stream / _segment_name(self._last_seq + 1), "ab")
+
+        lines = []
+        seq = self._last_seq
+        for events in batch:
+            for event_data in events:
+                seq += 1
+                lines.append(json.dumps({"seq": seq, **event_data}, separators=(",", ":")))
+        self._file.write(("\n".join(lines) + "\n").encode())
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_seq = seq
+        self.batches_written += 1
+        self.events_written += len(lines)
+
+
+log = EventLogWriter()
+
+
+def snapshot():
+    """Log the current saldo and estoque of every row as a new baseline.
+
+    For writes that bypass the ORM (restoring or clearing the database,
+    bulk loads); goes straight to the writer, not through a commit.
+    """
+    now = datetime.utcnow().isoformat()
+    events = [{"type": "reset", "ts": now}]
+    db = SessionLocal()
+    try:
+        for usuario_id, saldo_cents in db.execute(select(models.Usuario.id, models.Usuario.saldo_cents)):
+            events.append({"type": "balance.set", "ts": now, "usuario_id": usuario_id, "saldo_cents": saldo_cents, "ref": "snapshot"})
+        for produto_id, estoque in db.execute(select(models.Produto.id, models.Produto.estoque)):
+            events.append({"type": "stock.set", "ts": now, "produto_id": produto_id, "estoque": estoque, "ref": "snapshot"})
+    finally:
+        db.close()
+    log.append(events)
+
+
+def _read_stream(directory: Path) -> Iterator[dict]:
+    for segment in _segments(directory):
+        with open(segment, "rb") as file:
+            for line in file:
+                # A line torn by a crash has no newline yet
+                if line.endswith(b"\n"):
+                    yield json.loads(line)
+
+
+def streams(directory: str = EVENT_LOG_DIR) -> List[Path]:
+    """The log's streams: the directory itself and one per worker process"""
+    directory = Path(directory)
+    return [directory] + sorted(path for path in directory.glob(f"{STREAM_PREFIX}*") if path.is_dir())
+
+
+def read_events(directory: str = EVENT_LOG_DIR) -> Iterator[dict]:
+    """Every logged event, oldest first (streams merged by timestamp)"""
+    paths = streams(directory)
+    if len(paths) == 1:
+        yield from _read_stream(paths[0])
+        return
+    yield from heapq.merge(*(_read_stream(path) for path in paths), key=lambda event_data: event_data["ts"])
+
+
+def replay(directory: str = EVENT_LOG_DIR) -> Tuple[Dict[int, int], Dict[int, int], int]:
+    """Fold the log into ({usuario_id: saldo_cents}, {produto_id: estoque}, events read)"""
+    saldos: Dict[int, int] = {}
+    estoques: Dict[int, int] = {}
+    count = 0
+    for event_data in read_events(directory):
+        count += 1
+        event_type = event_data["type"]
+        if event_type == "reset":
+            saldos.clear()
+            estoques.clear()
+        elif event_type == "balance.set":
+            saldos[event_data["usuario_id"]] = event_data["saldo_cents"]
+        elif event_type.startswith("balance."):
+            usuario_id = event_data["usuario_id"]
+            saldos[usuario_id] = saldos.get(usuario_id, 0) + event_data["amount_cents"]
+        elif event_type == "stock.set":
+            estoques[event_data["produto_id"]] = event_data["estoque"]
+        elif event_type.startswith("stock."):
+            produto_id = event_data["produto_id"]
+            estoques[produto_id] = estoques.get(produto_id, 0) + event_data["quantity"]
+    return saldos, estoques, count
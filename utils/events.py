@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from utils.forecast import forecast
+
+# Events kept for clients reconnecting with Last-Event-ID
+EVENT_HISTORY = int(os.getenv("EVENT_HISTORY", "256"))
+# Events a slow client may fall behind before it is told to resync
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SUBSCRIBER_QUEUE_SIZE", "100"))
+
+# Comment line sent on idle streams so proxies keep the connection open
+KEEPALIVE_SECONDS = 15
+
+# Sent when a client missed events; it should refetch the dashboard once
+RESYNC = "resync"
+
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop, size: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+
+    def deliver(self, event: dict):
+        # Runs on the subscriber's loop. A client this far behind gets a
+        # single resync instead of an ever-growing backlog.
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            event = {"id": event["id"], "type": RESYNC, "data": {}}
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """In-process pub/sub for live dashboard updates.
+
+    Writers call publish() after their commit, from the event loop or from
+    a threadpool worker; each subscriber gets the event on its own loop.
+    A bounded history lets a reconnecting client catch up from its
+    Last-Event-ID instead of refetching everything.
+    """
+
+    def __init__(self, history: int = EVENT_HISTORY, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+
+    def publish(self, event_type: str, data: dict) -> dict:
+        with self._lock:
+            self._last_id += 1
+            event = {"id": self._last_id, "type": event_type, "data": data}
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        for subscription in subscribers:
+            if subscription.loop is running:
+                subscription.deliver(event)
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Loop already closed, the subscriber is gone
+                self.unsubscribe(subscription)
+        return event
+
+    def subscribe(self, last_event_id: Optional[int] = None):
+        """Register on the caller's loop; returns (subscription, events to send first)"""
+        subscription = Subscription(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+            if last_event_id is None or last_event_id == self._last_id:
+                return subscription, []
+            oldest = self._history[0]["id"] if self._history else self._last_id + 1
+            if last_event_id > self._last_id or last_event_id + 1 < oldest:
+                # Restarted server or a gap older than the history
+                return subscription, [{"id": self._last_id, "type": RESYNC, "data": {}}]
+            return subscription, [event for event in self._history if event["id"] > last_event_id]
+
+    def offset_ids(self, first_id: int):
+        """Number events after `first_id`. Worker processes start from
+        ranges of their own, so a client reconnecting to another worker
+        with its Last-Event-ID gets a resync instead of someone else's events."""
+        with self._lock:
+            self._last_id = max(self._last_id, first_id)
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+def sale_event(sale, usuario, produto_nomes) -> dict:
+    """Same shape as schemas.RecentSale"""
+    produtos = ", ".join(produto_nomes[:2])
+    if len(produto_nomes) > 2:
+        produtos += f" e mais {len(produto_nomes) - 2}"
+    return {
+        "id": sale.id,
+        "usuario_nome": usuario.nome,
+        "produtos": produtos,
+        "total_amount": sale.total_amount,
+        "created_at": sale.created_at,
+    }
+
+
+def stock_event(produto) -> dict:
+    data = {"id": produto.id, "nome": produto.nome, "estoque": produto.estoque}
+    # Forecast fields let the low-stock panel update itself
+    cached = forecast.get(produto.id)
+    if cached is not None:
+        data["consumo_diario"] = cached["consumo_diario"]
+        data["dias_ate_esgotar"] = cached["dias_ate_esgotar"]
+    return data
+
+
+def balance_event(usuario) -> dict:
+    return {"id": usuario.id, "nome": usuario.nome, "saldo": usuario.saldo}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return float(value)
+
+
+def format_sse(event: dict) -> str:
+    """One event in text/event-stream framing"""
+    data = json.dumps(event["data"], default=_json_default, ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+bus = EventBus()
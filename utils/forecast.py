@@ -0,0 +1,201 @@
+import bisect
+import math
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+from utils.versions import versions
+
+# A produto is "low stock" when it is at or under LOW_STOCK_THRESHOLD units,
+# or when it is forecast to run out within LOW_STOCK_DAYS days.
+LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD", "10"))
+LOW_STOCK_DAYS = float(os.getenv("LOW_STOCK_DAYS", "3"))
+
+# Days of sales history used to estimate the consumption rate
+FORECAST_WINDOW_DAYS = int(os.getenv("FORECAST_WINDOW_DAYS", "30"))
+
+
+class RestockForecast:
+    """Days-until-stockout per produto, kept sorted in memory.
+
+    The first read loads every produto with one grouped query over the
+    materialized produto_daily_sales buckets and restocks. After that,
+    writers call refresh() with the produtos they touched and only those
+    rows are recomputed and re-inserted into the sorted indexes.
+
+    Every forecast in the cache uses the same window, ending on the UTC day
+    it was loaded. Once that day is over the whole cache is rebuilt, so
+    produtos that stopped selling age out of the window too.
+    """
+
+    def __init__(self, window_days: int = FORECAST_WINDOW_DAYS):
+        self.window_days = window_days
+        self._lock = threading.Lock()
+        self._loaded = False
+        # UTC day the cached window ends on
+        self._day = None
+        self._forecasts: Dict[int, dict] = {}
+        # Sorted (key, produto_id) pairs for prefix lookups with bisect
+        self._by_urgency: List[tuple] = []
+        self._by_estoque: List[tuple] = []
+
+    def _compute(self, db: Session, today: date, produto_ids: Optional[Iterable[int]] = None) -> List[dict]:
+        since = today - timedelta(days=self.window_days - 1)
+
+        sold = db.query(
+            models.ProdutoDailySales.produto_id.label("produto_id"),
+            func.sum(models.ProdutoDailySales.quantity).label("vendidos"),
+        ).filter(models.ProdutoDailySales.day >= since)\
+            .group_by(models.ProdutoDailySales.produto_id).subquery()
+
+        restocked = db.query(
+            models.Restock.produto_id.label("produto_id"),
+            func.max(models.Restock.created_at).label("ultimo_reabastecimento"),
+        ).group_by(models.Restock.produto_id).subquery()
+
+        query = db.query(
+            models.Produto.id,
+            models.Produto.nome,
+            models.Produto.estoque,
+            models.Produto.created_at,
+            sold.c.vendidos,
+            restocked.c.ultimo_reabastecimento,
+        ).outerjoin(sold, sold.c.produto_id == models.Produto.id)\
+            .outerjoin(restocked, restocked.c.produto_id == models.Produto.id)
+
+        if produto_ids is not None:
+            query = query.filter(models.Produto.id.in_(list(produto_ids)))
+
+        forecasts = []
+        for produto_id, nome, estoque, created_at, vendidos, ultimo_reabastecimento in query.all():
+            # Produtos newer than the window are averaged over their own lifetime
+            first_day = max(since, created_at.date()) if created_at else since
+            days_observed = max((today - first_day).days + 1, 1)
+            consumo_diario = (vendidos or 0) / days_observed
+            estoque = estoque or 0
+
+            if estoque <= 0:
+                dias_ate_esgotar = 0.0
+            elif consumo_diario > 0:
+                dias_ate_esgotar = round(estoque / consumo_diario, 1)
+            else:
+                dias_ate_esgotar = None
+
+            forecasts.append({
+                "id": produto_id,
+                "nome": nome,
+                "estoque": estoque,
+                "consumo_diario": round(consumo_diario, 2),
+                "dias_ate_esgotar": dias_ate_esgotar,
+                "ultimo_reabastecimento": ultimo_reabastecimento,
+            })
+        return forecasts
+
+    @staticmethod
+    def _urgency_key(forecast: dict) -> tuple:
+        days = forecast["dias_ate_esgotar"]
+        return (math.inf if days is None else days, forecast["estoque"], forecast["id"])
+
+    def _remove(self, produto_id: int):
+        forecast = self._forecasts.pop(produto_id, None)
+        if forecast is None:
+            return
+        for index, key in (
+            (self._by_urgency, self._urgency_key(forecast)),
+            (self._by_estoque, (forecast["estoque"], produto_id)),
+        ):
+            position = bisect.bisect_left(index, (key, produto_id))
+            if position < len(index) and index[position] == (key, produto_id):
+                del index[position]
+
+    def _insert(self, forecast: dict):
+        produto_id = forecast["id"]
+        self._forecasts[produto_id] = forecast
+        bisect.insort(self._by_urgency, (self._urgency_key(forecast), produto_id))
+        bisect.insort(self._by_estoque, ((forecast["estoque"], produto_id), produto_id))
+
+    def _expire_day(self) -> date:
+        """Today (UTC); drops the cache if it was loaded on an earlier day"""
+        today = datetime.utcnow().date()
+        if self._loaded and self._day != today:
+            self.invalidate()
+        return today
+
+    def _ensure_loaded(self, db: Session):
+        today = self._expire_day()
+        if self._loaded:
+            return
+        forecasts = self._compute(db, today)
+        with self._lock:
+            if self._loaded:
+                return
+            self._forecasts = {}
+            self._by_urgency = []
+            self._by_estoque = []
+            for forecast in forecasts:
+                self._insert(forecast)
+            self._day = today
+            self._loaded = True
+
+    def refresh(self, db: Session, produto_ids: Iterable[int]):
+        """Recompute the forecast for the given produtos after a committed write"""
+        today = self._expire_day()
+        if not self._loaded:
+            return
+        produto_ids = set(produto_ids)
+        forecasts = self._compute(db, today, produto_ids)
+        with self._lock:
+            if not self._loaded or self._day != today:
+                # Invalidated meanwhile; the next read reloads everything
+                return
+            for produto_id in produto_ids:
+                self._remove(produto_id)
+            for forecast in forecasts:
+                self._insert(forecast)
+        # Writers refresh after their commit; readers between the two
+        # got the old forecast under the new table versions
+        versions.bump(["forecast"])
+
+    def invalidate(self):
+        """Drop everything; the next read reloads from the database"""
+        with self._lock:
+            self._loaded = False
+
+    def get(self, produto_id: int) -> Optional[dict]:
+        """One produto's forecast if already loaded, without touching the database"""
+        with self._lock:
+            if not self._loaded or self._day != datetime.utcnow().date():
+                return None
+            return self._forecasts.get(produto_id)
+
+    def all(self, db: Session) -> List[dict]:
+        """Every produto's forecast, most urgent first"""
+        self._ensure_loaded(db)
+        with self._lock:
+            return [self._forecasts[produto_id] for _, produto_id in self._by_urgency]
+
+    def low_stock(
+        self,
+        db: Session,
+        threshold: int = LOW_STOCK_THRESHOLD,
+        days: float = LOW_STOCK_DAYS
+    ) -> List[dict]:
+        """Produtos at or under `threshold` units or running out within `days`"""
+        self._ensure_loaded(db)
+        with self._lock:
+            by_days = bisect.bisect_right(self._by_urgency, ((days, math.inf, math.inf),))
+            by_estoque = bisect.bisect_right(self._by_estoque, ((threshold, math.inf),))
+            ids = {produto_id for _, produto_id in self._by_urgency[:by_days]}
+            ids.update(produto_id for _, produto_id in self._by_estoque[:by_estoque])
+            return sorted(
+                (self._forecasts[produto_id] for produto_id in ids),
+                key=self._urgency_key
+            )
+
+
+forecast = RestockForecast()
@@ -0,0 +1,186 @@
+"""Opt-in group commit for checkout bursts.
+
+Every create_sale normally commits on its own, and on SQLite each commit is
+an fsync: at the lunch rush that is the throughput ceiling. With
+CHECKOUT_GROUP_COMMIT=1, sales are handed to a single writer thread that
+applies whatever has queued up in one transaction and commits once.
+
+Each submitted unit of work runs inside its own SAVEPOINT, so a sale that
+fails validation (insufficient stock, unknown produto, a clashing
+Idempotency-Key) is rolled back alone and only its request gets the error.
+The others wait for the shared commit and then get their own results.
+"""
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import Session
+
+from database import DATABASE_URL, attach_archives
+
+logger = logging.getLogger(__name__)
+
+# Off by default: a single sale pays a little extra latency for the handoff
+CHECKOUT_GROUP_COMMIT = os.getenv("CHECKOUT_GROUP_COMMIT", "0") == "1"
+# Most sales applied in one transaction
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+# How long the writer waits for more sales after the first one (ms)
+GROUP_COMMIT_WAIT_MS = float(os.getenv("GROUP_COMMIT_WAIT_MS", "1"))
+
+_STOP = object()
+
+
+def _writer_engine():
+    if not DATABASE_URL.startswith("sqlite"):
+        return create_engine(DATABASE_URL)
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+    # pysqlite opens transactions lazily and would let the first SAVEPOINT
+    # start (and its RELEASE commit) the transaction. Take over BEGIN, and
+    # take the write lock up front so the batch never waits to upgrade it.
+    @event.listens_for(engine, "connect")
+    def _manual_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin_immediate(connection):
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    # Summaries rebuilt inside a batch read archived seasons too
+    attach_archives(engine)
+    return engine
+
+
+class _Job:
+    __slots__ = ("work", "loop", "future")
+
+    def __init__(self, work: Callable[[Session], Any], loop: asyncio.AbstractEventLoop):
+        self.work = work
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def resolve(self, result: Any = None, error: Optional[BaseException] = None):
+        self.loop.call_soon_threadsafe(self._set, result, error)
+
+    def _set(self, result, error):
+        if self.future.done():
+            # The request was cancelled (client went away)
+            return
+        if error is not None:
+            self.future.set_exception(error)
+        else:
+            self.future.set_result(result)
+
+
+class GroupCommitWriter:
+    """Single writer thread applying queued work in shared transactions"""
+
+    def __init__(self, max_batch: int = GROUP_COMMIT_MAX_BATCH, wait_seconds: float = GROUP_COMMIT_WAIT_MS / 1000):
+        self.max_batch = max_batch
+        self.wait_seconds = wait_seconds
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._engine = None
+        self.batches = 0
+        self.jobs = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self.running:
+            return
+        if self._engine is None:
+            self._engine = _writer_engine()
+        self._thread = threading.Thread(target=self._run, name="group-commit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Apply everything queued, then stop the writer"""
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    async def submit(self, work: Callable[[Session], Any]) -> Any:
+        """Run `work(session)` in the next batch and return its result once
+        the batch has committed; its exception if it (or the commit) failed.
+
+        `work` must not commit. Objects it returns stay loaded but are
+        detached from the session.
+        """
+        job = _Job(work, asyncio.get_running_loop())
+        self._queue.put(job)
+        return await job.future
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.wait_seconds
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [job for job in batch if job is not _STOP]
+            if batch:
+                self._apply(batch)
+
+    def _apply(self, batch: List[_Job]):
+        session = Session(self._engine, autoflush=False, expire_on_commit=False)
+        applied = []
+        try:
+            for job in batch:
+                # Events staged for the event log by a rolled back sale must
+                # not be written with the rest of the batch
+                staged = len(session.info.get("event_log", ()))
+                try:
+                    with session.begin_nested():
+                        result = job.work(session)
+                except Exception as exc:
+                    del session.info.get("event_log", [])[staged:]
+                    job.resolve(error=exc)
+                    continue
+                applied.append((job, result))
+
+            try:
+                session.commit()
+            except Exception as exc:
+                logger.exception("group commit of %d sales failed", len(applied))
+                session.rollback()
+                for job, _ in applied:
+                    job.resolve(error=exc)
+                return
+
+            if len(applied) < len(batch):
+                # A rolled back savepoint expires what it touched, which may
+                # be rows (a usuario, a produto) other sales returned
+                try:
+                    for instance in list(session.identity_map.values()):
+                        if inspect(instance).expired_attributes:
+                            session.refresh(instance)
+                    session.commit()
+                except Exception:
+                    logger.exception("reloading rows after a failed sale")
+                    session.rollback()
+        finally:
+            session.close()
+
+        self.batches += 1
+        self.jobs += len(applied)
+        for job, result in applied:
+            job.resolve(result)
+
+
+writer = GroupCommitWriter()
@@ -0,0 +1,273 @@
+"""Idempotency-Key support for mutations that tills retry on timeouts.
+
+A request carrying `Idempotency-Key` runs at most once per user, method,
+path and key. The endpoint commits its response in an IdempotencyKey row
+inside its own transaction (IdempotentRequest.commit), so the mutation and
+the stored response land together or not at all; a retry gets the stored
+response back with `Idempotent-Replayed: true`.
+
+Lookups go to an in-memory LRU first and to the table only on a miss.
+Duplicates arriving while the first request is still running wait for it
+in this process; across processes, the unique scope makes the later commit
+fail and replay the winner's response instead.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import Header, HTTPException, Request, Response
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import SingletonThreadPool
+
+import models
+from auth import bearer_username
+from database import READ_DATABASE_URL, async_read_engine
+
+# How long a key is remembered (hours)
+IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# Responses kept in memory in front of the table
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "1024"))
+
+MAX_KEY_LENGTH = 255
+
+# Expired rows are deleted from inside a keyed commit at most this often
+PURGE_INTERVAL = timedelta(minutes=10)
+
+# On SQLite the lookup is one probe of a unique index (~50 µs), far cheaper
+# than an aiosqlite round trip (~1 ms on the checkout path), so it runs
+# inline on the event loop over a read-only connection of its own. Other
+# databases go through the async read pool.
+_inline_engine = (
+    create_engine(READ_DATABASE_URL, poolclass=SingletonThreadPool)
+    if READ_DATABASE_URL.startswith("sqlite") else None
+)
+
+_LOOKUP = select(
+    models.IdempotencyKey.request_hash,
+    models.IdempotencyKey.status_code,
+    models.IdempotencyKey.response_body,
+    models.IdempotencyKey.expires_at,
+)
+
+
+class StoredResponse(NamedTuple):
+    request_hash: str
+    status_code: int
+    body: bytes
+    expires_at: datetime
+
+
+class IdempotentReplay(Exception):
+    """Raised to answer with a stored response; see replay_response()"""
+
+    def __init__(self, stored: StoredResponse):
+        self.stored = stored
+
+
+async def replay_response(request: Request, exc: IdempotentReplay) -> Response:
+    return Response(
+        content=exc.stored.body,
+        status_code=exc.stored.status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+class IdempotencyStore:
+    def __init__(self, size: int = IDEMPOTENCY_CACHE_SIZE, ttl_hours: float = IDEMPOTENCY_TTL_HOURS):
+        self.size = size
+        self.ttl = timedelta(hours=ttl_hours)
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, StoredResponse]" = OrderedDict()
+        # scope -> set when the request holding it finishes (event loop only)
+        self._inflight: Dict[str, asyncio.Event] = {}
+        self._last_purge = datetime.min
+
+    def cached(self, scope: str) -> Optional[StoredResponse]:
+        with self._lock:
+            stored = self._cache.get(scope)
+            if stored is None:
+                return None
+            if stored.expires_at <= datetime.utcnow():
+                del self._cache[scope]
+                return None
+            self._cache.move_to_end(scope)
+            return stored
+
+    def remember(self, scope: str, stored: StoredResponse):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._cache[scope] = stored
+            self._cache.move_to_end(scope)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        """Forget cached responses (after the database is restored or cleared)"""
+        with self._lock:
+            self._cache.clear()
+
+    @staticmethod
+    def _stored(row) -> StoredResponse:
+        return StoredResponse(row.request_hash, row.status_code, row.response_body.encode(), row.expires_at)
+
+    async def _load(self, scope: str):
+        query = _LOOKUP.where(models.IdempotencyKey.scope == scope)
+        if _inline_engine is not None:
+            with _inline_engine.connect() as connection:
+                return connection.execute(query).first()
+        async with async_read_engine.connect() as connection:
+            return (await connection.execute(query)).first()
+
+    async def begin(self, request: Request, key: Optional[str]) -> "IdempotentRequest":
+        if key is None:
+            return IdempotentRequest(self)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail="Idempotency-Key inválida")
+        username = bearer_username(request.headers.get("authorization"))
+        if username is None:
+            # The endpoint's own auth dependency answers 401
+            return IdempotentRequest(self)
+
+        scope = hashlib.sha256(
+            f"{username}\n{request.method}\n{request.url.path}\n{key}".encode()
+        ).hexdigest()
+        # FastAPI caches the body, the endpoint still gets to parse it
+        request_hash = hashlib.sha256(
+            request.url.query.encode() + b"\n" + await request.body()
+        ).hexdigest()
+
+        while True:
+            stored = self.cached(scope)
+            if stored is None:
+                running = self._inflight.get(scope)
+                if running is not None:
+                    await running.wait()
+                    continue
+                # Claimed before the lookup, so duplicates wait on this one
+                event = self._inflight[scope] = asyncio.Event()
+                try:
+                    row = await self._load(scope)
+                except BaseException:
+                    self._release(scope, event)
+                    raise
+                if row is None or row.expires_at <= datetime.utcnow():
+                    return IdempotentRequest(self, scope, request_hash, event, replaces_expired=row is not None)
+                self._release(scope, event)
+                stored = self._stored(row)
+                self.remember(scope, stored)
+
+            if stored.request_hash != request_hash:
+                raise HTTPException(
+                    status_code=422,
+                    detail="Idempotency-Key já usada com outra requisição"
+                )
+            raise IdempotentReplay(stored)
+
+    def _release(self, scope: str, event: asyncio.Event):
+        if self._inflight.get(scope) is event:
+            del self._inflight[scope]
+        event.set()
+
+    def finish(self, context: "IdempotentRequest"):
+        if context.event is not None:
+            self._release(context.scope, context.event)
+
+
+class IdempotentRequest:
+    """Handed to the endpoint; a no-op when the request has no key"""
+
+    def __init__(
+        self,
+        store: IdempotencyStore,
+        scope: Optional[str] = None,
+        request_hash: Optional[str] = None,
+        event: Optional[asyncio.Event] = None,
+        replaces_expired: bool = False,
+    ):
+        self.store = store
+        self.scope = scope
+        self.request_hash = request_hash
+        self.event = event
+        self.replaces_expired = replaces_expired
+        self.staged: Optional[StoredResponse] = None
+
+    def stage(self, db: Session, body: bytes, status_code: int = 200):
+        """Add the response to `db`'s transaction without committing.
+
+        For callers that commit elsewhere (the group commit writer), which
+        then call committed() on success or conflict() on an IntegrityError.
+        """
+        if self.scope is None:
+            return
+        now = datetime.utcnow()
+        if self.replaces_expired or now - self.store._last_purge > PURGE_INTERVAL:
+            self.store._last_purge = now
+            db.query(models.IdempotencyKey)\
+                .filter(models.IdempotencyKey.expires_at <= now)\
+                .delete(synchronize_session=False)
+        self.staged = StoredResponse(self.request_hash, status_code, body, now + self.store.ttl)
+        db.add(models.IdempotencyKey(
+            scope=self.scope,
+            request_hash=self.staged.request_hash,
+            status_code=self.staged.status_code,
+            response_body=body.decode(),
+            expires_at=self.staged.expires_at,
+        ))
+
+    def committed(self):
+        if self.staged is not None:
+            self.store.remember(self.scope, self.staged)
+
+    def conflict(self, db: Session):
+        """After an IntegrityError: replay the response another process
+        committed for this key first. Returns if there is none, for the
+        caller to re-raise its error."""
+        if self.scope is None:
+            return
+        row = db.execute(_LOOKUP.where(models.IdempotencyKey.scope == self.scope)).first()
+        if row is None:
+            return
+        winner = self.store._stored(row)
+        self.store.remember(self.scope, winner)
+        if winner.request_hash != self.request_hash:
+            raise HTTPException(status_code=422, detail="Idempotency-Key já usada com outra requisição")
+        raise IdempotentReplay(winner)
+
+    def commit(self, db: Session, body: bytes, status_code: int = 200):
+        """Commit `db` together with the response the client will receive.
+
+        Async endpoints call it through `await db.run_sync(...)`. If another
+        process committed the same key first, the transaction is rolled
+        back and that response is replayed instead.
+        """
+        self.stage(db, body, status_code)
+        try:
+            db.commit()
+        except IntegrityError:
+            if self.scope is None:
+                raise
+            db.rollback()
+            self.conflict(db)
+            raise
+        self.committed()
+
+
+store = IdempotencyStore()
+
+
+async def idempotent_request(request: Request, idempotency_key: Optional[str] = Header(None)):
+    """Dependency for retried mutations: replays a stored response or lets
+    the endpoint run, holding off duplicates until it finishes"""
+    context = await store.begin(request, idempotency_key)
+    try:
+        yield context
+    finally:
+        store.finish(context)
@@ -0,0 +1,267 @@
+"""Per-request latency and database metrics in Prometheus text format.
+
+The middleware opens a RequestStats per request in a ContextVar; the engine
+hooks add each query to it (this follows sync endpoints into the threadpool
+and async ones through SQLAlchemy's greenlet bridge). The hooks only read
+the clock and bump slot attributes: see benchmarks/metrics_overhead.py.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+
+logger = logging.getLogger("cantina.slow_query")
+
+# Queries slower than this are logged (milliseconds, 0 disables the log)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+
+# Request latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Queries-per-request buckets
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestStats:
+    __slots__ = ("path", "route", "queries", "db_time", "rows_written", "objects_loaded")
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self.route = UNMATCHED_ROUTE
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows_written = 0
+        self.objects_loaded = 0
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class RouteMetrics:
+    __slots__ = ("latency", "queries", "statuses", "db_time", "rows_written", "objects_loaded")
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.statuses: Dict[int, int] = {}
+        self.db_time = 0.0
+        self.rows_written = 0
+        self.objects_loaded = 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self.slow_queries = 0
+
+    def record_request(self, method: str, stats: RequestStats, status: int, elapsed: float):
+        with self._lock:
+            metrics = self._routes.get((method, stats.route))
+            if metrics is None:
+                metrics = self._routes[(method, stats.route)] = RouteMetrics()
+            metrics.latency.observe(elapsed)
+            metrics.queries.observe(stats.queries)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.db_time += stats.db_time
+            metrics.rows_written += stats.rows_written
+            metrics.objects_loaded += stats.objects_loaded
+
+    def record_slow_query(self):
+        with self._lock:
+            self.slow_queries += 1
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Per-route totals keyed by "METHOD /route/template" """
+        with self._lock:
+            return {
+                f"{method} {route}": {
+                    "requests": metrics.latency.count,
+                    "queries": int(metrics.queries.total),
+                    "db_seconds": metrics.db_time,
+                    "rows_written": metrics.rows_written,
+                    "objects_loaded": metrics.objects_loaded,
+                }
+                for (method, route), metrics in self._routes.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+            self.slow_queries = 0
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                "# HELP http_requests_total HTTP requests by route and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route), metrics in routes:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+            lines += _histogram_lines(
+                "http_request_duration_seconds", "Request latency in seconds.",
+                [(key, metrics.latency) for key, metrics in routes],
+            )
+            lines += _histogram_lines(
+                "http_request_db_queries", "Database queries executed per request.",
+                [(key, metrics.queries) for key, metrics in routes],
+            )
+
+            lines += [
+                "# HELP http_request_db_seconds_total Time spent in database queries.",
+                "# TYPE http_request_db_seconds_total counter",
+            ]
+            for (method, route), metrics in routes:
+                lines.append(f'http_request_db_seconds_total{{method="{method}",route="{route}"}} {metrics.db_time:.6f}')
+
+            # SELECT row counts aren't known without wrapping every fetch, so
+            # rows read are only visible through the ORM objects they load
+            lines += [
+                "# HELP http_request_db_rows_written_total Rows affected by INSERT, UPDATE and DELETE.",
+                "# TYPE http_request_db_rows_written_total counter",
+            ]
+            for (method, route), metrics in routes:
+                lines.append(f'http_request_db_rows_written_total{{method="{method}",route="{route}"}} {metrics.rows_written}')
+
+            lines += [
+                "# HELP http_request_orm_objects_loaded_total ORM objects loaded from query results.",
+                "# TYPE http_request_orm_objects_loaded_total counter",
+            ]
+            for (method, route), metrics in routes:
+                lines.append(f'http_request_orm_objects_loaded_total{{method="{method}",route="{route}"}} {metrics.objects_loaded}')
+
+            lines += [
+                "# HELP db_slow_queries_total Queries slower than SLOW_QUERY_MS.",
+                "# TYPE db_slow_queries_total counter",
+                f"db_slow_queries_total {self.slow_queries}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(name, help_text, series):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for (method, route), histogram in series:
+        labels = f'method="{method}",route="{route}"'
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.total:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_start
+    stats = _current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+        if cursor.rowcount > 0:
+            stats.rows_written += cursor.rowcount
+
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        registry.record_slow_query()
+        logger.warning(
+            "slow query %.1fms path=%s: %s",
+            elapsed * 1000,
+            stats.path if stats is not None else "-",
+            " ".join(statement.split())[:500],
+        )
+
+
+def _on_load(target, context):
+    stats = _current_request.get()
+    if stats is not None:
+        stats.objects_loaded += 1
+
+
+def instrument_engine(engine):
+    """Attach the query hooks to a sync Engine (use .sync_engine for async ones)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def instrument_models(base):
+    """Count ORM objects loaded per request"""
+    event.listen(base, "load", _on_load, propagate=True)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+        self._route_names: Dict[object, str] = {}
+
+    def _route_name(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        name = self._route_names.get(endpoint)
+        if name is None:
+            # Route templates keep label cardinality bounded (/sales/{sale_id})
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    name = route.path
+                    break
+            else:
+                name = getattr(endpoint, "__name__", UNMATCHED_ROUTE)
+            self._route_names[endpoint] = name
+        return name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope["path"])
+        token = _current_request.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_request.reset(token)
+            stats.route = self._route_name(scope)
+            registry.record_request(scope["method"], stats, status, time.perf_counter() - start)
@@ -0,0 +1,78 @@
+import os
+from pathlib import Path
+from typing import Optional
+
+from database import engine
+
+BASE_DIR = Path(os.path.dirname(os.path.dirname(__file__)))
+
+# Revision matching the schema that used to be produced by create_all().
+# Databases created before migrations existed are stamped with it.
+BASELINE_REVISION = "0001"
+
+# How the app handles the schema on startup:
+#   upgrade - run pending migrations (default, convenient for a single process)
+#   check   - refuse to start if the database is not at head
+#   skip    - trust that `python migrate.py` already ran (fast worker start)
+SCHEMA_MODE = os.getenv("SCHEMA_MODE", "upgrade")
+
+# Alembic is imported inside the functions below so that workers running
+# with SCHEMA_MODE=skip never pay for loading it.
+
+
+def get_config(connection=None):
+    from alembic.config import Config
+
+    config = Config(str(BASE_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BASE_DIR / "migrations"))
+    config.attributes["configure_logger"] = False
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def get_head_revision() -> Optional[str]:
+    from alembic.script import ScriptDirectory
+
+    return ScriptDirectory.from_config(get_config()).get_current_head()
+
+
+def get_current_revision() -> Optional[str]:
+    from alembic.runtime.migration import MigrationContext
+
+    with engine.connect() as connection:
+        return MigrationContext.configure(connection).get_current_revision()
+
+
+def upgrade(revision: str = "head", bind=None) -> Optional[str]:
+    """Bring the database up to `revision`, adopting legacy create_all databases.
+
+    `bind` targets another engine than the app's (e.g. a generated dataset).
+    """
+    from alembic import command
+    from alembic.runtime.migration import MigrationContext
+    from sqlalchemy import inspect
+
+    with (bind or engine).begin() as connection:
+        config = get_config(connection)
+        current = MigrationContext.configure(connection).get_current_revision()
+        if current is None and inspect(connection).has_table("users"):
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, revision)
+        return MigrationContext.configure(connection).get_current_revision()
+
+
+def ensure_schema(mode: str = SCHEMA_MODE):
+    if mode == "skip":
+        return
+    if mode == "check":
+        current, head = get_current_revision(), get_head_revision()
+        if current != head:
+            raise RuntimeError(
+                f"Database schema at revision {current}, expected {head}. Run `python migrate.py`."
+            )
+        return
+    if mode == "upgrade":
+        upgrade()
+        return
+    raise ValueError(f"Invalid SCHEMA_MODE: {mode}")
@@ -0,0 +1,37 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Union
+
+CENT = Decimal("0.01")
+
+# Largest amount whose centavos still fit a 64-bit integer column
+MAX_AMOUNT = Decimal(2 ** 63 - 1) / 100
+
+
+def quantize(value: Union[Decimal, float, int, str]) -> Decimal:
+    """Round a reais amount to whole centavos.
+
+    Raises ValueError (a 422 when validating a schema) for NaN, infinities
+    and amounts too large to store as centavos.
+    """
+    if isinstance(value, float):
+        # repr() gives the shortest string that round-trips, so 5.1 stays 5.1
+        value = repr(value)
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"invalid amount: {value!r}")
+    if not amount.is_finite():
+        raise ValueError("amount must be a finite number")
+    if abs(amount) > MAX_AMOUNT:
+        raise ValueError(f"amount must be at most {MAX_AMOUNT} in absolute value")
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def to_cents(value: Union[Decimal, float, int, str]) -> int:
+    """Convert a reais amount (as received by the API) to integer centavos"""
+    return int(quantize(value) * 100)
+
+
+def from_cents(cents: int) -> Decimal:
+    """Convert integer centavos back to a reais Decimal for serialization"""
+    return (Decimal(cents or 0) / 100).quantize(CENT)
@@ -0,0 +1,218 @@
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException
+
+from auth import verify_token, is_admin
+
+# Header that asks for a cProfile capture of a single request
+PROFILE_HEADER = b"x-profile"
+# How many per-request profiles are kept for /profiling/requests
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "20"))
+
+# Leaf frames of threads that are just waiting for work
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    # uvloop waits inside C code, right under asyncio.run
+    ("runners.py", "run"),
+}
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, thread_name: str) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_FRAMES
+
+
+class SamplingProfiler:
+    """Wall-clock stack sampler for the whole process.
+
+    A timer thread reads sys._current_frames() every `interval` seconds and
+    counts identical stacks. Nothing is hooked into the interpreter, so the
+    cost for the app is one GIL hand-off per sample. Output is the collapsed
+    format read by flamegraph.pl and speedscope ("a;b;c count").
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def start(self, duration: float, interval: float = 0.005, include_idle: bool = False) -> Future:
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        result = Future()
+
+        def sample():
+            try:
+                result.set_result(self._sample(duration, interval, include_idle))
+            except BaseException as exc:
+                result.set_exception(exc)
+            finally:
+                self._lock.release()
+
+        threading.Thread(target=sample, name="sampling-profiler", daemon=True).start()
+        return result
+
+    @staticmethod
+    def _sample(duration: float, interval: float, include_idle: bool) -> dict:
+        me = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me or (not include_idle and _is_idle(frame)):
+                    continue
+                stacks[_collapse(frame, names.get(thread_id, str(thread_id)))] += 1
+            samples += 1
+            time.sleep(interval)
+        return {"samples": samples, "stacks": stacks}
+
+    @staticmethod
+    def render(stacks: Counter) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class RequestProfiles:
+    """The last PROFILE_HISTORY per-request cProfile captures"""
+
+    def __init__(self, size: int = PROFILE_HISTORY):
+        self.size = size
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._profiles: "OrderedDict[int, dict]" = OrderedDict()
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def add(self, profile_id: int, method: str, path: str, elapsed: float, profiler: cProfile.Profile):
+        with self._lock:
+            self._profiles[profile_id] = {
+                "id": profile_id,
+                "method": method,
+                "path": path,
+                "elapsed_ms": round(elapsed * 1000, 2),
+                "created_at": datetime.utcnow(),
+                "profiler": profiler,
+            }
+            while len(self._profiles) > self.size:
+                self._profiles.popitem(last=False)
+
+    def list(self) -> list:
+        with self._lock:
+            return [
+                {key: value for key, value in profile.items() if key != "profiler"}
+                for profile in reversed(self._profiles.values())
+            ]
+
+    def render(self, profile_id: int, sort: str = "cumulative", limit: int = 50) -> Optional[str]:
+        with self._lock:
+            profile = self._profiles.get(profile_id)
+        if profile is None:
+            return None
+        output = io.StringIO()
+        stats = pstats.Stats(profile["profiler"], stream=output)
+        stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+
+sampler = SamplingProfiler()
+request_profiles = RequestProfiles()
+
+# cProfile hooks the thread it is enabled on; one capture at a time
+_cprofile_lock = threading.Lock()
+
+
+def _admin_from_headers(headers) -> bool:
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        return is_admin(verify_token(token))
+    except HTTPException:
+        return False
+
+
+class ProfilingMiddleware:
+    """cProfile one request when an admin sends `X-Profile: 1`.
+
+    The profiler runs on the event loop thread, so it covers async endpoints
+    (create_sale, dashboard) end to end; sync endpoints run in the threadpool
+    and only show up as the await on it, use the sampling profiler for those.
+    Other requests served concurrently on the loop are included as well.
+    The capture id comes back in the X-Profile-Id response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        if headers.get(PROFILE_HEADER, b"") in (b"", b"0") or not _admin_from_headers(headers):
+            await self.app(scope, receive, send)
+            return
+
+        if not _cprofile_lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = request_profiles.next_id()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", str(profile_id).encode())
+                ]
+            await send(message)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profiler.disable()
+        finally:
+            _cprofile_lock.release()
+            request_profiles.add(
+                profile_id, scope["method"], scope["path"], time.perf_counter() - start, profiler
+            )
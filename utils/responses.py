@@ -0,0 +1,17 @@
+from typing import Any, Optional
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+
+def json_response(adapter: TypeAdapter, value: Any, response: Optional[Response] = None) -> Response:
+    """Validate `value` once with a precompiled adapter and send its JSON bytes.
+
+    Returning the objects instead would have FastAPI validate them against
+    the route's response_model and serialize them to Python again before
+    json.dumps. Pass the endpoint's injected `response` to keep headers set
+    by dependencies (ETag, Cache-Control).
+    """
+    body = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    headers = dict(response.headers) if response is not None else None
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,479 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, case, func, select, text
+from sqlalchemy.orm import Session, joinedload
+
+import models
+from utils import archive
+from utils.money import from_cents
+
+
+def compute_usuario_summaries(db: Session, usuario_id: Optional[int] = None) -> Dict[int, dict]:
+    """Aggregate usuario summaries straight from the raw tables (archived
+    seasons included: summaries are all-time totals)"""
+    Sale, _ = archive.history(db)
+    query = db.query(
+        models.Usuario.id,
+        models.Usuario.saldo_cents,
+        func.count(Sale.id),
+        func.coalesce(func.sum(Sale.total_amount_cents), 0),
+        func.max(Sale.created_at),
+    ).outerjoin(Sale, and_(Sale.usuario_id == models.Usuario.id, Sale.voided_at.is_(None)))
+
+    if usuario_id is not None:
+        query = query.filter(models.Usuario.id == usuario_id)
+
+    return {
+        row_id: {
+            "usuario_id": row_id,
+            "saldo_cents": saldo_cents or 0,
+            "total_vendas": total_vendas,
+            "total_gasto_cents": total_gasto_cents,
+            "last_purchase_at": last_purchase_at,
+        }
+        for row_id, saldo_cents, total_vendas, total_gasto_cents, last_purchase_at
+        in query.group_by(models.Usuario.id).all()
+    }
+
+
+def _build_usuario_summary(db: Session, usuario_id: int) -> Optional[models.UsuarioSummary]:
+    db.flush()
+    computed = compute_usuario_summaries(db, usuario_id).get(usuario_id)
+    if computed is None:
+        return None
+    summary = models.UsuarioSummary(**computed)
+    db.add(summary)
+    return summary
+
+
+def get_usuario_summary(db: Session, usuario_id: int) -> Optional[models.UsuarioSummary]:
+    """Primary-key lookup of a summary.
+
+    Safe on read-only sessions: a missing row is computed on the fly without
+    being stored (the next write or `reconcile.py --fix` persists it).
+    """
+    summary = db.get(
+        models.UsuarioSummary, usuario_id, options=[joinedload(models.UsuarioSummary.usuario)]
+    )
+    if summary is None:
+        computed = compute_usuario_summaries(db, usuario_id).get(usuario_id)
+        if computed is not None:
+            summary = models.UsuarioSummary(**computed)
+            summary.usuario = db.get(models.Usuario, usuario_id)
+    return summary
+
+
+def record_sale(db: Session, usuario: models.Usuario, sale: models.Sale):
+    """Apply a new sale to the summary inside the caller's transaction"""
+    updated = db.query(models.UsuarioSummary).filter(
+        models.UsuarioSummary.usuario_id == usuario.id
+    ).update({
+        models.UsuarioSummary.total_vendas: models.UsuarioSummary.total_vendas + 1,
+        models.UsuarioSummary.total_gasto_cents: models.UsuarioSummary.total_gasto_cents + sale.total_amount_cents,
+        models.UsuarioSummary.last_purchase_at: sale.created_at,
+        models.UsuarioSummary.saldo_cents: usuario.saldo_cents,
+    }, synchronize_session=False)
+
+    if not updated:
+        _build_usuario_summary(db, usuario.id)
+
+
+def record_balance(db: Session, usuario: models.Usuario):
+    """Refresh the saldo snapshot inside the caller's transaction"""
+    updated = db.query(models.UsuarioSummary).filter(
+        models.UsuarioSummary.usuario_id == usuario.id
+    ).update({
+        models.UsuarioSummary.saldo_cents: usuario.saldo_cents,
+    }, synchronize_session=False)
+
+    if not updated:
+        _build_usuario_summary(db, usuario.id)
+
+
+def _last_purchase_at(db: Session, usuario_id: int) -> Optional[datetime]:
+    Sale, _ = archive.history(db)
+    return db.scalar(
+        select(func.max(Sale.created_at))
+        .where(Sale.usuario_id == usuario_id, Sale.voided_at.is_(None))
+    )
+
+
+def record_void(db: Session, sale: models.Sale):
+    """Take a voided sale (already marked, refund already applied to the
+    usuario) back out of the summary inside the caller's transaction"""
+    values = {
+        models.UsuarioSummary.total_vendas: models.UsuarioSummary.total_vendas - 1,
+        models.UsuarioSummary.total_gasto_cents: models.UsuarioSummary.total_gasto_cents - sale.total_amount_cents,
+        models.UsuarioSummary.saldo_cents: models.UsuarioSummary.saldo_cents + sale.total_amount_cents,
+    }
+    summary = db.get(models.UsuarioSummary, sale.usuario_id)
+    if summary is not None and summary.last_purchase_at == sale.created_at:
+        # Only voiding the latest purchase needs a look at the ones before it
+        values[models.UsuarioSummary.last_purchase_at] = _last_purchase_at(db, sale.usuario_id)
+
+    updated = db.query(models.UsuarioSummary).filter(
+        models.UsuarioSummary.usuario_id == sale.usuario_id
+    ).update(values, synchronize_session=False)
+
+    if not updated:
+        _build_usuario_summary(db, sale.usuario_id)
+
+
+def reconcile_usuario_summaries(db: Session, fix: bool = False) -> List[dict]:
+    """Diff stored summaries against the raw tables, optionally rewriting them.
+
+    Returns one entry per usuario whose summary is missing, stale or orphaned.
+    """
+    fields = ["saldo_cents", "total_vendas", "total_gasto_cents", "last_purchase_at"]
+    expected = compute_usuario_summaries(db)
+    stored = {summary.usuario_id: summary for summary in db.query(models.UsuarioSummary).all()}
+
+    diffs = []
+    for usuario_id, computed in expected.items():
+        summary = stored.get(usuario_id)
+        if summary is None:
+            diffs.append({"usuario_id": usuario_id, "problem": "missing", "expected": computed})
+            if fix:
+                db.add(models.UsuarioSummary(**computed))
+            continue
+
+        changed = {
+            field: {"stored": getattr(summary, field), "expected": computed[field]}
+            for field in fields
+            if getattr(summary, field) != computed[field]
+        }
+        if changed:
+            diffs.append({"usuario_id": usuario_id, "problem": "stale", "fields": changed})
+            if fix:
+                for field in changed:
+                    setattr(summary, field, computed[field])
+
+    for usuario_id in stored.keys() - expected.keys():
+        diffs.append({"usuario_id": usuario_id, "problem": "orphaned"})
+        if fix:
+            db.delete(stored[usuario_id])
+
+    if fix:
+        db.commit()
+    return diffs
+
+
+# Set-based rebuild of every materialized table, for bulk loads that bypass
+# create_sale (same statements as the migrations' backfills). {sales} and
+# {sale_items} stand for the tables with their archived seasons, like the
+# compute_* functions above, so reconcile.py agrees with the result.
+REBUILD_STATEMENTS = [
+    "DELETE FROM usuario_summaries",
+    """
+    INSERT INTO usuario_summaries
+        (usuario_id, total_vendas, total_gasto_cents, last_purchase_at, saldo_cents, updated_at)
+    SELECT u.id, COUNT(s.id), COALESCE(SUM(s.total_amount_cents), 0), MAX(s.created_at),
+           u.saldo_cents, CURRENT_TIMESTAMP
+    FROM usuarios u
+    LEFT JOIN {sales} s ON s.usuario_id = u.id AND s.voided_at IS NULL
+    GROUP BY u.id
+    """,
+    "DELETE FROM produto_stats",
+    """
+    INSERT INTO produto_stats
+        (produto_id, total_vendas, quantidade_vendida, receita_cents, last_sale_at)
+    SELECT p.id, COUNT(si.id), COALESCE(SUM(si.quantity), 0),
+           COALESCE(SUM(si.total_price_cents), 0), MAX(si.created_at)
+    FROM produtos p
+    LEFT JOIN (
+        SELECT i.id, i.produto_id, i.quantity, i.total_price_cents, s.created_at
+        FROM {sale_items} i JOIN {sales} s ON s.id = i.sale_id
+        WHERE s.voided_at IS NULL
+    ) si ON si.produto_id = p.id
+    GROUP BY p.id
+    """,
+    "DELETE FROM produto_daily_sales",
+    """
+    INSERT INTO produto_daily_sales (produto_id, day, quantity, receita_cents)
+    SELECT si.produto_id, DATE(s.created_at), SUM(si.quantity), SUM(si.total_price_cents)
+    FROM {sale_items} si
+    JOIN {sales} s ON s.id = si.sale_id
+    WHERE s.voided_at IS NULL
+    GROUP BY si.produto_id, DATE(s.created_at)
+    """,
+]
+
+
+def _history_source(model, schemas: List[str]) -> str:
+    """`model`'s table, or a UNION ALL subquery adding its archived copies"""
+    if not schemas:
+        return model.__tablename__
+    columns = ", ".join(column.name for column in model.__table__.columns)
+    selects = [f"SELECT {columns} FROM {model.__tablename__}"] + [
+        f"SELECT {columns} FROM {schema}.{model.__tablename__}" for schema in schemas
+    ]
+    return "(" + " UNION ALL ".join(selects) + ")"
+
+
+def rebuild_materialized(connection):
+    """Recompute usuario_summaries, produto_stats and produto_daily_sales in bulk.
+
+    Needs every registered season archive attached to `connection` (see
+    database.attach_archives); otherwise the totals would leave archived
+    seasons out and reconcile.py would report them as drift.
+    """
+    schemas = [schema for schema, _, _ in connection.connection.info.get("season_archives", ())]
+    registered = connection.scalar(select(func.count()).select_from(models.SeasonArchive.__table__))
+    if registered != len(schemas):
+        raise RuntimeError(
+            f"{registered} season archives are registered but {len(schemas)} are attached; "
+            "rebuilding without them would leave archived seasons out"
+        )
+    sources = {
+        "sales": _history_source(models.Sale, schemas),
+        "sale_items": _history_source(models.SaleItem, schemas),
+    }
+    for statement in REBUILD_STATEMENTS:
+        connection.execute(text(statement.format(**sources)))
+
+
+# Rolling windows (in days) reported as sales velocity by /produtos/stats
+VELOCITY_WINDOWS = (7, 30)
+
+
+def compute_produto_stats(db: Session, produto_id: Optional[int] = None) -> Dict[int, dict]:
+    """Aggregate produto running totals straight from the raw tables
+    (archived seasons included)"""
+    Sale, SaleItem = archive.history(db)
+    live_items = select(
+        SaleItem.id,
+        SaleItem.produto_id,
+        SaleItem.quantity,
+        SaleItem.total_price_cents,
+        Sale.created_at,
+    ).join(Sale, Sale.id == SaleItem.sale_id)\
+        .where(Sale.voided_at.is_(None)).subquery()
+
+    query = db.query(
+        models.Produto.id,
+        func.count(live_items.c.id),
+        func.coalesce(func.sum(live_items.c.quantity), 0),
+        func.coalesce(func.sum(live_items.c.total_price_cents), 0),
+        func.max(live_items.c.created_at),
+    ).outerjoin(live_items, live_items.c.produto_id == models.Produto.id)
+
+    if produto_id is not None:
+        query = query.filter(models.Produto.id == produto_id)
+
+    return {
+        row_id: {
+            "produto_id": row_id,
+            "total_vendas": total_vendas,
+            "quantidade_vendida": quantidade_vendida,
+            "receita_cents": receita_cents,
+            "last_sale_at": last_sale_at,
+        }
+        for row_id, total_vendas, quantidade_vendida, receita_cents, last_sale_at
+        in query.group_by(models.Produto.id).all()
+    }
+
+
+def compute_produto_daily_sales(db: Session) -> Dict[tuple, dict]:
+    """Aggregate per-day produto sales straight from the raw tables
+    (archived seasons included)"""
+    Sale, SaleItem = archive.history(db)
+    day = func.date(Sale.created_at)
+    rows = db.query(
+        SaleItem.produto_id,
+        day,
+        func.sum(SaleItem.quantity),
+        func.sum(SaleItem.total_price_cents),
+    ).join(Sale, Sale.id == SaleItem.sale_id)\
+        .filter(Sale.voided_at.is_(None))\
+        .group_by(SaleItem.produto_id, day).all()
+
+    return {
+        (produto_id, date.fromisoformat(str(sale_day))): {
+            "produto_id": produto_id,
+            "day": date.fromisoformat(str(sale_day)),
+            "quantity": quantity,
+            "receita_cents": receita_cents,
+        }
+        for produto_id, sale_day, quantity, receita_cents in rows
+    }
+
+
+def record_sale_items(db: Session, sale: models.Sale, items: List[models.SaleItem]):
+    """Apply a new sale's items to the produto stats inside the caller's transaction"""
+    per_produto = defaultdict(lambda: {"count": 0, "quantity": 0, "receita_cents": 0})
+    for item in items:
+        totals = per_produto[item.produto_id]
+        totals["count"] += 1
+        totals["quantity"] += item.quantity
+        totals["receita_cents"] += item.total_price_cents
+
+    day = sale.created_at.date()
+    for produto_id, totals in per_produto.items():
+        updated = db.query(models.ProdutoStats).filter(
+            models.ProdutoStats.produto_id == produto_id
+        ).update({
+            models.ProdutoStats.total_vendas: models.ProdutoStats.total_vendas + totals["count"],
+            models.ProdutoStats.quantidade_vendida: models.ProdutoStats.quantidade_vendida + totals["quantity"],
+            models.ProdutoStats.receita_cents: models.ProdutoStats.receita_cents + totals["receita_cents"],
+            models.ProdutoStats.last_sale_at: sale.created_at,
+        }, synchronize_session=False)
+        if not updated:
+            db.flush()
+            db.add(models.ProdutoStats(**compute_produto_stats(db, produto_id)[produto_id]))
+
+        updated = db.query(models.ProdutoDailySales).filter(
+            models.ProdutoDailySales.produto_id == produto_id,
+            models.ProdutoDailySales.day == day
+        ).update({
+            models.ProdutoDailySales.quantity: models.ProdutoDailySales.quantity + totals["quantity"],
+            models.ProdutoDailySales.receita_cents: models.ProdutoDailySales.receita_cents + totals["receita_cents"],
+        }, synchronize_session=False)
+        if not updated:
+            db.add(models.ProdutoDailySales(
+                produto_id=produto_id,
+                day=day,
+                quantity=totals["quantity"],
+                receita_cents=totals["receita_cents"]
+            ))
+
+
+def record_void_items(db: Session, sale: models.Sale, items: List[models.SaleItem]):
+    """Take a voided sale's items back out of the produto stats and daily
+    buckets inside the caller's transaction (the sale is already marked)"""
+    per_produto = defaultdict(lambda: {"count": 0, "quantity": 0, "receita_cents": 0})
+    for item in items:
+        totals = per_produto[item.produto_id]
+        totals["count"] += 1
+        totals["quantity"] += item.quantity
+        totals["receita_cents"] += item.total_price_cents
+
+    day = sale.created_at.date()
+    for produto_id, totals in per_produto.items():
+        values = {
+            models.ProdutoStats.total_vendas: models.ProdutoStats.total_vendas - totals["count"],
+            models.ProdutoStats.quantidade_vendida: models.ProdutoStats.quantidade_vendida - totals["quantity"],
+            models.ProdutoStats.receita_cents: models.ProdutoStats.receita_cents - totals["receita_cents"],
+        }
+        stats = db.get(models.ProdutoStats, produto_id)
+        if stats is not None and stats.last_sale_at == sale.created_at:
+            Sale, SaleItem = archive.history(db)
+            values[models.ProdutoStats.last_sale_at] = db.scalar(
+                select(func.max(Sale.created_at))
+                .join(SaleItem, SaleItem.sale_id == Sale.id)
+                .where(SaleItem.produto_id == produto_id, Sale.voided_at.is_(None))
+            )
+        updated = db.query(models.ProdutoStats).filter(
+            models.ProdutoStats.produto_id == produto_id
+        ).update(values, synchronize_session=False)
+        if not updated:
+            db.flush()
+            db.add(models.ProdutoStats(**compute_produto_stats(db, produto_id)[produto_id]))
+
+        bucket = db.query(models.ProdutoDailySales).filter(
+            models.ProdutoDailySales.produto_id == produto_id,
+            models.ProdutoDailySales.day == day
+        )
+        bucket.update({
+            models.ProdutoDailySales.quantity: models.ProdutoDailySales.quantity - totals["quantity"],
+            models.ProdutoDailySales.receita_cents: models.ProdutoDailySales.receita_cents - totals["receita_cents"],
+        }, synchronize_session=False)
+        # A day with no sales left has no bucket, as if it never sold
+        bucket.filter(models.ProdutoDailySales.quantity <= 0).delete(synchronize_session=False)
+
+
+def get_produto_stats(db: Session, produto_id: Optional[int] = None) -> List[dict]:
+    """Running totals and rolling velocity for every produto in a single query"""
+    today = datetime.utcnow().date()
+    windows = {days: today - timedelta(days=days - 1) for days in VELOCITY_WINDOWS}
+
+    window_totals = db.query(
+        models.ProdutoDailySales.produto_id.label("produto_id"),
+        *[
+            func.sum(case((models.ProdutoDailySales.day >= since, models.ProdutoDailySales.quantity), else_=0)).label(f"vendas_{days}d")
+            for days, since in windows.items()
+        ]
+    ).filter(models.ProdutoDailySales.day >= min(windows.values()))\
+        .group_by(models.ProdutoDailySales.produto_id).subquery()
+
+    query = db.query(
+        models.Produto,
+        models.ProdutoStats,
+        *[window_totals.c[f"vendas_{days}d"] for days in VELOCITY_WINDOWS]
+    ).outerjoin(models.ProdutoStats, models.ProdutoStats.produto_id == models.Produto.id)\
+        .outerjoin(window_totals, window_totals.c.produto_id == models.Produto.id)
+
+    if produto_id is not None:
+        query = query.filter(models.Produto.id == produto_id)
+
+    results = []
+    for produto, stats, *window_sales in query.order_by(models.Produto.id).all():
+        result = {
+            "produto_id": produto.id,
+            "produto_nome": produto.nome,
+            "produto_valor": produto.valor,
+            "estoque_atual": produto.estoque,
+            "total_vendas": stats.total_vendas if stats else 0,
+            "quantidade_vendida": stats.quantidade_vendida if stats else 0,
+            "receita_total": stats.receita_total if stats else from_cents(0),
+            "ultima_venda": stats.last_sale_at if stats else None,
+        }
+        for days, sold in zip(VELOCITY_WINDOWS, window_sales):
+            result[f"vendas_{days}d"] = sold or 0
+            result[f"velocidade_{days}d"] = round((sold or 0) / days, 2)
+        results.append(result)
+    return results
+
+
+def reconcile_produto_stats(db: Session, fix: bool = False) -> List[dict]:
+    """Diff stored produto stats and daily buckets against the raw tables"""
+    diffs = []
+
+    expected = compute_produto_stats(db)
+    stored = {stats.produto_id: stats for stats in db.query(models.ProdutoStats).all()}
+    fields = ["total_vendas", "quantidade_vendida", "receita_cents", "last_sale_at"]
+    for produto_id, computed in expected.items():
+        stats = stored.get(produto_id)
+        if stats is None:
+            diffs.append({"produto_id": produto_id, "problem": "missing", "expected": computed})
+            if fix:
+                db.add(models.ProdutoStats(**computed))
+            continue
+
+        changed = {
+            field: {"stored": getattr(stats, field), "expected": computed[field]}
+            for field in fields
+            if getattr(stats, field) != computed[field]
+        }
+        if changed:
+            diffs.append({"produto_id": produto_id, "problem": "stale", "fields": changed})
+            if fix:
+                for field in changed:
+                    setattr(stats, field, computed[field])
+
+    expected_days = compute_produto_daily_sales(db)
+    stored_days = {(row.produto_id, row.day): row for row in db.query(models.ProdutoDailySales).all()}
+    for key in expected_days.keys() | stored_days.keys():
+        computed, row = expected_days.get(key), stored_days.get(key)
+        if row is not None and computed is not None \
+                and (row.quantity, row.receita_cents) == (computed["quantity"], computed["receita_cents"]):
+            continue
+        diffs.append({
+            "produto_id": key[0],
+            "day": key[1],
+            "problem": "daily_sales",
+            "stored": (row.quantity, row.receita_cents) if row is not None else None,
+            "expected": (computed["quantity"], computed["receita_cents"]) if computed is not None else None,
+        })
+        if fix:
+            if row is None:
+                db.add(models.ProdutoDailySales(**computed))
+            elif computed is None:
+                db.delete(row)
+            else:
+                row.quantity, row.receita_cents = computed["quantity"], computed["receita_cents"]
+
+    if fix:
+        db.commit()
+    return diffs
@@ -0,0 +1,300 @@
+import secrets
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import bindparam, event, select, text
+from sqlalchemy.orm import Session
+
+import models
+from auth import bearer_username
+from database import AsyncReadSessionLocal
+
+# data_versions row holding the shared epoch (no table is called that)
+EPOCH = "_epoch"
+
+_BUMP = text(
+    "INSERT INTO data_versions (name, version) VALUES (:name, 1) "
+    "ON CONFLICT (name) DO UPDATE SET version = data_versions.version + 1"
+)
+
+
+class SharedVersions:
+    """The data_versions table as seen by one worker process.
+
+    Committing transactions bump their tables' rows first
+    (_stage_shared_bumps), so a bump commits or rolls back with the data.
+    refresh() costs a `PRAGMA data_version` on a connection of its own (a
+    few microseconds, no I/O) and re-reads the table only when another
+    connection committed since the previous call.
+    """
+
+    def __init__(self, connect: Callable):
+        self._connect = connect
+        self._connection = None
+        self._lock = threading.Lock()
+        self._data_version = None
+        self.epoch = ""
+        self.versions: Dict[str, int] = {}
+
+    def _cursor(self):
+        if self._connection is None:
+            self._connection = self._connect()
+        return self._connection.cursor()
+
+    def refresh(self) -> Tuple[bool, Set[str]]:
+        """(epoch changed, tables whose version changed) since the last
+        call, leaving out this process's own commits"""
+        with self._lock:
+            cursor = self._cursor()
+            try:
+                cursor.execute("PRAGMA data_version")
+                data_version = cursor.fetchone()[0]
+                if data_version == self._data_version:
+                    return False, set()
+                cursor.execute("SELECT name, version FROM data_versions")
+                rows = dict(cursor.fetchall())
+            finally:
+                cursor.close()
+            epoch = str(rows.pop(EPOCH, 0))
+            if self._data_version is None:
+                # First read: nothing to compare with
+                epoch_changed, changed = False, set()
+            else:
+                epoch_changed = epoch != self.epoch
+                changed = {
+                    name for name in rows.keys() | self.versions.keys()
+                    if rows.get(name) != self.versions.get(name)
+                }
+            self._data_version = data_version
+            self.epoch, self.versions = epoch, rows
+            return epoch_changed, changed
+
+    def committed(self, bumped: Dict[str, int]):
+        """Versions this process just committed. Taken as already seen when
+        they directly follow the last read, so refresh() only reports other
+        processes' writes (or, when unsure, reports a change)."""
+        with self._lock:
+            for name, version in bumped.items():
+                if self.versions.get(name, 0) == version - 1:
+                    self.versions[name] = version
+
+    def new_epoch(self):
+        with self._lock:
+            cursor = self._cursor()
+            try:
+                cursor.execute(
+                    "INSERT INTO data_versions (name, version) VALUES (?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET version = excluded.version",
+                    (EPOCH, secrets.randbits(31)),
+                )
+                self._connection.commit()
+            finally:
+                cursor.close()
+
+
+class DataVersions:
+    """Per-table write counters, bumped when a transaction that wrote the
+    table commits.
+
+    They only ever go up within a process; the random epoch keeps ETags
+    from a previous process (whose counters restarted at 0) from matching.
+    Worker processes (WORKERS > 1) take the counters and the epoch of the
+    tables from the data_versions table instead (share()), so every worker
+    sends the same ETag for the same data and sees the others' writes;
+    only pseudo-tables such as "forecast" stay per process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        self.epoch = secrets.token_hex(4)
+        self.shared: Optional[SharedVersions] = None
+        self._listeners: List[Callable[[bool, Set[str]], None]] = []
+
+    def share(self, db_engine):
+        """Use the data_versions table of `db_engine`'s database from now on"""
+        def connect():
+            connection = db_engine.raw_connection()
+            # Kept for good, outside the pool
+            connection.detach()
+            return connection
+
+        self.shared = SharedVersions(connect)
+        self.refresh()
+
+    def on_change(self, listener: Callable[[bool, Set[str]], None]):
+        """Call `listener(epoch_changed, tables)` when refresh() finds
+        writes from other processes"""
+        self._listeners.append(listener)
+
+    def refresh(self):
+        """Pick up other processes' commits (no-op unless shared)"""
+        if self.shared is None:
+            return
+        epoch_changed, changed = self.shared.refresh()
+        if epoch_changed or changed:
+            for listener in self._listeners:
+                listener(epoch_changed, changed)
+
+    def get(self, table: str) -> int:
+        if self.shared is not None and table in self.shared.versions:
+            return self.shared.versions[table]
+        return self._versions.get(table, 0)
+
+    def bump(self, tables: Iterable[str]):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def bump_all(self):
+        """For writes that bypass the ORM (restoring or clearing the database)"""
+        with self._lock:
+            self.epoch = secrets.token_hex(4)
+            self._versions.clear()
+        if self.shared is not None:
+            self.shared.new_epoch()
+
+    def etag(self, tables: Iterable[str], dated: bool = False) -> str:
+        self.refresh()
+        epoch = self.epoch if self.shared is None else self.shared.epoch
+        parts = [epoch] + [str(self.get(table)) for table in tables]
+        if dated:
+            # "Today" and the forecast windows move with the clock. Hourly
+            # buckets cover both the local and the UTC midnight.
+            parts.append(datetime.utcnow().strftime("%Y%m%d%H"))
+        return '"' + "-".join(parts) + '"'
+
+
+versions = DataVersions()
+
+
+def _written_tables(session: Session) -> set:
+    return session.info.setdefault("written_tables", set())
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    tables = _written_tables(session)
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(instance, "__tablename__", None)
+        if table is not None:
+            tables.add(table)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_tables(orm_execute_state):
+    # query(...).update()/.delete() and session.execute(insert(...)) skip the flush
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            _written_tables(orm_execute_state.session).add(mapper.local_table.name)
+
+
+@event.listens_for(Session, "before_commit")
+def _stage_shared_bumps(session):
+    if versions.shared is None:
+        return
+    # The commit flushes only after this hook: flush first, so every
+    # table the transaction writes is known
+    session.flush()
+    tables = sorted(session.info.get("written_tables", ()))
+    if tables:
+        connection = session.connection()
+        connection.execute(_BUMP, [{"name": table} for table in tables])
+        rows = connection.execute(
+            text("SELECT name, version FROM data_versions WHERE name IN :names")
+            .bindparams(bindparam("names", expanding=True)),
+            {"names": tables},
+        )
+        session.info["shared_versions"] = dict(rows.all())
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed_tables(session):
+    tables = session.info.pop("written_tables", None)
+    bumped = session.info.pop("shared_versions", None)
+    if bumped:
+        versions.shared.committed(bumped)
+    elif tables:
+        versions.bump(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_tables(session):
+    # Also fires for a rolled back SAVEPOINT; the outer transaction may
+    # still commit what it wrote before
+    if not session.in_nested_transaction():
+        session.info.pop("written_tables", None)
+        session.info.pop("shared_versions", None)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: the compression middleware sends W/ on encoded bodies
+    return etag in (candidate.strip().removeprefix("W/") for candidate in if_none_match.split(","))
+
+
+# Usernames remembered by ActiveUsers (the staff, in practice)
+ACTIVE_USERS_CACHE_SIZE = 1024
+
+
+class ActiveUsers:
+    """Whether a username still belongs to an active user, for 304s.
+
+    Entries are only trusted under the users table version they were read
+    at, so deleting or deactivating a user (or restoring the database)
+    takes effect on the next revalidation.
+    """
+
+    def __init__(self):
+        self._users: Dict[str, Tuple[str, bool]] = {}
+
+    async def is_active(self, username: str) -> bool:
+        stamp = versions.etag(["users"])
+        entry = self._users.get(username)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        async with AsyncReadSessionLocal() as db:
+            active = bool(await db.scalar(
+                select(models.User.is_active).where(models.User.username == username)
+            ))
+        if len(self._users) >= ACTIVE_USERS_CACHE_SIZE:
+            self._users.clear()
+        self._users[username] = (stamp, active)
+        return active
+
+
+active_users = ActiveUsers()
+
+
+def conditional(*tables: str, dated: bool = False, max_age: int = 0):
+    """Dependency adding a strong ETag derived from `tables`' versions.
+
+    When the request's If-None-Match already has it, answers 304 before the
+    endpoint (or its user lookup) touches the database.
+    """
+    cache_control = f"private, max-age={max_age}, must-revalidate"
+
+    async def dependency(request: Request, response: Response):
+        # Read before the endpoint queries, so a concurrent write can only
+        # make the ETag older than the data, never newer. A 304 checks the
+        # token against the verified-token cache, and the user against
+        # active_users (a query only after the users table changed).
+        # Only reads memory otherwise, so it runs on the event loop.
+        etag = versions.etag(tables, dated=dated)
+        username = None
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            username = bearer_username(request.headers.get("authorization"))
+        if username is not None and await active_users.is_active(username):
+            raise HTTPException(
+                status_code=304, headers={"ETag": etag, "Cache-Control": cache_control}
+            )
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+
+    return dependency
@@ -0,0 +1,124 @@
+"""Serving the API from several worker processes.
+
+`WORKERS=4 python main.py` runs the startup tasks that must happen once
+(schema, default admin, event log baseline) in the launching process, then
+starts that many uvicorn workers accepting on the same port. Workers are
+separate interpreters with caches of their own, so what has to agree
+across them goes through the database:
+
+- table versions (ETags, the analytics cache) come from data_versions
+  (utils.versions). A worker checks for other workers' commits before
+  every ETag and every WORKER_POLL_MS in the background, and drops what
+  they made stale: forecasts, remembered idempotent responses (after a
+  restore) and the revoked tokens list;
+- logouts are stored in revoked_access_tokens;
+- each worker appends to an event log stream of its own (utils.event_log);
+- live dashboard events reach the clients of the worker that made the
+  change; the other workers' clients get a `resync` (at most every
+  WORKER_RESYNC_SECONDS) and refetch.
+
+Launch through main.py, not `uvicorn --workers`: plain uvicorn workers
+would each run the startup tasks and share one event log stream.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Optional, Set
+
+from database import SessionLocal, engine
+from utils.versions import versions
+
+logger = logging.getLogger(__name__)
+
+# Worker processes started by `python main.py` (1 keeps a single process)
+WORKERS = int(os.getenv("WORKERS", "1"))
+# How often a worker looks for other workers' commits in the background (ms)
+WORKER_POLL_MS = float(os.getenv("WORKER_POLL_MS", "100"))
+# Least time between two resyncs sent to a worker's dashboards (seconds)
+WORKER_RESYNC_SECONDS = float(os.getenv("WORKER_RESYNC_SECONDS", "1"))
+
+# Set by the launcher for the processes it starts
+WORKER_ENV = "CANTINA_WORKER"
+
+# What the forecast is computed from, and what the live dashboard shows
+FORECAST_TABLES = {"produtos", "produto_daily_sales", "restocks"}
+DASHBOARD_TABLES = {"usuarios", "produtos", "sales"}
+
+
+def is_worker() -> bool:
+    """True in a process started by the multi-worker launcher"""
+    return os.getenv(WORKER_ENV) == "1"
+
+
+class WorkerSync:
+    """Keeps one worker's in-memory state in line with the other workers'"""
+
+    def __init__(self, poll_seconds: float = WORKER_POLL_MS / 1000, resync_seconds: float = WORKER_RESYNC_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.resync_seconds = resync_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._dashboard_changed = False
+        self._last_resync = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        from utils.events import bus
+
+        # 2**30 ids per worker before ranges could meet, and still exact
+        # as a JavaScript number
+        bus.offset_ids(os.getpid() << 30)
+        versions.on_change(self._changed)
+        versions.share(engine)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="worker-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _changed(self, epoch_changed: bool, tables: Set[str]):
+        # Called by whichever thread refreshed the versions: a request
+        # computing its ETag (before it reads anything) or the poller
+        from routers.auth import load_revoked_tokens
+        from utils import idempotency
+        from utils.forecast import forecast
+
+        if epoch_changed:
+            # Another worker restored or cleared the database
+            idempotency.store.clear()
+        if epoch_changed or tables & FORECAST_TABLES:
+            forecast.invalidate()
+        if epoch_changed or "revoked_access_tokens" in tables:
+            db = SessionLocal()
+            try:
+                load_revoked_tokens(db)
+            finally:
+                db.close()
+        if epoch_changed or tables & DASHBOARD_TABLES:
+            self._dashboard_changed = True
+
+    def _run(self):
+        from utils.events import RESYNC, bus
+
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                versions.refresh()
+            except Exception:
+                logger.exception("worker sync: failed to read data_versions")
+            if self._dashboard_changed and time.monotonic() - self._last_resync >= self.resync_seconds:
+                self._dashboard_changed = False
+                self._last_resync = time.monotonic()
+                if bus.subscriber_count:
+                    bus.publish(RESYNC, {})
+
+
+sync = WorkerSync()